@@ -0,0 +1,83 @@
+"""Benchmark the cold-start import time of aria2-server with `python -X importtime`.
+
+```shell
+# the cli entry, e.g. `aria2-server --help`
+python scripts/benchmarks/import_time.py aria2_server.cli --budget-ms 150
+# the whole server stack, imported by `aria2-server` before serving
+python scripts/benchmarks/import_time.py aria2_server.app.lifespan aria2_server.app.server
+```
+
+It prints the slowest top-level imports, and exits with `1` if the total exceeds `--budget-ms`.
+NOTE: run it several times, the first run may include the time of compiling `.pyc`.
+"""
+
+import argparse
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+__all__ = ("measure_import_time",)
+
+
+def _top_level_import_times(stmt: str) -> Dict[str, float]:
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", stmt],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stderr
+
+    top_levels: Dict[str, float] = {}
+    for line in stderr.splitlines():
+        # e.g. `import time:       151 |      38612 |   typer`,
+        # the nested imports are indented under their parent.
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit() or name.startswith("  "):
+            # the header, or a nested import
+            continue
+        top_levels[name.strip()] = int(cumulative) / 1000
+    return top_levels
+
+
+def measure_import_time(*modules: str) -> Tuple[float, Dict[str, float]]:
+    """Import `modules` in a fresh interpreter.
+
+    Returns:
+        `(total_ms, {top_level_module: cumulative_ms})`,
+        excluding the imports of python startup itself (e.g. `site`).
+    """
+    startup = _top_level_import_times("pass")
+    top_levels = {
+        name: cumulative
+        for name, cumulative in _top_level_import_times(
+            "; ".join(f"import {module}" for module in modules)
+        ).items()
+        if name not in startup
+    }
+    return sum(top_levels.values()), top_levels
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("modules", nargs="+", help="the modules to import")
+    parser.add_argument("--budget-ms", type=float, default=None)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    total, top_levels = measure_import_time(*args.modules)
+    slowest: List[Tuple[str, float]] = sorted(
+        top_levels.items(), key=lambda item: item[1], reverse=True
+    )
+    for name, cumulative in slowest[: args.top]:
+        print(f"{cumulative:9.1f} ms  {name}")
+    print(f"{total:9.1f} ms  total")
+
+    if args.budget_ms is not None and total > args.budget_ms:
+        print(f"over budget: {total:.1f} ms > {args.budget_ms:.1f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Benchmark `POST /api/aria2/jsonrpc` of a running aria2-server.
+
+Run it twice, once with `server.extra.aria2_proxy.asgi_fast_path = false` (before)
+and once with `true` (after), against the same aria2-server and aria2c:
+
+```shell
+python scripts/benchmarks/jsonrpc_proxy.py \
+    --url http://localhost:8080/api/aria2/jsonrpc \
+    --cookie <value of the `fastapiusersauth` cookie> \
+    --secret <aria2c rpc-secret>
+```
+
+NOTE: disable `rpc_cache_ttl_second` and `batch_window_second` to measure the proxy path only.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from typing import List, Optional
+
+import httpx
+
+
+def _percentile(sorted_values: List[float], percent: float) -> float:
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * percent / 100))
+    return sorted_values[index]
+
+
+async def _worker(
+    client: httpx.AsyncClient,
+    url: str,
+    body: bytes,
+    count: int,
+    latencies: List[float],
+) -> int:
+    errors = 0
+    for _ in range(count):
+        start = time.perf_counter()
+        response = await client.post(
+            url, content=body, headers={"Content-Type": "application/json"}
+        )
+        latencies.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            errors += 1
+    return errors
+
+
+async def bench(
+    url: str,
+    cookie: str,
+    *,
+    method: str,
+    secret: Optional[str],
+    concurrency: int,
+    requests: int,
+    warmup: int,
+) -> None:
+    params = [f"token:{secret}"] if secret is not None else []
+    body = json.dumps(
+        {"jsonrpc": "2.0", "id": "bench", "method": method, "params": params}
+    ).encode("utf-8")
+
+    async with httpx.AsyncClient(
+        cookies={"fastapiusersauth": cookie},
+        limits=httpx.Limits(max_connections=concurrency),
+        mounts={"all://": None},
+    ) as client:
+        await _worker(client, url, body, warmup, [])
+
+        latencies: List[float] = []
+        per_worker = max(1, requests // concurrency)
+        start = time.perf_counter()
+        errors = await asyncio.gather(
+            *(
+                _worker(client, url, body, per_worker, latencies)
+                for _ in range(concurrency)
+            )
+        )
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"method:      {method}")
+    print(f"concurrency: {concurrency}")
+    print(f"requests:    {len(latencies)} ({sum(errors)} non-200)")
+    print(f"rps:         {len(latencies) / elapsed:.1f}")
+    print(f"p50:         {statistics.median(latencies) * 1000:.2f} ms")
+    print(f"p99:         {_percentile(latencies, 99) * 1000:.2f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", required=True)
+    parser.add_argument("--cookie", required=True, help="the session cookie")
+    parser.add_argument("--secret", default=None, help="the rpc-secret of aria2c")
+    parser.add_argument("--method", default="aria2.getGlobalStat")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=10000)
+    parser.add_argument("--warmup", type=int, default=100)
+    args = parser.parse_args()
+
+    asyncio.run(
+        bench(
+            args.url,
+            args.cookie,
+            method=args.method,
+            secret=args.secret,
+            concurrency=args.concurrency,
+            requests=args.requests,
+            warmup=args.warmup,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
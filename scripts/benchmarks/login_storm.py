@@ -0,0 +1,154 @@
+"""Benchmark the latency of `POST /api/aria2/jsonrpc` during a login storm.
+
+It measures the proxy latency twice against a running aria2-server:
+first without any login, then while `--storm-concurrency` clients keep posting
+wrong passwords to `POST /api/auth/login`.
+With password hashing offloaded to `server.extra.password_hashing`,
+the p99 of both phases should stay close, and excess logins get `503`.
+
+```shell
+python scripts/benchmarks/login_storm.py \
+    --base-url http://localhost:8080 \
+    --cookie <value of the `fastapiusersauth` cookie> \
+    --secret <aria2c rpc-secret>
+```
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import statistics
+import time
+from typing import Counter, List, Optional
+
+import httpx
+
+
+def _percentile(sorted_values: List[float], percent: float) -> float:
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * percent / 100))
+    return sorted_values[index]
+
+
+async def _probe(
+    client: httpx.AsyncClient,
+    url: str,
+    body: bytes,
+    *,
+    duration: float,
+    interval: float,
+) -> List[float]:
+    latencies: List[float] = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        response = await client.post(
+            url, content=body, headers={"Content-Type": "application/json"}
+        )
+        latencies.append(time.perf_counter() - start)
+        response.raise_for_status()
+        await asyncio.sleep(interval)
+    return latencies
+
+
+async def _storm(
+    client: httpx.AsyncClient, url: str, email: str, statuses: Counter[int]
+) -> None:
+    while True:
+        response = await client.post(
+            url, data={"username": email, "password": "wrong-password"}
+        )
+        statuses[response.status_code] += 1
+
+
+def _report(name: str, latencies: List[float]) -> None:
+    latencies = sorted(latencies)
+    print(
+        f"{name:<12} requests: {len(latencies):>5}"
+        f"  p50: {statistics.median(latencies) * 1000:8.2f} ms"
+        f"  p99: {_percentile(latencies, 99) * 1000:8.2f} ms"
+    )
+
+
+async def bench(
+    base_url: str,
+    cookie: str,
+    *,
+    secret: Optional[str],
+    email: str,
+    duration: float,
+    interval: float,
+    storm_concurrency: int,
+) -> None:
+    params = [f"token:{secret}"] if secret is not None else []
+    body = json.dumps(
+        {
+            "jsonrpc": "2.0",
+            "id": "bench",
+            "method": "aria2.getGlobalStat",
+            "params": params,
+        }
+    ).encode("utf-8")
+    rpc_url = f"{base_url}/api/aria2/jsonrpc"
+    login_url = f"{base_url}/api/auth/login"
+
+    async with httpx.AsyncClient(
+        cookies={"fastapiusersauth": cookie}, mounts={"all://": None}
+    ) as probe_client, httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=storm_concurrency),
+        mounts={"all://": None},
+        timeout=None,
+    ) as storm_client:
+        baseline = await _probe(
+            probe_client, rpc_url, body, duration=duration, interval=interval
+        )
+
+        statuses: Counter[int] = collections.Counter()
+        storm_tasks = [
+            asyncio.create_task(_storm(storm_client, login_url, email, statuses))
+            for _ in range(storm_concurrency)
+        ]
+        try:
+            during_storm = await _probe(
+                probe_client, rpc_url, body, duration=duration, interval=interval
+            )
+        finally:
+            for task in storm_tasks:
+                task.cancel()
+            await asyncio.gather(*storm_tasks, return_exceptions=True)
+
+    _report("baseline", baseline)
+    _report("login storm", during_storm)
+    print(f"login responses: {dict(sorted(statuses.items()))}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", required=True)
+    parser.add_argument("--cookie", required=True, help="the session cookie")
+    parser.add_argument("--secret", default=None, help="the rpc-secret of aria2c")
+    parser.add_argument(
+        "--email", default="aria2@server.com", help="the email to log in"
+    )
+    parser.add_argument("--duration", type=float, default=10, help="seconds per phase")
+    parser.add_argument(
+        "--interval", type=float, default=0.01, help="seconds between proxy requests"
+    )
+    parser.add_argument("--storm-concurrency", type=int, default=64)
+    args = parser.parse_args()
+
+    asyncio.run(
+        bench(
+            args.base_url.rstrip("/"),
+            args.cookie,
+            secret=args.secret,
+            email=args.email,
+            duration=args.duration,
+            interval=args.interval,
+            storm_concurrency=args.storm_concurrency,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""Benchmark concurrent logins and token validations against the sqlite db.
+
+It compares the `default` profile (the defaults of `server.extra.sqlite`,
+i.e. sqlite's own: rollback journal with full fsync)
+with the opt-in `tuned` profile (WAL with `synchronous = normal`, larger cache and mmap),
+on a fresh db file in a temporary directory:
+
+```shell
+python scripts/benchmarks/sqlite_auth.py --profile default
+python scripts/benchmarks/sqlite_auth.py --profile tuned
+```
+
+A login inserts one access token (one write transaction),
+a validation reads one access token by its primary key, like `DatabaseStrategy.read_token`.
+"""
+
+import argparse
+import asyncio
+import random
+import secrets
+import statistics
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List
+
+# NOTE: import `fastapi_users.db` before `fastapi_users_db_sqlalchemy`
+# to avoid circular import
+import fastapi_users.db  # noqa: F401  # pyright: ignore[reportUnusedImport]
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from aria2_server.config.schemas import Sqlite
+from aria2_server.db._core import create_sqlite_engine
+from aria2_server.db.access_token import SQLAlchemyAccessTokenDatabase
+from aria2_server.db.access_token.models import AccessToken
+from aria2_server.db.base._models import Base
+from aria2_server.db.user import User
+
+_PROFILES: Dict[str, Sqlite] = {
+    "default": Sqlite(),
+    "tuned": Sqlite(
+        journal_mode="wal",
+        synchronous="normal",
+        cache_size_kib=16 * 1024,
+        mmap_size=256 * 1024 * 1024,
+    ),
+}
+
+
+def _percentile(sorted_values: List[float], percent: float) -> float:
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * percent / 100))
+    return sorted_values[index]
+
+
+def _report(name: str, latencies: List[float], elapsed: float) -> None:
+    latencies = sorted(latencies)
+    print(
+        f"{name:<10} ops/s: {len(latencies) / elapsed:9.1f}"
+        f"  p50: {statistics.median(latencies) * 1000:8.2f} ms"
+        f"  p99: {_percentile(latencies, 99) * 1000:8.2f} ms"
+    )
+
+
+async def bench(
+    profile: str, *, logins: int, validators: int, duration: float, seed_tokens: int
+) -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = Path(tmp_dir) / "bench.db"
+        engine = create_sqlite_engine(
+            f"sqlite+aiosqlite:///{db_path.as_posix()}",
+            _PROFILES[profile],
+            in_memory=False,
+        )
+        session_maker = async_sessionmaker(engine, expire_on_commit=False)
+
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        user_id = uuid.uuid4()
+        tokens = [secrets.token_urlsafe() for _ in range(seed_tokens)]
+        async with session_maker() as session:
+            session.add(User(id=user_id, email="user@example.com", hashed_password=""))
+            session.add_all(
+                AccessToken(token=token, user_id=user_id) for token in tokens
+            )
+            await session.commit()
+
+        deadline = time.perf_counter() + duration
+        login_latencies: List[float] = []
+        validation_latencies: List[float] = []
+
+        async def login() -> None:
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                async with session_maker() as session:
+                    token = secrets.token_urlsafe()
+                    await SQLAlchemyAccessTokenDatabase(session, AccessToken).create(
+                        {"token": token, "user_id": user_id}
+                    )
+                login_latencies.append(time.perf_counter() - start)
+                tokens.append(token)
+
+        async def validate() -> None:
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                async with session_maker() as session:
+                    access_token = await SQLAlchemyAccessTokenDatabase(
+                        session, AccessToken
+                    ).get_by_token(random.choice(tokens))
+                assert access_token is not None
+                validation_latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(login() for _ in range(logins)),
+            *(validate() for _ in range(validators)),
+        )
+        elapsed = time.perf_counter() - start
+        await engine.dispose()
+
+    print(f"profile: {profile}")
+    _report("login", login_latencies, elapsed)
+    _report("validate", validation_latencies, elapsed)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profile", choices=sorted(_PROFILES), default="tuned")
+    parser.add_argument("--logins", type=int, default=4, help="concurrent logins")
+    parser.add_argument(
+        "--validators", type=int, default=16, help="concurrent token validations"
+    )
+    parser.add_argument("--duration", type=float, default=10, help="seconds")
+    parser.add_argument("--seed-tokens", type=int, default=10000)
+    args = parser.parse_args()
+
+    asyncio.run(
+        bench(
+            args.profile,
+            logins=args.logins,
+            validators=args.validators,
+            duration=args.duration,
+            seed_tokens=args.seed_tokens,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,7 @@ from nicegui.language import Language as LanguageType
 
 __all__ = (
     "AnyCallable",
+    "AuthStrategyType",
     "BoolStr",
     "DecoratedCallable",
     "EndpointDocumentationType",
@@ -20,6 +21,8 @@ __all__ = (
     "IpvAnyHostType",
     "LanguageType",
     "SqliteDbPathType",
+    "SqliteJournalModeType",
+    "SqliteSynchronousType",
     "TrueStr",
     "UvicornLoggingLevelType",
 )
@@ -37,8 +40,14 @@ Ipv6HostType = Literal["::1", "::"]
 IpvAnyHostType = Literal[Ipv4HostType, Ipv6HostType]
 SqliteDbPathType = Union[Path, Literal[":memory:"]]
 
+SqliteJournalModeType = Literal["delete", "truncate", "persist", "wal"]
+
+SqliteSynchronousType = Literal["off", "normal", "full", "extra"]
+
 UvicornLoggingLevelType = Literal[
     "critical", "error", "warning", "info", "debug", "trace"
 ]
 
 EndpointDocumentationType = Literal["none", "internal", "page", "all"]
+
+AuthStrategyType = Literal["database", "jwt"]
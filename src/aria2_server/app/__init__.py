@@ -1,15 +1,30 @@
-import asyncio
+import importlib
+from typing import TYPE_CHECKING, Any
 
-from aria2_server.app import lifespan, server
+if TYPE_CHECKING:
+    from aria2_server.app import factory, lifespan, server
 
-__all__ = ("main",)
+__all__ = ("factory", "lifespan", "main", "server")
+
+# NOTE: the submodules are imported lazily, because they import almost the whole stack
+# (NiceGUI, FastAPI, SQLAlchemy, ...); so that importing `aria2_server.app._core.xxx` is cheap,
+# and `lifespan.context()` can import `server` concurrently with other startup phases.
+_LAZY_SUBMODULES = ("factory", "lifespan", "server")
+
+
+def __getattr__(name: str) -> Any:
+    if name in _LAZY_SUBMODULES:
+        return importlib.import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def main() -> None:
-    with lifespan.context():
-        server_config_in_db = asyncio.run(server.utils.get_server_config_in_db())
+    from aria2_server.app import lifespan
+
+    with lifespan.context() as startup:
+        from aria2_server.app import server
 
-        server.run(**server.build_run_kwargs(server_config_in_db.secret_token))
+        server.run(**server.build_run_kwargs(startup.server_config.secret_token))
 
 
 if __name__ == "__main__":
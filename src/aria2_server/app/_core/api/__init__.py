@@ -0,0 +1,197 @@
+"""The HTTP APIs of aria2-server, shared by the NiceGUI server and `create_app`."""
+
+from dataclasses import dataclass
+from typing import Any, Callable, Coroutine, Optional, TypedDict
+
+from fastapi import APIRouter, Depends, FastAPI, Request, status
+from fastapi.responses import JSONResponse
+
+from aria2_server.app._core.api import _aria2 as aria2
+from aria2_server.app._core.api import _aria2_state as aria2_state
+from aria2_server.app._core.api import _auth as auth
+from aria2_server.app._core.api import _download_history as download_history
+from aria2_server.app._core.api import _download_queue as download_queue
+from aria2_server.app._core.api import _metrics as metrics
+from aria2_server.app._core.api._auth import create_auth_router, create_users_router
+from aria2_server.app._core.api._download_history import (
+    create_download_history_router,
+)
+from aria2_server.app._core.api._download_queue import create_download_queue_router
+from aria2_server.app._core.aria2 import (
+    Aria2DownloadQueue,
+    Aria2HistoryArchiver,
+    Aria2ReadinessGate,
+    Aria2ShardRouter,
+)
+from aria2_server.app._core.auth import Auth, PasswordHasherBusyError, UserRedirect
+from aria2_server.app._core.metrics import MetricsRegistry
+from aria2_server.config.schemas import Config
+
+__all__ = (
+    "ApiAssembly",
+    "aria2",
+    "aria2_state",
+    "auth",
+    "build_api",
+    "create_user_redirect",
+    "download_history",
+    "download_queue",
+    "metrics",
+    "password_hasher_busy_handler",
+)
+
+
+# auth dependency utils
+
+_REQUIRE_ACTIVE = True
+_REQUIRE_VERIFIED = True
+_REQUIRE_SUPERUSER = False
+
+
+class _UserRedirectKwarg(TypedDict):
+    redirect_url: str
+    use_root_path: bool
+    status_code: int
+    code: int
+    active: bool
+    verified: bool
+    superuser: bool
+
+
+_user_redirect_kwargs = _UserRedirectKwarg(
+    redirect_url="/account",
+    use_root_path=True,
+    status_code=status.HTTP_303_SEE_OTHER,
+    code=status.WS_1008_POLICY_VIOLATION,
+    active=_REQUIRE_ACTIVE,
+    verified=_REQUIRE_VERIFIED,
+    superuser=_REQUIRE_SUPERUSER,
+)
+
+
+def create_user_redirect(auth: Auth, *, optional: bool) -> UserRedirect:
+    """Require an active and verified user of `auth`, or redirect to `/account`.
+
+    Args:
+        auth: The auth of the app.
+        optional: If `True`, return None instead of raising an exception to redirect.
+    """
+    return UserRedirect(optional=optional, auth=auth, **_user_redirect_kwargs)
+
+
+async def password_hasher_busy_handler(
+    _request: Request, _exc: PasswordHasherBusyError
+) -> JSONResponse:
+    return JSONResponse(
+        {"detail": "Too many login attempts, please try again later."},
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={"Retry-After": "1"},
+    )
+
+
+@dataclass
+class ApiAssembly:
+    router: APIRouter
+    """All routes under `/api`."""
+    on_shutdown: Callable[..., Coroutine[Any, Any, None]]
+    jsonrpc_app: Optional[Any] = None
+    """The raw ASGI app for `POST /api/aria2/jsonrpc`, see `aria2.build_aria2_proxy_on`."""
+
+    def include_in(self, app: FastAPI) -> None:
+        # NOTE: the raw ASGI route must be added before `self.router`,
+        # so that it takes precedence over `POST /api/aria2/{path:path}`.
+        if self.jsonrpc_app is not None:
+            app.add_route(
+                "/api/aria2/jsonrpc",
+                self.jsonrpc_app,
+                methods=["POST"],
+                include_in_schema=False,
+            )
+        app.include_router(self.router)
+
+
+def build_api(
+    config: Config,
+    *,
+    auth: Auth,
+    user_redirect: UserRedirect,
+    registry: MetricsRegistry,
+    extra_aria2_router: Optional[APIRouter] = None,
+    readiness_gate: Optional[Aria2ReadinessGate] = None,
+    download_queue: Optional[Aria2DownloadQueue] = None,
+    download_history: Optional[Aria2HistoryArchiver] = None,
+    shard_router: Optional[Aria2ShardRouter] = None,
+) -> ApiAssembly:
+    """Build the `/api` routes, i.e. the aria2c proxy, the metrics, and the user auth.
+
+    Args:
+        config: The config of the app.
+        auth: The auth of the app.
+        user_redirect: Protect the aria2c proxy and the metrics.
+        registry: The metrics served by `/api/metrics`.
+        extra_aria2_router: More routes under `/api/aria2`, protected by `user_redirect`.
+        readiness_gate: Hold the requests to the aria2c proxy until aria2c is ready.
+        download_queue: Serve its APIs under `/api/aria2/queue`, protected by `user_redirect`.
+        download_history: Serve its archive under `/api/aria2/history`, protected by `user_redirect`.
+        shard_router: Route the calls of the aria2c proxy to several aria2c instances,
+            see `aria2.build_aria2_proxy_on`.
+    """
+    api_router = APIRouter(prefix="/api", tags=["api"])
+
+    if extra_aria2_router is not None:
+        api_router.include_router(
+            extra_aria2_router,
+            prefix="/aria2",
+            tags=["aria2"],
+            dependencies=[Depends(user_redirect)],
+        )
+
+    # NOTE: must be included before the aria2 proxy router,
+    # so that they take precedence over `/api/aria2/{path:path}`.
+    if download_queue is not None:
+        api_router.include_router(
+            create_download_queue_router(download_queue),
+            prefix="/aria2/queue",
+            tags=["aria2"],
+            dependencies=[Depends(user_redirect)],
+        )
+    if download_history is not None:
+        api_router.include_router(
+            create_download_history_router(download_history),
+            prefix="/aria2/history",
+            tags=["aria2"],
+            dependencies=[Depends(user_redirect)],
+        )
+
+    # NOTE: aria2 proxy router must be protected by user auth,
+    # because `AriaNgIframe` expose aria2c rpc-secret in `src` of <iframe>,
+    # e.g <iframe src="...secret=...">
+    aria2_proxy_assembly = aria2.build_aria2_proxy_on(
+        APIRouter(dependencies=[Depends(user_redirect)]),
+        config=config,
+        user_redirect=user_redirect,
+        registry=registry,
+        readiness_gate=readiness_gate,
+        shard_router=shard_router,
+    )
+    api_router.include_router(
+        aria2_proxy_assembly.router, prefix="/aria2", tags=["aria2"]
+    )
+
+    api_router.include_router(
+        metrics.create_router(registry),
+        prefix="/metrics",
+        tags=["metrics"],
+        dependencies=[Depends(user_redirect)],
+    )
+
+    api_router.include_router(create_auth_router(auth), prefix="/auth", tags=["auth"])
+    api_router.include_router(
+        create_users_router(auth), prefix="/users", tags=["users"]
+    )
+
+    return ApiAssembly(
+        api_router,
+        aria2_proxy_assembly.on_shutdown,
+        aria2_proxy_assembly.jsonrpc_app,
+    )
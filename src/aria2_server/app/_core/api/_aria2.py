@@ -0,0 +1,503 @@
+import functools
+import json
+from dataclasses import dataclass
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Coroutine,
+    Generic,
+    Optional,
+    TypeVar,
+)
+
+import httpx
+from fastapi import APIRouter, Request, Response, WebSocket, status
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi_proxy_lib.core.http import ReverseHttpProxy
+from fastapi_proxy_lib.core.websocket import ReverseWebSocketProxy
+from starlette.background import BackgroundTask
+from starlette.types import Receive, Scope, Send
+from typing_extensions import Self
+
+from aria2_server.app._core.aria2 import (
+    Aria2NotReadyError,
+    Aria2ReadinessGate,
+    Aria2RpcBatcher,
+    Aria2RpcCache,
+    Aria2RpcClient,
+    Aria2ShardRouter,
+    Aria2WebSocketMultiplexer,
+    create_upstream_client,
+    get_http_base_url,
+    get_ws_base_url,
+)
+from aria2_server.app._core.aria2._jsonrpc import (
+    INTERNAL_ERROR,
+    JsonRpcResponse,
+    dumps,
+    error_response,
+)
+from aria2_server.app._core.aria2._rpc_cache import JsonRpcCaller
+from aria2_server.app._core.auth import UserRedirect
+from aria2_server.app._core.metrics import MetricsRegistry, metrics_registry
+from aria2_server.config.schemas import Aria2Proxy, Config
+
+__all__ = ("build_aria2_proxy_on",)
+
+
+_RouterTypeVar = TypeVar("_RouterTypeVar", bound=APIRouter)
+
+
+@dataclass
+class _Aria2ProxyAssembly(Generic[_RouterTypeVar]):
+    router: _RouterTypeVar
+    on_shutdown: Callable[..., Coroutine[Any, Any, None]]
+    jsonrpc_app: Optional["_Aria2JsonRpcApp"] = None
+    """The raw ASGI app for `POST /jsonrpc`, if `aria2_proxy.asgi_fast_path` is enabled."""
+
+
+# see https://datatracker.ietf.org/doc/html/rfc9110#section-7.6.1
+_HOP_BY_HOP_HEADERS = frozenset(
+    (
+        "connection",
+        "keep-alive",
+        "proxy-authenticate",
+        "proxy-authorization",
+        "te",
+        "trailer",
+        "transfer-encoding",
+        "upgrade",
+    )
+)
+
+
+def _jsonrpc_response(
+    payload: JsonRpcResponse, status_code: Optional[int] = None
+) -> Response:
+    if status_code is None:
+        # keep consistent with aria2c
+        status_code = (
+            status.HTTP_400_BAD_REQUEST if "error" in payload else status.HTTP_200_OK
+        )
+    return Response(
+        content=dumps(payload).encode("utf-8"),
+        status_code=status_code,
+        media_type="application/json-rpc",
+    )
+
+
+def _not_ready_response(exc: Aria2NotReadyError) -> Response:
+    response = _jsonrpc_response(
+        error_response(None, INTERNAL_ERROR, str(exc)),
+        status.HTTP_503_SERVICE_UNAVAILABLE,
+    )
+    response.headers["Retry-After"] = "1"
+    return response
+
+
+def _loads_rpc_request(body: bytes) -> Any:
+    """Parse the JSON-RPC request in `body`, `None` if it is not JSON."""
+    try:
+        return json.loads(body)
+    except ValueError:
+        return None
+
+
+class _Aria2JsonRpcPipeline:
+    """The steps shared by the HTTP endpoint and `_Aria2JsonRpcApp` to answer a JSON-RPC call:
+    wait for aria2c to be ready, then answer it by the cache, the batcher or the shard router,
+    otherwise proxy it to aria2c as it is.
+    """
+
+    def __init__(
+        self,
+        upstream_request: JsonRpcCaller,
+        *,
+        rpc_cache: Optional[Aria2RpcCache] = None,
+        rpc_batcher: Optional[Aria2RpcBatcher] = None,
+        shard_router: Optional[Aria2ShardRouter] = None,
+        readiness_gate: Optional[Aria2ReadinessGate] = None,
+    ) -> None:
+        """
+        Args:
+            upstream_request: Send a JSON-RPC request to aria2c, used by cache misses.
+            rpc_cache: Answer the read-only calls, invalidated by the write calls.
+            rpc_batcher: Batch the calls into `system.multicall`.
+            shard_router: Route the calls to several aria2c instances.
+            readiness_gate: Hold the calls until aria2c is ready.
+        """
+        self.upstream_request = upstream_request
+        self.rpc_cache = rpc_cache
+        self.rpc_batcher = rpc_batcher
+        self.shard_router = shard_router
+        self.readiness_gate = readiness_gate
+
+    @classmethod
+    def from_config(
+        cls,
+        proxy_config: Aria2Proxy,
+        upstream_request: JsonRpcCaller,
+        *,
+        shard_router: Optional[Aria2ShardRouter] = None,
+        readiness_gate: Optional[Aria2ReadinessGate] = None,
+    ) -> Self:
+        rpc_cache_ttl = proxy_config.rpc_cache_ttl_second
+        rpc_batcher = (
+            Aria2RpcBatcher(
+                upstream_request,
+                window=proxy_config.batch_window_second,
+                max_size=proxy_config.batch_max_size,
+            )
+            if proxy_config.batch_window_second > 0
+            else None
+        )
+        return cls(
+            upstream_request,
+            rpc_cache=Aria2RpcCache(rpc_cache_ttl) if rpc_cache_ttl > 0 else None,
+            rpc_batcher=rpc_batcher,
+            shard_router=shard_router,
+            readiness_gate=readiness_gate,
+        )
+
+    @property
+    def parses_calls(self) -> bool:
+        """Whether the calls must be parsed, otherwise they are always proxied as they are."""
+        return (
+            self.rpc_cache is not None
+            or self.rpc_batcher is not None
+            or self.shard_router is not None
+        )
+
+    async def wait_ready(self) -> None:
+        """Wait for aria2c to be ready, see `Aria2ReadinessGate.wait`.
+
+        Raises:
+            Aria2NotReadyError: If it can not wait.
+        """
+        if self.readiness_gate is not None:
+            await self.readiness_gate.wait()
+
+    async def _call_locally(self, rpc_request: Any) -> Optional[JsonRpcResponse]:
+        """Answer by the cache, batcher or shard router,
+        return `None` if it must be proxied as it is."""
+        # cache misses will be batched if possible
+        if self.rpc_cache is not None and self.rpc_cache.is_cacheable(rpc_request):
+            fetch = (
+                self.rpc_batcher.call
+                if self.rpc_batcher is not None
+                else self.upstream_request
+            )
+            return await self.rpc_cache.call(rpc_request, fetch)
+        if self.rpc_batcher is not None and self.rpc_batcher.is_batchable(rpc_request):
+            return await self.rpc_batcher.call(rpc_request)
+        if self.shard_router is not None:
+            try:
+                return await self.shard_router.handle(rpc_request)
+            finally:
+                self._after_passthrough(rpc_request)
+        return None
+
+    def _after_passthrough(self, rpc_request: Any) -> None:
+        # the proxied call may be a write call
+        if self.rpc_cache is not None and self.rpc_cache.is_write(rpc_request):
+            self.rpc_cache.invalidate()
+
+    async def handle(
+        self, rpc_request: Any, passthrough: Callable[[], Awaitable[Response]]
+    ) -> Response:
+        """Answer the parsed `rpc_request` (`None` if not parsed) locally,
+        or by `passthrough`, which proxies it to aria2c as it is.
+
+        The errors of connecting to aria2c are answered with `502`.
+        """
+        try:
+            rpc_response = await self._call_locally(rpc_request)
+            if rpc_response is not None:
+                return _jsonrpc_response(rpc_response)
+            try:
+                return await passthrough()
+            finally:
+                self._after_passthrough(rpc_request)
+        except (httpx.HTTPError, ValueError) as e:
+            return _jsonrpc_response(
+                error_response(
+                    rpc_request.get("id") if isinstance(rpc_request, dict) else None,
+                    INTERNAL_ERROR,
+                    repr(e),
+                ),
+                status.HTTP_502_BAD_GATEWAY,
+            )
+
+    async def aclose(self) -> None:
+        if self.rpc_batcher is not None:
+            await self.rpc_batcher.aclose()
+
+
+class _Aria2JsonRpcApp:
+    """A raw ASGI app serving `POST /jsonrpc`, bypassing fastapi routing and dependency injection.
+
+    The session is checked by `user_redirect.read_user`,
+    which is served by the shared session cache, so most calls do not touch the database.
+    Calls which are not answered by the cache or batcher are streamed to aria2c as they are.
+    """
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        url: str,
+        *,
+        user_redirect: UserRedirect,
+        pipeline: _Aria2JsonRpcPipeline,
+    ) -> None:
+        """
+        Args:
+            client: The pooled client used to connect to aria2c.
+            url: The HTTP url of aria2c JSON-RPC interface, e.g. `http://localhost:6800/jsonrpc`
+            user_redirect: Used to check the session, and to build the redirect response.
+            pipeline: The same pipeline as the fastapi endpoint.
+        """
+        self.client = client
+        self.url = url
+        self.user_redirect = user_redirect
+        self.pipeline = pipeline
+
+    async def _passthrough(self, request: Request, body: Optional[bytes]) -> Response:
+        headers = {
+            "Content-Type": request.headers.get("Content-Type", "application/json")
+        }
+        content_length = request.headers.get("Content-Length")
+        if content_length is not None:
+            headers["Content-Length"] = content_length
+        upstream_request = self.client.build_request(
+            "POST",
+            self.url,
+            content=body if body is not None else request.stream(),
+            headers=headers,
+        )
+        upstream_response = await self.client.send(upstream_request, stream=True)
+        return StreamingResponse(
+            upstream_response.aiter_raw(),
+            status_code=upstream_response.status_code,
+            headers={
+                key: value
+                for key, value in upstream_response.headers.items()
+                if key.lower() not in _HOP_BY_HOP_HEADERS
+            },
+            background=BackgroundTask(upstream_response.aclose),
+        )
+
+    def _unauthorized_response(self, request: Request) -> Response:
+        # keep consistent with `UserRedirect.__call__`
+        redirect_url = self.user_redirect.get_redirect_url(
+            request.scope.get("root_path", "")
+        )
+        detail = self.user_redirect.detail
+        if detail is None:
+            detail = f"Unauthorized, Please redirect to {redirect_url} to login."
+        return JSONResponse(
+            {"detail": detail},
+            status_code=self.user_redirect.status_code,
+            headers={"Location": redirect_url, **(self.user_redirect.headers or {})},
+        )
+
+    async def _handle(self, request: Request) -> Response:
+        if await self.user_redirect.read_user(request) is None:
+            return self._unauthorized_response(request)
+
+        try:
+            await self.pipeline.wait_ready()
+        except Aria2NotReadyError as e:
+            return _not_ready_response(e)
+
+        if not self.pipeline.parses_calls:
+            # stream the body to aria2c without reading it
+            return await self.pipeline.handle(
+                None, functools.partial(self._passthrough, request, None)
+            )
+        body = await request.body()
+        return await self.pipeline.handle(
+            _loads_rpc_request(body),
+            functools.partial(self._passthrough, request, body),
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        assert scope["type"] == "http"
+        response = await self._handle(Request(scope, receive))
+        await response(scope, receive, send)
+
+
+async def _serve_http(
+    request: Request,
+    path: str,
+    *,
+    pipeline: _Aria2JsonRpcPipeline,
+    http_proxy: ReverseHttpProxy,
+) -> Response:
+    try:
+        await pipeline.wait_ready()
+    except Aria2NotReadyError as e:
+        return _not_ready_response(e)
+
+    passthrough = functools.partial(http_proxy.proxy, request=request, path=path)
+    if path != "jsonrpc" or not pipeline.parses_calls:
+        return await passthrough()
+    # NOTE: starlette will cache the body,
+    # so it can still be streamed by `http_proxy` after reading here.
+    return await pipeline.handle(_loads_rpc_request(await request.body()), passthrough)
+
+
+async def _serve_websocket(
+    websocket: WebSocket,
+    path: str,
+    *,
+    pipeline: _Aria2JsonRpcPipeline,
+    ws_proxy: ReverseWebSocketProxy,
+    ws_multiplexer: Optional[Aria2WebSocketMultiplexer],
+) -> None:
+    try:
+        await pipeline.wait_ready()
+    except Aria2NotReadyError as e:
+        return await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER, reason=str(e))
+
+    # NOTE: aria2c only serves WebSocket on `/jsonrpc`,
+    # so just let other paths go through the plain proxy.
+    if ws_multiplexer is not None and path == "jsonrpc":
+        await ws_multiplexer.serve(websocket)
+    else:
+        await ws_proxy.proxy(websocket=websocket, path=path)
+
+
+def build_aria2_proxy_on(
+    router: _RouterTypeVar,
+    *,
+    config: Config,
+    user_redirect: Optional[UserRedirect] = None,
+    registry: MetricsRegistry = metrics_registry,
+    readiness_gate: Optional[Aria2ReadinessGate] = None,
+    shard_router: Optional[Aria2ShardRouter] = None,
+) -> _Aria2ProxyAssembly[_RouterTypeVar]:
+    """
+
+    Args:
+        router: please use a new router instance for each call of this function.
+            for security reason, please use router with authentication function.
+        config: The config of aria2c and the proxy.
+        user_redirect: The same authentication as `router`,
+            required if `aria2_proxy.asgi_fast_path` is enabled.
+        registry: Where to register the metrics of the proxy client.
+        readiness_gate: If given, hold the requests in a bounded queue until aria2c is ready
+            (e.g. restarted by the watchdog), instead of failing them;
+            answer `503` (HTTP) or close with `1013` (WebSocket) if it can not wait.
+        shard_router: Route the JSON-RPC calls to the aria2c instances,
+            required if there are several ones (see `Aria2ShardRouter.is_enabled`).
+            It's shared with other users of aria2c (e.g. the download queue),
+            so the caller owns it, i.e. it's not closed by the returned `on_shutdown`.
+
+    Returns:
+        A on_shutdown callback to close all proxy.
+        We return this shutdown event callback instead of set it on router directly,
+        because fastapi does not support lifespan on APIRouter level,
+        see https://github.com/tiangolo/fastapi/discussions/10464
+
+    ## TODO: set on_shutdown on router directly when fastapi support lifespan on APIRouter level.
+    """
+
+    # NOTE: with several aria2c instances (local shards or remote backends),
+    # the JSON-RPC calls must be routed, instead of proxied to the first instance as they are.
+    if shard_router is None and Aria2ShardRouter.is_enabled(config):
+        raise ValueError("`shard_router` is required by several aria2c instances")
+    proxy_config = config.server.extra.aria2_proxy
+    if proxy_config.asgi_fast_path and user_redirect is None:
+        raise ValueError("`user_redirect` is required by `asgi_fast_path`")
+
+    # NOTE: create the client here instead of at import time,
+    # so that every app gets its own pool configured by its `config`.
+    proxy_client = create_upstream_client(
+        "proxy",
+        upstream_config=config.server.extra.aria2_upstream,
+        registry=registry,
+    )
+
+    # e.g. http://localhost:6800/
+    http_base_url = get_http_base_url(config.aria2)
+    aria2_http_proxy = ReverseHttpProxy(proxy_client, base_url=http_base_url)
+    # e.g. http://localhost:6800/jsonrpc
+    aria2_rpc_client = Aria2RpcClient(proxy_client, f"{http_base_url}jsonrpc")
+
+    # NOTE: share the pipeline (e.g. the cache) between HTTP and WebSocket,
+    # so that write calls from any of them will invalidate the cache.
+    pipeline = _Aria2JsonRpcPipeline.from_config(
+        proxy_config,
+        shard_router.request if shard_router is not None else aria2_rpc_client.request,
+        shard_router=shard_router,
+        readiness_gate=readiness_gate,
+    )
+
+    jsonrpc_app = (
+        _Aria2JsonRpcApp(
+            proxy_client,
+            aria2_rpc_client.url,
+            user_redirect=user_redirect,
+            pipeline=pipeline,
+        )
+        if user_redirect is not None and proxy_config.asgi_fast_path
+        else None
+    )
+
+    # e.g. ws://localhost:6800/
+    ws_base_url = get_ws_base_url(config.aria2)
+    aria2_ws_proxy = ReverseWebSocketProxy(proxy_client, base_url=ws_base_url)
+    # e.g. ws://localhost:6800/jsonrpc
+    aria2_ws_multiplexer = (
+        Aria2WebSocketMultiplexer(
+            proxy_client,
+            f"{ws_base_url}jsonrpc",
+            rpc_cache=pipeline.rpc_cache,
+            shard_router=shard_router,
+        )
+        # NOTE: the plain proxy can not route the calls to aria2c instances
+        if proxy_config.ws_multiplex or shard_router is not None
+        else None
+    )
+
+    ##########
+    #
+    # NOTE: DO NOT use `GET` method, because we use cookies to authenticate,
+    # `GET` method will cause CSRF issue.
+    #
+    ##########
+
+    # NOTE: `/rpc-secret` route must be placed before `/{path:path}` route,
+    # see https://fastapi.tiangolo.com/tutorial/path-params/#order-matters
+    @router.post("/rpc-secret")
+    def post_rpc_secret() -> str:  # pyright: ignore[reportUnusedFunction]
+        """Return rpc-secret for aria2c."""
+        return config.aria2.rpc_secret.get_secret_value()
+
+    @router.post("/{path:path}")
+    @functools.wraps(aria2_http_proxy.proxy)
+    async def aria2_http_endpoint(request: Request, path: str = ""):  # pyright: ignore[reportUnusedFunction]
+        return await _serve_http(
+            request, path, pipeline=pipeline, http_proxy=aria2_http_proxy
+        )
+
+    @router.websocket("/{path:path}")
+    @functools.wraps(aria2_ws_proxy.proxy)
+    async def aria2_ws_endpoint(websocket: WebSocket, path: str = ""):  # pyright: ignore[reportUnusedFunction]
+        return await _serve_websocket(
+            websocket,
+            path,
+            pipeline=pipeline,
+            ws_proxy=aria2_ws_proxy,
+            ws_multiplexer=aria2_ws_multiplexer,
+        )
+
+    async def on_shutdown(*_: Any, **__: Any) -> None:
+        await aria2_http_proxy.aclose()
+        await aria2_ws_proxy.aclose()
+        if aria2_ws_multiplexer is not None:
+            await aria2_ws_multiplexer.aclose()
+        await pipeline.aclose()
+
+    return _Aria2ProxyAssembly[_RouterTypeVar](router, on_shutdown, jsonrpc_app)
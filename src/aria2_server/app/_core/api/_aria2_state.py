@@ -0,0 +1,146 @@
+"""Read-only APIs of aria2c state, which are served from the shared state store.
+
+These APIs never call aria2c by themselves,
+see `aria2_server.app._core.aria2.Aria2StatePoller`.
+"""
+
+import asyncio
+from typing import AsyncGenerator, Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Response, status
+from fastapi.responses import StreamingResponse
+
+from aria2_server.app._core.aria2 import (
+    Aria2StateDeltaEncoder,
+    Aria2StateSnapshot,
+    Aria2StateStore,
+)
+from aria2_server.app._core.aria2._jsonrpc import dumps
+from aria2_server.config.schemas import Aria2StatePolling
+
+__all__ = ("create_aria2_state_router",)
+
+
+_SSE_KEEP_ALIVE_SECOND = 15
+_SSE_KEEP_ALIVE_FRAME = b": keep-alive\n\n"
+# fields of `aria2.tellStatus` which are pushed in the stats stream
+_SSE_DOWNLOAD_KEYS = (
+    "gid",
+    "status",
+    "totalLength",
+    "completedLength",
+    "downloadSpeed",
+    "uploadSpeed",
+)
+
+
+class _StatsFrameEncoder:
+    """Encode the SSE `stats` frame of a snapshot,
+    and keep the last one, so that all clients share the cost of serialization."""
+
+    def __init__(self) -> None:
+        self._last: Optional[Tuple[int, bytes]] = None
+        """`(version, frame)`"""
+
+    def encode(self, snapshot: Aria2StateSnapshot) -> bytes:
+        if self._last is not None and self._last[0] == snapshot.version:
+            return self._last[1]
+
+        data = {
+            "version": snapshot.version,
+            "timestamp": snapshot.timestamp,
+            "global_stat": snapshot.global_stat,
+            "downloads": [
+                {key: download.get(key) for key in _SSE_DOWNLOAD_KEYS}
+                for download in snapshot.active
+            ],
+        }
+        # see https://html.spec.whatwg.org/multipage/server-sent-events.html#event-stream-interpretation
+        frame = (
+            f"event: stats\nid: {snapshot.version}\ndata: {dumps(data)}\n\n".encode()
+        )
+        self._last = (snapshot.version, frame)
+        return frame
+
+
+async def _stats_stream(
+    store: Aria2StateStore, frame_encoder: _StatsFrameEncoder, *, interval: float
+) -> AsyncGenerator[bytes, None]:
+    version = 0
+    while True:
+        try:
+            snapshot = await asyncio.wait_for(
+                store.wait_for_update(version), timeout=_SSE_KEEP_ALIVE_SECOND
+            )
+        except asyncio.TimeoutError:
+            yield _SSE_KEEP_ALIVE_FRAME
+            continue
+        version = snapshot.version
+        # NOTE: the generator is paused until the frame has been sent,
+        # and always resumes with the newest snapshot,
+        # so a slow consumer only skips frames, and never piles them up in memory.
+        yield frame_encoder.encode(snapshot)
+        await asyncio.sleep(interval)
+
+
+def create_aria2_state_router(
+    store: Aria2StateStore, polling_config: Aria2StatePolling
+) -> APIRouter:
+    """
+    Args:
+        store: The store updated by `Aria2StatePoller`.
+        polling_config: The config of the poller, which updates `store`.
+    """
+    router = APIRouter()
+    delta_encoder = Aria2StateDeltaEncoder(store)
+    frame_encoder = _StatsFrameEncoder()
+
+    def check_polling_enabled() -> None:
+        if polling_config.interval_second <= 0:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="aria2c state polling is disabled.",
+            )
+
+    # NOTE: unlike the JSON-RPC proxy, it's safe to use `GET` method here,
+    # because these APIs are read-only.
+    # NOTE: use `async def`, so that it runs in the event loop instead of threadpool,
+    # because the store and the encoder are not thread-safe.
+    @router.get("/delta")
+    async def get_delta(version: int = 0) -> Response:  # pyright: ignore[reportUnusedFunction]
+        """Return the changes of aria2c downloads since the client's last-seen `version`.
+
+        - `added`: the new downloads, with all fields.
+        - `removed`: the gids of removed downloads.
+        - `changed`: `{gid: fields}`, only the changed fields of each download,
+            a field dropped from the download is `null`.
+        - `truncated`: if `true`, aria2c has more waiting or stopped downloads than
+            `server.extra.aria2_state_polling.max_waiting`/`max_stopped`; the ones beyond are not included,
+            and the ones which moved beyond the window are in `removed`.
+
+        Pass the returned `version` in the next request.
+        If `full` is `true`, the client should drop all it has and use `added` instead.
+        """
+        check_polling_enabled()
+        return Response(
+            content=delta_encoder.encode(version), media_type="application/json"
+        )
+
+    @router.get("/events")
+    async def get_events() -> StreamingResponse:  # pyright: ignore[reportUnusedFunction]
+        """A Server-Sent Events stream of aria2c live stats.
+
+        Each `stats` event contains the global stat and the progress of each active download.
+        Events are pushed at most once per `server.extra.aria2_state_polling.sse_interval_second`,
+        and only when the state changed.
+        """
+        check_polling_enabled()
+        return StreamingResponse(
+            _stats_stream(
+                store, frame_encoder, interval=polling_config.sse_interval_second
+            ),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    return router
@@ -0,0 +1,29 @@
+"""User authentication and management API routes.
+
+Visit <https://fastapi-users.github.io/fastapi-users/12.1/usage/routes/>
+to know how to use these routes.
+"""
+
+from fastapi import APIRouter
+
+from aria2_server.app._core.auth import AUTH_COOKIE_NAME, COOKIE_SECURE, Auth
+from aria2_server.db.user.schemas import UserRead, UserUpdate
+
+__all__ = (
+    "AUTH_COOKIE_NAME",
+    "COOKIE_SECURE",
+    "create_auth_router",
+    "create_users_router",
+)
+
+
+def create_auth_router(auth: Auth) -> APIRouter:
+    """`/login` and `/logout` of the cookie backend of `auth`."""
+    # HACK: this is fastapi-users typing issue
+    return auth.fastapi_users.get_auth_router(auth.backend)  # pyright: ignore[reportUnknownMemberType]
+
+
+def create_users_router(auth: Auth) -> APIRouter:
+    return auth.fastapi_users.get_users_router(
+        user_schema=UserRead, user_update_schema=UserUpdate
+    )
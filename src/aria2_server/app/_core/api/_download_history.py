@@ -0,0 +1,50 @@
+"""The APIs of the download history, see `aria2_server.app._core.aria2.Aria2HistoryArchiver`."""
+
+from datetime import datetime
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Query
+from typing_extensions import Annotated
+
+from aria2_server.app._core.aria2 import Aria2HistoryArchiver
+from aria2_server.db.download_history.schemas import ArchivedDownloadPage
+
+__all__ = ("create_download_history_router",)
+
+
+_MAX_PAGE_SIZE = 1000
+
+
+def create_download_history_router(archiver: Aria2HistoryArchiver) -> APIRouter:
+    router = APIRouter()
+
+    # NOTE: it's safe to use `GET` method here, because it's read-only.
+    @router.get("", response_model=ArchivedDownloadPage)
+    async def get_history(  # pyright: ignore[reportUnusedFunction]
+        status: Optional[Literal["complete", "error"]] = None,
+        directory: Annotated[Optional[str], Query(alias="dir")] = None,
+        completed_after: Optional[datetime] = None,
+        completed_before: Optional[datetime] = None,
+        cursor: Optional[int] = None,
+        limit: Annotated[int, Query(ge=1, le=_MAX_PAGE_SIZE)] = 100,
+    ):
+        """Return the archived downloads, newest first.
+
+        - `status`, `dir`: only return the downloads with this status or in this directory.
+        - `completed_after`, `completed_before`: only return the downloads archived in this time range.
+            NOTE: `completed_at` is when a download was archived, not when it stopped,
+            which aria2c does not report.
+        - `cursor`: the `next_cursor` of the previous page.
+        """
+        items = await archiver.get_page(
+            limit=limit,
+            cursor=cursor,
+            status=status,
+            directory=directory,
+            completed_after=completed_after,
+            completed_before=completed_before,
+        )
+        next_cursor = items[-1].id if len(items) == limit else None
+        return {"items": items, "next_cursor": next_cursor}
+
+    return router
@@ -0,0 +1,50 @@
+"""The APIs of aria2-server's download queue, see `aria2_server.app._core.aria2.Aria2DownloadQueue`."""
+
+from fastapi import APIRouter, HTTPException, Query, status
+from typing_extensions import Annotated
+
+from aria2_server.app._core.aria2 import Aria2DownloadQueue
+from aria2_server.db.download_queue.schemas import (
+    QueuedDownloadCreate,
+    QueuedDownloadPage,
+    QueuedDownloadRead,
+)
+
+__all__ = ("create_download_queue_router",)
+
+
+_MAX_PAGE_SIZE = 1000
+
+
+def create_download_queue_router(queue: Aria2DownloadQueue) -> APIRouter:
+    router = APIRouter()
+
+    @router.post(
+        "", status_code=status.HTTP_201_CREATED, response_model=QueuedDownloadRead
+    )
+    async def enqueue(download: QueuedDownloadCreate):  # pyright: ignore[reportUnusedFunction]
+        """Add a download to the queue, it will be added to aria2c when aria2c has a free slot."""
+        return await queue.enqueue(
+            download.method, download.params, priority=download.priority
+        )
+
+    # NOTE: it's safe to use `GET` method here, because it's read-only.
+    @router.get("", response_model=QueuedDownloadPage)
+    async def get_queue(  # pyright: ignore[reportUnusedFunction]
+        offset: Annotated[int, Query(ge=0)] = 0,
+        limit: Annotated[int, Query(ge=1, le=_MAX_PAGE_SIZE)] = 100,
+    ):
+        """Return the queued downloads in the order of being added to aria2c."""
+        total, items = await queue.get_page(offset=offset, limit=limit)
+        return {"total": total, "items": items}
+
+    @router.delete("/{item_id}", status_code=status.HTTP_204_NO_CONTENT)
+    async def remove(item_id: int) -> None:  # pyright: ignore[reportUnusedFunction]
+        """Remove a download which is not added to aria2c yet."""
+        if not await queue.remove(item_id):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="The download is not in the queue.",
+            )
+
+    return router
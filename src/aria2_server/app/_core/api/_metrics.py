@@ -0,0 +1,20 @@
+"""In-process metrics of aria2-server, see `aria2_server.app._core.metrics`."""
+
+from typing import Any, Dict
+
+from fastapi import APIRouter
+
+from aria2_server.app._core.metrics import MetricsRegistry
+
+__all__ = ("create_router",)
+
+
+def create_router(registry: MetricsRegistry) -> APIRouter:
+    router = APIRouter()
+
+    @router.get("")
+    async def get_metrics() -> Dict[str, Dict[str, Any]]:  # pyright: ignore[reportUnusedFunction]
+        """Return the current metrics of all components, keyed by component name."""
+        return registry.collect()
+
+    return router
@@ -0,0 +1,121 @@
+"""Encode the changes between two aria2c state snapshots."""
+
+from collections import OrderedDict
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from aria2_server.app._core.aria2._jsonrpc import dumps
+from aria2_server.app._core.aria2._state import Aria2StateSnapshot, Aria2StateStore
+
+__all__ = ("Aria2StateDeltaEncoder", "diff_downloads", "diff_snapshots")
+
+
+_DEFAULT_CACHE_SIZE = 32
+
+_Download = Dict[str, Any]
+
+
+def diff_downloads(
+    old: Mapping[str, _Download], new: Mapping[str, _Download]
+) -> Tuple[List[_Download], List[str], Dict[str, _Download]]:
+    """Compare two `{gid: download}` mappings.
+
+    Returns:
+        `(added, removed, changed)`:
+            - added: the downloads only in `new`, with all fields.
+            - removed: the gids only in `old`.
+            - changed: `{gid: fields}`, only the fields whose value changed,
+                and the fields dropped from the download with the value `None`.
+    """
+    added = [download for gid, download in new.items() if gid not in old]
+    removed = [gid for gid in old if gid not in new]
+    changed: Dict[str, _Download] = {}
+    for gid, download in new.items():
+        previous = old.get(gid)
+        if previous is None or previous == download:
+            continue
+        fields = {key: None for key in previous if key not in download}
+        fields.update(
+            (key, value)
+            for key, value in download.items()
+            if key not in previous or previous[key] != value
+        )
+        changed[gid] = fields
+    return added, removed, changed
+
+
+def diff_snapshots(
+    old: Optional[Aria2StateSnapshot], new: Aria2StateSnapshot
+) -> Dict[str, Any]:
+    """Build the delta from `old` to `new`.
+
+    If `old` is `None`, all downloads in `new` are returned as added, with `full` set to `True`.
+
+    If `new` is truncated (see `Aria2StateSnapshot.truncated`), it's a window of the downloads,
+    and the ones which moved beyond the window are reported as removed too;
+    so the client always holds exactly the downloads of the snapshot it has seen.
+    """
+    added, removed, changed = diff_downloads(
+        old.downloads() if old is not None else {}, new.downloads()
+    )
+    return {
+        "version": new.version,
+        "full": old is None,
+        "truncated": new.truncated,
+        "global_stat": new.global_stat,
+        "added": added,
+        "removed": removed,
+        "changed": changed,
+    }
+
+
+class Aria2StateDeltaEncoder:
+    """Encode the delta from the client's last-seen version to the latest snapshot of the store.
+
+    The encoded JSON is cached by `(last-seen version, latest version)`,
+    so that clients which are at the same version share the cost of diffing and serialization.
+    """
+
+    def __init__(
+        self, store: Aria2StateStore, *, cache_size: int = _DEFAULT_CACHE_SIZE
+    ) -> None:
+        self.store = store
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[int, int], bytes]" = OrderedDict()
+
+    def encode(self, since_version: int) -> bytes:
+        """
+        Args:
+            since_version: The last-seen version of the client, `0` means the client has nothing.
+                If the version is too old (i.e. not in the store history), a full state will be returned.
+
+        Returns:
+            The JSON of `diff_snapshots`.
+        """
+        latest = self.store.latest
+        if latest is None:
+            return dumps(
+                {
+                    "version": 0,
+                    "full": True,
+                    "truncated": False,
+                    "global_stat": None,
+                    "added": [],
+                    "removed": [],
+                    "changed": {},
+                }
+            ).encode("utf-8")
+
+        old = self.store.get(since_version)
+        # unknown version, the client should drop all it has
+        key = (old.version if old is not None else 0, latest.version)
+
+        encoded = self._cache.get(key)
+        if encoded is not None:
+            self._cache.move_to_end(key)
+            return encoded
+
+        encoded = dumps(diff_snapshots(old, latest)).encode("utf-8")
+        self._cache[key] = encoded
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return encoded
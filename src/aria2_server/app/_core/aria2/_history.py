@@ -0,0 +1,259 @@
+"""Archive the stopped downloads of aria2c into the db periodically.
+
+aria2c keeps the results of stopped downloads in memory (up to `max-download-result`),
+and `aria2.tellStopped` returns them as one large array;
+so they are moved into the db, which serves the history page by page with indexes.
+"""
+
+import asyncio
+import time
+from datetime import datetime, timezone
+from pathlib import PurePosixPath
+from typing import Any, Dict, List, Optional, Sequence
+
+import httpx
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from typing_extensions import Self
+
+from aria2_server import logger
+from aria2_server.app._core.aria2._rpc_client import Aria2RpcClient, Aria2RpcError
+from aria2_server.app._core.aria2._shards import Aria2ShardRouter
+from aria2_server.app._core.aria2._upstream import get_http_base_url
+from aria2_server.app._core.utils.tasks import PeriodicTask
+from aria2_server.config.schemas import Config
+from aria2_server.db.download_history import DownloadHistoryDatabase
+from aria2_server.db.download_history.models import ArchivedDownload
+
+__all__ = ("Aria2HistoryArchiver",)
+
+
+# `removed` downloads are left in aria2c, they are removed by users on purpose
+_ARCHIVED_STATUSES = frozenset(("complete", "error"))
+# see https://aria2.github.io/manual/en/html/aria2c.html#aria2.tellStatus
+_ARCHIVED_KEYS = [
+    "gid",
+    "status",
+    "dir",
+    "totalLength",
+    "completedLength",
+    "errorCode",
+    "errorMessage",
+    "files",
+    "bittorrent",
+]
+
+
+def _is_not_found(error: Aria2RpcError) -> bool:
+    # e.g. `GID 2089b05ecca3d829 is not found`
+    return "not found" in error.message
+
+
+def _get_name(download: Dict[str, Any]) -> str:
+    torrent_name = download.get("bittorrent", {}).get("info", {}).get("name")
+    if torrent_name:
+        return torrent_name
+    files = download.get("files") or [{}]
+    path = files[0].get("path")
+    if path:
+        # NOTE: aria2c always uses `/` as the path separator in the RPC
+        return PurePosixPath(path).name
+    uris = files[0].get("uris") or [{}]
+    return uris[0].get("uri", "")
+
+
+def _to_row(download: Dict[str, Any], completed_at: datetime) -> Dict[str, Any]:
+    is_error = download["status"] == "error"
+    return {
+        "gid": download["gid"],
+        "status": download["status"],
+        "dir": download.get("dir", ""),
+        "name": _get_name(download),
+        "total_length": int(download.get("totalLength", 0)),
+        "completed_length": int(download.get("completedLength", 0)),
+        "error_code": download.get("errorCode") if is_error else None,
+        "error_message": download.get("errorMessage") if is_error else None,
+        "completed_at": completed_at,
+        "info": download,
+    }
+
+
+class Aria2HistoryArchiver(PeriodicTask):
+    """Move the completed and errored downloads from aria2c into the db, in batches.
+
+    A download is purged from aria2c (i.e. `aria2.removeDownloadResult`)
+    only after it's committed to the db; and the GID is unique in the db,
+    so a download archived twice (e.g. the server crashed before purging) is stored once.
+
+    Examples:
+        ```py
+        archiver = Aria2HistoryArchiver(
+            rpc_client, session_maker=session_maker, interval=60, batch_size=1000
+        )
+        app.on_startup(archiver.start)
+        app.on_shutdown(archiver.aclose)
+        ```
+    """
+
+    def __init__(
+        self,
+        rpc_client: Aria2RpcClient,
+        *,
+        session_maker: "async_sessionmaker[AsyncSession]",
+        interval: float,
+        batch_size: int,
+    ) -> None:
+        """
+        Args:
+            rpc_client: The client of aria2c, with the rpc-secret.
+            session_maker: The db of the archive.
+            interval: The seconds between two runs.
+            batch_size: The max number of downloads archived in one transaction.
+        """
+        super().__init__(self._run_once, interval=interval, name="download history")
+        self.rpc_client = rpc_client
+        self.session_maker = session_maker
+        self.batch_size = batch_size
+        self.runs = 0
+        self.total_archived = 0
+        self.last_archived = 0
+        self.last_duration_second = 0.0
+        self.purge_failures = 0
+        """The number of archived downloads which failed to be purged from aria2c."""
+
+    @classmethod
+    def from_config(
+        cls,
+        client: httpx.AsyncClient,
+        config: Config,
+        *,
+        session_maker: "async_sessionmaker[AsyncSession]",
+        shard_router: Optional[Aria2ShardRouter] = None,
+    ) -> Self:
+        """Archive the aria2c of `config`, or all of its instances if they are routed,
+        see `Aria2ShardRouter.is_enabled`.
+
+        Args:
+            client: The pooled client used to connect to aria2c if it's not routed.
+            shard_router: The router of the aria2c instances, required if they are routed,
+                e.g. the one of the aria2c proxy; it's not closed by `aclose`.
+        """
+        history_config = config.server.extra.download_history
+        secret = config.aria2.rpc_secret.get_secret_value()
+        if Aria2ShardRouter.is_enabled(config):
+            if shard_router is None:
+                raise ValueError(
+                    "`shard_router` is required by several aria2c instances"
+                )
+            rpc_client = shard_router.rpc_client(secret=secret)
+        else:
+            rpc_client = Aria2RpcClient(
+                client, f"{get_http_base_url(config.aria2)}jsonrpc", secret=secret
+            )
+        return cls(
+            rpc_client,
+            session_maker=session_maker,
+            interval=history_config.interval_second,
+            batch_size=history_config.batch_size,
+        )
+
+    async def _purge(self, gids: List[str]) -> int:
+        """Remove the results from aria2c in one `system.multicall`,
+        return the number of the ones which are still in aria2c."""
+        if not gids:
+            return 0
+        outcomes = await self.rpc_client.multicall(
+            *(("aria2.removeDownloadResult", (gid,)) for gid in gids),
+            return_exceptions=True,
+        )
+        left = 0
+        for outcome in outcomes:
+            # NOTE: if it's not found, it has been removed by users in the meantime
+            if isinstance(outcome, Aria2RpcError) and not _is_not_found(outcome):
+                self.purge_failures += 1
+                left += 1
+        return left
+
+    async def archive(self) -> int:
+        """Run once, return the number of archived downloads.
+
+        Raises:
+            httpx.HTTPError: If failed to connect to aria2c,
+                the downloads archived before are committed.
+        """
+        start = time.perf_counter()
+        archived = 0
+        # the stopped downloads which are left in aria2c, i.e. to be skipped
+        offset = 0
+        try:
+            while True:
+                stopped: Sequence[Dict[str, Any]] = await self.rpc_client.call(
+                    "aria2.tellStopped", offset, self.batch_size, _ARCHIVED_KEYS
+                )
+                now = datetime.now(timezone.utc)
+                rows = [
+                    _to_row(download, now)
+                    for download in stopped
+                    if download.get("status") in _ARCHIVED_STATUSES
+                ]
+                async with self.session_maker() as session:
+                    await DownloadHistoryDatabase(session, ArchivedDownload).add_many(
+                        rows
+                    )
+                archived += len(rows)
+                left = await self._purge([row["gid"] for row in rows])
+                offset += len(stopped) - len(rows) + left
+                if len(stopped) < self.batch_size:
+                    break
+                # let other requests use the db and aria2c between batches
+                await asyncio.sleep(0)
+        finally:
+            duration = time.perf_counter() - start
+            self.runs += 1
+            self.total_archived += archived
+            self.last_archived = archived
+            self.last_duration_second = duration
+
+        if archived:
+            logger.info(
+                f"Archived {archived} stopped downloads of aria2c "
+                f"in {duration * 1000:.1f} ms"
+            )
+        return archived
+
+    async def _run_once(self) -> None:
+        try:
+            await self.archive()
+        except (httpx.HTTPError, Aria2RpcError) as e:
+            # e.g. aria2c is restarting, retry on the next round
+            logger.debug(f"Failed to archive the stopped downloads of aria2c: {e!r}")
+
+    async def get_page(
+        self,
+        *,
+        limit: int,
+        cursor: Optional[int] = None,
+        status: Optional[str] = None,
+        directory: Optional[str] = None,
+        completed_after: Optional[datetime] = None,
+        completed_before: Optional[datetime] = None,
+    ) -> Sequence[ArchivedDownload]:
+        """Return the newest archived downloads matching the filters,
+        see `DownloadHistoryDatabase.get_page`."""
+        async with self.session_maker() as session:
+            return await DownloadHistoryDatabase(session, ArchivedDownload).get_page(
+                limit=limit,
+                cursor=cursor,
+                status=status,
+                directory=directory,
+                completed_after=completed_after,
+                completed_before=completed_before,
+            )
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "runs": self.runs,
+            "total_archived": self.total_archived,
+            "last_archived": self.last_archived,
+            "last_duration_second": self.last_duration_second,
+            "purge_failures": self.purge_failures,
+        }
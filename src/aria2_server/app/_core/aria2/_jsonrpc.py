@@ -0,0 +1,52 @@
+"""JSON-RPC helpers for talking with aria2c.
+
+See <https://aria2.github.io/manual/en/html/aria2c.html#rpc-interface>
+"""
+
+import json
+from typing import Any, Dict, Optional
+
+__all__ = (
+    "INTERNAL_ERROR",
+    "INVALID_REQUEST",
+    "PARSE_ERROR",
+    "JsonRpcId",
+    "JsonRpcRequest",
+    "JsonRpcResponse",
+    "dumps",
+    "error_response",
+    "is_notification",
+)
+
+
+JsonRpcId = Any
+JsonRpcRequest = Dict[str, Any]
+JsonRpcResponse = Dict[str, Any]
+
+# https://www.jsonrpc.org/specification#error_object
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+INTERNAL_ERROR = -32603
+
+
+def dumps(obj: Any) -> str:
+    """Serialize `obj` to a compact JSON string."""
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def error_response(
+    id_: JsonRpcId, code: int, message: str, data: Optional[Any] = None
+) -> JsonRpcResponse:
+    error: Dict[str, Any] = {"code": code, "message": message}
+    if data is not None:
+        error["data"] = data
+    return {"jsonrpc": "2.0", "id": id_, "error": error}
+
+
+def is_notification(payload: Any) -> bool:
+    """Whether the payload is a notification (i.e. a request without `id`).
+
+    aria2c sends notifications such as `aria2.onDownloadStart` to WebSocket clients,
+    see <https://aria2.github.io/manual/en/html/aria2c.html#notifications>
+    """
+    return isinstance(payload, dict) and "method" in payload and "id" not in payload
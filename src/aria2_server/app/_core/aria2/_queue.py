@@ -0,0 +1,339 @@
+"""A download queue in the sqlite db, which feeds aria2c on demand.
+
+aria2c slows down and takes lots of memory with a huge waiting queue,
+so the downloads are kept in the db instead, and are added to aria2c
+only when it has free slots (i.e. `max-concurrent-downloads`).
+"""
+
+import asyncio
+import json
+import time
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+import httpx
+from httpx_ws import aconnect_ws
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from typing_extensions import Self
+
+from aria2_server import logger
+from aria2_server.app._core.aria2._jsonrpc import is_notification
+from aria2_server.app._core.aria2._rpc_client import Aria2RpcClient, Aria2RpcError
+from aria2_server.app._core.aria2._shards import Aria2Backend, Aria2ShardRouter
+from aria2_server.app._core.aria2._upstream import get_http_base_url, get_ws_base_url
+from aria2_server.config.schemas import Config
+from aria2_server.db.download_queue import DownloadQueueDatabase
+from aria2_server.db.download_queue.models import QueuedDownload
+
+__all__ = ("Aria2DownloadQueue",)
+
+
+_QUEUEABLE_METHODS = ("aria2.addUri", "aria2.addTorrent", "aria2.addMetalink")
+
+# a download stopped, i.e. its slot is free,
+# see https://aria2.github.io/manual/en/html/aria2c.html#notifications
+_SLOT_FREED_NOTIFICATIONS = frozenset(
+    ("aria2.onDownloadComplete", "aria2.onDownloadError", "aria2.onDownloadStop")
+)
+
+# the default of aria2c, see https://aria2.github.io/manual/en/html/aria2c.html#cmdoption-j
+_DEFAULT_MAX_CONCURRENT_DOWNLOADS = 5
+
+
+def _frees_slot(message: str) -> bool:
+    try:
+        payload = json.loads(message)
+    except ValueError:
+        return False
+    return is_notification(payload) and payload["method"] in _SLOT_FREED_NOTIFICATIONS
+
+
+class Aria2DownloadQueue:
+    """Keep the downloads in the db, and add them to aria2c when it has free slots.
+
+    - The queue is popped by `priority` (higher first), then in FIFO order.
+    - aria2c is refilled when a download stops, i.e. on the notifications from its WebSocket,
+        and every `refill_interval` seconds, in case a notification is missed.
+    - A download rejected by aria2c (e.g. an invalid URI) is dropped from the queue.
+    - A download is deleted from the db only after aria2c accepted it,
+        so it may be added twice if the server crashes in between, but never lost.
+
+    Examples:
+        ```py
+        queue = Aria2DownloadQueue(
+            rpc_client,
+            [backend],
+            session_maker=session_maker,
+            refill_interval=5,
+            batch_size=100,
+        )
+        app.on_startup(queue.start)
+        app.on_shutdown(queue.aclose)
+        await queue.enqueue("aria2.addUri", [["http://example.com"]], priority=1)
+        ```
+    """
+
+    def __init__(
+        self,
+        rpc_client: Aria2RpcClient,
+        backends: Sequence[Aria2Backend],
+        *,
+        session_maker: "async_sessionmaker[AsyncSession]",
+        refill_interval: float,
+        batch_size: int,
+        router: Optional[Aria2ShardRouter] = None,
+    ) -> None:
+        """
+        Args:
+            rpc_client: The client to add downloads to aria2c, with the rpc-secret.
+            backends: The aria2c instances behind `rpc_client`,
+                whose WebSocket notifications trigger refills.
+            session_maker: The db of the queue.
+            refill_interval: The max seconds between two refills.
+            batch_size: The max number of downloads added in one refill.
+            router: The router of `rpc_client` if it's routed, only its live instances are refilled;
+                it's not closed by `aclose`.
+        """
+        if refill_interval <= 0:
+            raise ValueError("refill_interval must be greater than 0")
+        self.rpc_client = rpc_client
+        self.backends = list(backends)
+        self.session_maker = session_maker
+        self.refill_interval = refill_interval
+        self.batch_size = batch_size
+        self.router = router
+        self.refills = 0
+        self.added = 0
+        """The number of downloads added to aria2c."""
+        self.rejected = 0
+        """The number of downloads rejected by aria2c, and dropped from the queue."""
+        self.last_refill_second = 0.0
+
+        # NOTE: create asyncio objects lazily in the running loop,
+        # because they are bound to the loop on creation before `Python 3.10`
+        self._wakeup: Optional[asyncio.Event] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._tasks: "Set[asyncio.Task[None]]" = set()
+
+    @classmethod
+    def from_config(
+        cls,
+        client: httpx.AsyncClient,
+        config: Config,
+        *,
+        session_maker: "async_sessionmaker[AsyncSession]",
+        shard_router: Optional[Aria2ShardRouter] = None,
+    ) -> Self:
+        """Feed the aria2c of `config`, or all of its instances if they are routed,
+        see `Aria2ShardRouter.is_enabled`.
+
+        Args:
+            client: The pooled client used to connect to aria2c if it's not routed.
+            shard_router: The router of the aria2c instances, required if they are routed.
+                It should be the one of the aria2c proxy, so that the GIDs placed by the queue
+                are known to the proxy; it's not closed by `aclose`.
+        """
+        queue_config = config.server.extra.download_queue
+        secret = config.aria2.rpc_secret.get_secret_value()
+        if Aria2ShardRouter.is_enabled(config):
+            if shard_router is None:
+                raise ValueError(
+                    "`shard_router` is required by several aria2c instances"
+                )
+            rpc_client = shard_router.rpc_client(secret=secret)
+            backends = shard_router.backends
+        else:
+            shard_router = None
+            rpc_client = Aria2RpcClient(
+                client, f"{get_http_base_url(config.aria2)}jsonrpc", secret=secret
+            )
+            backends = [
+                Aria2Backend(
+                    "aria2c", rpc_client, f"{get_ws_base_url(config.aria2)}jsonrpc"
+                )
+            ]
+        return cls(
+            rpc_client,
+            backends,
+            session_maker=session_maker,
+            refill_interval=queue_config.refill_interval_second,
+            batch_size=queue_config.batch_size,
+            router=shard_router,
+        )
+
+    def wake(self) -> None:
+        """Refill aria2c as soon as possible."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def enqueue(
+        self, method: str, params: List[Any], *, priority: int = 0
+    ) -> QueuedDownload:
+        """Add a download to the queue.
+
+        Args:
+            method: One of `aria2.addUri`, `aria2.addTorrent` and `aria2.addMetalink`.
+            params: The params of `method`, the rpc-secret will be added when it's sent to aria2c.
+
+        Raises:
+            ValueError: If `method` can not be queued.
+        """
+        if method not in _QUEUEABLE_METHODS:
+            raise ValueError(f"{method} can not be queued")
+        if params and isinstance(params[0], str) and params[0].startswith("token:"):
+            # NOTE: never store the rpc-secret in the db
+            params = params[1:]
+        async with self.session_maker() as session:
+            queued_download = await DownloadQueueDatabase(session, QueuedDownload).add(
+                method, params, priority=priority
+            )
+        self.wake()
+        return queued_download
+
+    async def get_page(
+        self, *, offset: int, limit: int
+    ) -> Tuple[int, Sequence[QueuedDownload]]:
+        """Return the total number of queued downloads, and a page of them in order."""
+        async with self.session_maker() as session:
+            download_queue_db = DownloadQueueDatabase(session, QueuedDownload)
+            return (
+                await download_queue_db.count(),
+                await download_queue_db.head(limit, offset),
+            )
+
+    async def remove(self, item_id: int) -> bool:
+        """Remove a download which is not added to aria2c yet, return whether it's removed."""
+        async with self.session_maker() as session:
+            removed = await DownloadQueueDatabase(session, QueuedDownload).delete(
+                [item_id]
+            )
+        return removed > 0
+
+    async def _free_slots(self) -> int:
+        # NOTE: if routed, the stat is merged from the live instances,
+        # and the option is answered by the first one of them.
+        stat, option = await self.rpc_client.multicall(
+            ("aria2.getGlobalStat", ()), ("aria2.getGlobalOption", ())
+        )
+        max_concurrent_downloads = int(
+            option.get("max-concurrent-downloads", _DEFAULT_MAX_CONCURRENT_DOWNLOADS)
+        )
+        busy = int(stat["numActive"]) + int(stat["numWaiting"])
+        instances = (
+            len(self.router.live_shards())
+            if self.router is not None
+            else len(self.backends)
+        )
+        return max_concurrent_downloads * instances - busy
+
+    async def refill(self) -> int:
+        """Add downloads to aria2c until it has no free slots, return the number of them.
+
+        Raises:
+            httpx.HTTPError: If failed to connect to aria2c,
+                the downloads not added yet are kept in the queue.
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            start = time.perf_counter()
+            added = 0
+            free_slots = min(await self._free_slots(), self.batch_size)
+            async with self.session_maker() as session:
+                download_queue_db = DownloadQueueDatabase(session, QueuedDownload)
+                # NOTE: a rejected download does not take a slot, so pop again
+                while added < free_slots:
+                    queued_downloads = await download_queue_db.head(free_slots - added)
+                    if not queued_downloads:
+                        break
+                    done: List[int] = []
+                    try:
+                        # NOTE: one by one, so that aria2c keeps the order of priority
+                        for queued in queued_downloads:
+                            try:
+                                await self.rpc_client.call(
+                                    queued.method, *queued.params
+                                )
+                            except Aria2RpcError as e:
+                                logger.warning(
+                                    f"aria2c rejected queued download {queued.id}: {e}"
+                                )
+                                self.rejected += 1
+                            else:
+                                added += 1
+                            done.append(queued.id)
+                    finally:
+                        await download_queue_db.delete(done)
+
+            self.refills += 1
+            self.added += added
+            self.last_refill_second = time.perf_counter() - start
+            return added
+
+    async def _refill_forever(self) -> None:
+        assert self._wakeup is not None
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.refill_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                added = await self.refill()
+            except (httpx.HTTPError, Aria2RpcError, ValueError) as e:
+                # e.g. aria2c is restarting, retry on the next round
+                logger.debug(f"Failed to refill aria2c from the download queue: {e!r}")
+                continue
+            except Exception:
+                logger.exception("Unexpected error in the download queue")
+                continue
+            if added >= self.batch_size:
+                # there may be more free slots
+                self._wakeup.set()
+
+    async def _listen(self, backend: Aria2Backend) -> None:
+        while True:
+            try:
+                async with aconnect_ws(
+                    backend.ws_url, backend.rpc_client.client
+                ) as session:
+                    # notifications may be missed while disconnected
+                    self.wake()
+                    while True:
+                        if _frees_slot(await session.receive_text()):
+                            self.wake()
+            except Exception as e:
+                logger.debug(
+                    f"aria2c WebSocket of the download queue ({backend.name}) "
+                    f"is closed: {e!r}"
+                )
+            await asyncio.sleep(self.refill_interval)
+
+    def _spawn(self, coro: Any) -> None:
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def start(self) -> None:
+        """Start refilling aria2c in the running event loop."""
+        if self._tasks:
+            raise RuntimeError("The download queue is already running")
+        self._wakeup = asyncio.Event()
+        self._wakeup.set()
+        self._spawn(self._refill_forever())
+        for backend in self.backends:
+            self._spawn(self._listen(backend))
+
+    async def aclose(self) -> None:
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "refills": self.refills,
+            "added": self.added,
+            "rejected": self.rejected,
+            "last_refill_second": self.last_refill_second,
+        }
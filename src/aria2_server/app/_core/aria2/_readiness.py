@@ -0,0 +1,138 @@
+"""Whether aria2c is ready to answer JSON-RPC requests.
+
+`Aria2Supervisor` marks aria2c as not ready after it exits,
+probes the restarted one with `aria2.getVersion`, and marks it as ready once it answers;
+meanwhile, the proxy holds the incoming requests in a bounded queue by `Aria2ReadinessGate.wait`,
+instead of failing them with connection errors.
+"""
+
+import asyncio
+import threading
+from typing import Any, Dict, List, Set, Tuple
+
+from aria2_server.app._core.metrics import metrics_registry
+from aria2_server.config import GLOBAL_CONFIG
+
+__all__ = (
+    "Aria2NotReadyError",
+    "Aria2ReadinessGate",
+    "aria2_readiness_gate",
+)
+
+
+class Aria2NotReadyError(Exception):
+    """aria2c is not ready, and the request can not wait for it."""
+
+
+class Aria2ReadinessGate:
+    """Hold the requests until aria2c is ready.
+
+    `set_ready` and `set_not_ready` can be called from any thread,
+    `wait` must be called in an event loop.
+
+    If there are several aria2c instances (see `server.extra.aria2_shards`),
+    each of them is a part of the gate, and the gate is open only if all parts are ready.
+    """
+
+    def __init__(self, *, timeout: float, max_waiting: int, parts: int = 1) -> None:
+        """
+        Args:
+            timeout: The max seconds a request waits for aria2c to be ready.
+            max_waiting: The max number of waiting requests,
+                beyond it, `Aria2NotReadyError` is raised immediately.
+            parts: The number of aria2c instances.
+        """
+        if parts < 1:
+            raise ValueError("parts must be greater than 0")
+        self.timeout = timeout
+        self.max_waiting = max_waiting
+        self.parts = parts
+        self.rejected = 0
+        self.timed_out = 0
+        self._ready_parts: Set[int] = set()
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._waiters: List[
+            Tuple[asyncio.AbstractEventLoop, "asyncio.Future[None]"]
+        ] = []
+
+    @property
+    def is_ready(self) -> bool:
+        return self._ready.is_set()
+
+    def set_ready(self, part: int = 0) -> None:
+        with self._lock:
+            self._ready_parts.add(part)
+            if len(self._ready_parts) < self.parts:
+                return
+            self._ready.set()
+            waiters, self._waiters = self._waiters, []
+        for loop, waiter in waiters:
+            loop.call_soon_threadsafe(_wake_up, waiter)
+
+    def set_not_ready(self, part: int = 0) -> None:
+        with self._lock:
+            self._ready_parts.discard(part)
+            self._ready.clear()
+
+    def wait_sync(self, timeout: float) -> bool:
+        """Block the current thread until aria2c is ready, return whether it's ready."""
+        return self._ready.wait(timeout)
+
+    async def wait(self) -> None:
+        """Return immediately if aria2c is ready, otherwise wait for it.
+
+        Raises:
+            Aria2NotReadyError: If there are too many waiting requests,
+                or aria2c is not ready within `timeout` seconds.
+        """
+        if self._ready.is_set():
+            return
+
+        loop = asyncio.get_running_loop()
+        waiter: "asyncio.Future[None]" = loop.create_future()
+        entry = (loop, waiter)
+        with self._lock:
+            # NOTE: check again, it may be set before acquiring the lock
+            if self._ready.is_set():
+                return
+            if len(self._waiters) >= self.max_waiting:
+                self.rejected += 1
+                raise Aria2NotReadyError("too many requests are waiting for aria2c")
+            self._waiters.append(entry)
+
+        try:
+            await asyncio.wait_for(waiter, self.timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise Aria2NotReadyError(
+                f"aria2c is not ready after {self.timeout} seconds"
+            ) from None
+        finally:
+            with self._lock:
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "ready": self.is_ready,
+            "waiting": len(self._waiters),
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
+
+
+def _wake_up(waiter: "asyncio.Future[None]") -> None:
+    # it may be cancelled by timeout
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+# NOTE: Don't unpack `GLOBAL_CONFIG` outside of a function
+aria2_readiness_gate = Aria2ReadinessGate(
+    timeout=GLOBAL_CONFIG.server.extra.aria2_readiness.timeout_second,
+    max_waiting=GLOBAL_CONFIG.server.extra.aria2_readiness.max_waiting,
+    parts=GLOBAL_CONFIG.server.extra.aria2_shards.count,
+)
+"""The readiness of the aria2c spawned by `Aria2WatchdogLifespan`, shared by the proxy."""
+metrics_registry.register("aria2_readiness", aria2_readiness_gate.metrics)
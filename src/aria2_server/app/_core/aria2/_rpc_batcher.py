@@ -0,0 +1,152 @@
+"""Coalesce concurrent aria2c JSON-RPC calls into `system.multicall` batches."""
+
+import asyncio
+import itertools
+from typing import Any, List, Optional, Set, Tuple
+
+from aria2_server.app._core.aria2._jsonrpc import (
+    INTERNAL_ERROR,
+    JsonRpcRequest,
+    JsonRpcResponse,
+    error_response,
+)
+from aria2_server.app._core.aria2._rpc_cache import READ_ONLY_METHODS, JsonRpcCaller
+
+__all__ = ("Aria2RpcBatcher",)
+
+
+_PendingCall = Tuple[JsonRpcRequest, "asyncio.Future[JsonRpcResponse]"]
+
+
+class Aria2RpcBatcher:
+    """Collect calls arriving within a small window, and send them as one `system.multicall`.
+
+    aria2c serves RPC in a single thread,
+    so fewer round trips mean a higher peak throughput.
+
+    Only calls of read-only methods are batched, because `system.multicall`
+    does not guarantee the order against other concurrent calls;
+    other calls are sent by `fetch` directly.
+    """
+
+    def __init__(self, fetch: JsonRpcCaller, *, window: float, max_size: int) -> None:
+        """
+        Args:
+            fetch: Send a JSON-RPC request object to aria2c, and return the response object.
+            window: The max seconds to wait for more calls before sending a batch.
+            max_size: The max number of calls in one batch, a full batch is sent immediately.
+        """
+        if window <= 0:
+            raise ValueError("window must be greater than 0")
+        if max_size < 1:
+            raise ValueError("max_size must be greater than 0")
+
+        self.fetch = fetch
+        self.window = window
+        self.max_size = max_size
+
+        self._ids = itertools.count()
+        self._pending: List[_PendingCall] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # store strong references of the sending tasks
+        self._tasks: "Set[asyncio.Task[None]]" = set()
+
+    @staticmethod
+    def is_batchable(request: Any) -> bool:
+        return (
+            isinstance(request, dict)
+            and "id" in request
+            and request.get("method") in READ_ONLY_METHODS
+            and isinstance(request.get("params", []), list)
+        )
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.get_running_loop().create_task(self._send(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _encode(self, batch: List[_PendingCall]) -> JsonRpcRequest:
+        # see https://aria2.github.io/manual/en/html/aria2c.html#system.multicall
+        return {
+            "jsonrpc": "2.0",
+            "id": f"aria2-server-batch-{next(self._ids)}",
+            "method": "system.multicall",
+            "params": [
+                [
+                    {
+                        "methodName": request["method"],
+                        "params": request.get("params", []),
+                    }
+                    for request, _ in batch
+                ]
+            ],
+        }
+
+    @staticmethod
+    def _decode(
+        batch: List[_PendingCall], response: JsonRpcResponse
+    ) -> List[JsonRpcResponse]:
+        """Split the response of `system.multicall` into the response of each call."""
+        results = response.get("result")
+        if not isinstance(results, list) or len(results) != len(batch):  # pyright: ignore[reportUnknownArgumentType]
+            error = response.get("error") or {}
+            return [
+                error_response(
+                    request["id"],
+                    error.get("code", INTERNAL_ERROR),
+                    error.get("message", "Invalid system.multicall response"),
+                )
+                for request, _ in batch
+            ]
+        # success: `[result]`, failure: `{"code": ..., "message": ...}`
+        return [
+            {"jsonrpc": "2.0", "id": request["id"], "result": result[0]}
+            if isinstance(result, list)
+            else {"jsonrpc": "2.0", "id": request["id"], "error": result}
+            for (request, _), result in zip(batch, results)  # pyright: ignore[reportUnknownVariableType, reportUnknownArgumentType]
+        ]
+
+    async def _send(self, batch: List[_PendingCall]) -> None:
+        try:
+            if len(batch) == 1:
+                responses = [await self.fetch(batch[0][0])]
+            else:
+                responses = self._decode(batch, await self.fetch(self._encode(batch)))
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), response in zip(batch, responses):
+            if not future.done():
+                future.set_result(response)
+
+    async def call(self, request: JsonRpcRequest) -> JsonRpcResponse:
+        """Answer `request` in a batch if it is batchable, otherwise by `fetch` directly."""
+        if not self.is_batchable(request):
+            return await self.fetch(request)
+
+        loop = asyncio.get_running_loop()
+        future: "asyncio.Future[JsonRpcResponse]" = loop.create_future()
+        self._pending.append((request, future))
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    async def aclose(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        for _, future in self._pending:
+            future.cancel()
+        self._pending.clear()
+        for task in self._tasks.copy():
+            task.cancel()
@@ -0,0 +1,183 @@
+"""Single-flight, short-TTL cache for side-effect-free aria2c JSON-RPC methods."""
+
+import asyncio
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Tuple
+
+from aria2_server.app._core.aria2._jsonrpc import JsonRpcRequest, JsonRpcResponse
+
+__all__ = ("READ_ONLY_METHODS", "Aria2RpcCache", "JsonRpcCaller")
+
+
+JsonRpcCaller = Callable[[JsonRpcRequest], Awaitable[JsonRpcResponse]]
+"""Send a JSON-RPC request object to aria2c, and return the response object."""
+
+
+# https://aria2.github.io/manual/en/html/aria2c.html#methods
+READ_ONLY_METHODS = frozenset(
+    (
+        "aria2.tellStatus",
+        "aria2.getUris",
+        "aria2.getFiles",
+        "aria2.getPeers",
+        "aria2.getServers",
+        "aria2.tellActive",
+        "aria2.tellWaiting",
+        "aria2.tellStopped",
+        "aria2.getOption",
+        "aria2.getGlobalOption",
+        "aria2.getGlobalStat",
+        "aria2.getVersion",
+        "aria2.getSessionInfo",
+        "system.listMethods",
+        "system.listNotifications",
+    )
+)
+"""The aria2c methods which have no side effect."""
+
+_DEFAULT_MAX_ENTRIES = 1024
+
+
+_CacheKey = Tuple[str, str]
+
+
+class _CacheEntry(NamedTuple):
+    response: JsonRpcResponse
+    expires_at: float
+
+
+class Aria2RpcCache:
+    """Serve identical calls of read-only methods from the in-flight or recently answered call.
+
+    - Calls are keyed by `method` and `params`.
+    - Calls of other methods (e.g. `aria2.addUri`, `aria2.pause`, `aria2.remove`)
+        are passed through, and invalidate the whole cache after they are answered,
+        unless they are read-only as a whole (e.g. a `system.multicall` of read-only methods),
+        see `is_write`.
+    - Error responses are never cached.
+    """
+
+    def __init__(self, ttl: float, *, max_entries: int = _DEFAULT_MAX_ENTRIES) -> None:
+        """
+        Args:
+            ttl: The seconds for which an answered call will be reused.
+            max_entries: The maximum number of cached calls.
+        """
+        if ttl <= 0:
+            raise ValueError("ttl must be greater than 0")
+        if max_entries < 1:
+            raise ValueError("max_entries must be greater than 0")
+
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self._entries: Dict[_CacheKey, _CacheEntry] = {}
+        self._in_flight: "Dict[_CacheKey, asyncio.Task[JsonRpcResponse]]" = {}
+        # bumped on every invalidation,
+        # so that calls started before the invalidation will not be stored
+        self._generation = 0
+
+    @staticmethod
+    def is_cacheable(request: Any) -> bool:
+        return (
+            isinstance(request, dict)
+            and "id" in request
+            and request.get("method") in READ_ONLY_METHODS
+        )
+
+    @staticmethod
+    def is_write(request: Any) -> bool:
+        """Whether `request` may change the state of aria2c.
+
+        A `system.multicall` or a batch (i.e. a JSON array) is a write if any of its calls is.
+        A malformed call is treated as a write, except a body which is not a JSON-RPC
+        request at all (e.g. `None` for an invalid JSON), which aria2c just rejects.
+        """
+        if isinstance(request, list):
+            items: List[Any] = request  # pyright: ignore[reportUnknownVariableType]
+            return any(Aria2RpcCache.is_write(item) for item in items)
+        if not isinstance(request, dict):
+            return False
+        call: Dict[str, Any] = request  # pyright: ignore[reportUnknownVariableType]
+        method = call.get("method")
+        if method != "system.multicall":
+            return method not in READ_ONLY_METHODS
+        # see https://aria2.github.io/manual/en/html/aria2c.html#system.multicall
+        params = call.get("params")
+        if not (isinstance(params, list) and params and isinstance(params[0], list)):
+            return True
+        return any(
+            not isinstance(inner, dict)
+            or inner.get("methodName") not in READ_ONLY_METHODS  # pyright: ignore[reportUnknownMemberType]
+            for inner in params[0]  # pyright: ignore[reportUnknownVariableType]
+        )
+
+    def invalidate(self) -> None:
+        self._generation += 1
+        self._entries.clear()
+        self._in_flight.clear()
+
+    def _store(self, key: _CacheKey, response: JsonRpcResponse) -> None:
+        now = time.monotonic()
+        if len(self._entries) >= self.max_entries:
+            self._entries = {
+                k: v for k, v in self._entries.items() if v.expires_at > now
+            }
+            # still full, drop the oldest one
+            if len(self._entries) >= self.max_entries:
+                del self._entries[next(iter(self._entries))]
+        self._entries[key] = _CacheEntry(response, now + self.ttl)
+
+    async def _fetch(
+        self, key: _CacheKey, request: JsonRpcRequest, fetch: JsonRpcCaller
+    ) -> JsonRpcResponse:
+        generation = self._generation
+        try:
+            response = await fetch(request)
+        finally:
+            if self._generation == generation:
+                self._in_flight.pop(key, None)
+        if self._generation == generation and "error" not in response:
+            self._store(key, response)
+        return response
+
+    async def call(
+        self, request: JsonRpcRequest, fetch: JsonRpcCaller
+    ) -> JsonRpcResponse:
+        """Answer `request` from the cache if possible, otherwise by `fetch`.
+
+        The `id` of the returned response is always the `id` of `request`.
+        """
+        if not self.is_cacheable(request):
+            try:
+                response = await fetch(request)
+            finally:
+                if self.is_write(request):
+                    self.invalidate()
+            return {**response, "id": request.get("id")}
+
+        key: _CacheKey = (
+            request["method"],
+            json.dumps(request.get("params"), sort_keys=True),
+        )
+
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at > time.monotonic():
+            self.hits += 1
+            return {**entry.response, "id": request["id"]}
+
+        task = self._in_flight.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.get_running_loop().create_task(
+                self._fetch(key, request, fetch)
+            )
+            self._in_flight[key] = task
+        else:
+            self.hits += 1
+        # NOTE: shield it, so that a cancelled caller will not cancel the shared call
+        response = await asyncio.shield(task)
+        return {**response, "id": request["id"]}
@@ -0,0 +1,148 @@
+"""A minimal aria2c JSON-RPC client over HTTP."""
+
+import asyncio
+import itertools
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+
+from aria2_server.app._core.aria2._jsonrpc import (
+    JsonRpcRequest,
+    JsonRpcResponse,
+    dumps,
+)
+
+__all__ = ("Aria2RpcClient", "Aria2RpcError")
+
+
+class Aria2RpcError(Exception):
+    """aria2c returned a JSON-RPC error object."""
+
+    def __init__(self, code: int, message: str) -> None:
+        super().__init__(f"[{code}] {message}")
+        self.code = code
+        self.message = message
+
+
+class Aria2RpcClient:
+    """Post JSON-RPC requests to aria2c through a (shared) `httpx.AsyncClient`.
+
+    Examples:
+        ```py
+        rpc_client = Aria2RpcClient(
+            httpx.AsyncClient(), "http://localhost:6800/jsonrpc", secret="secret"
+        )
+        version = await rpc_client.call("aria2.getVersion")
+        ```
+    """
+
+    def __init__(
+        self, client: httpx.AsyncClient, url: str, *, secret: Optional[str] = None
+    ) -> None:
+        """
+        Args:
+            client: The client used to connect to aria2c, it will not be closed by this class.
+            url: The HTTP url of aria2c JSON-RPC interface, e.g. `http://localhost:6800/jsonrpc`
+            secret: The rpc-secret of aria2c, used by `call`.
+        """
+        self.client = client
+        self.url = url
+        self.secret = secret
+        self._ids = itertools.count()
+
+    async def request(self, request: JsonRpcRequest) -> JsonRpcResponse:
+        """Send a raw JSON-RPC request object, and return the raw response object.
+
+        The request is sent as it is, so the caller should take care of `id` and rpc-secret.
+        """
+        response = await self.client.post(
+            self.url,
+            content=dumps(request).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        # NOTE: DO NOT `raise_for_status()` here,
+        # aria2c responds the JSON-RPC error object with a non-200 status code.
+        return response.json()
+
+    def _with_secret(self, method: str, params: Sequence[Any]) -> List[Any]:
+        # `system.*` methods do not need the rpc-secret,
+        # see https://aria2.github.io/manual/en/html/aria2c.html#rpc-authorization-secret-token
+        if self.secret is not None and not method.startswith("system."):
+            return [f"token:{self.secret}", *params]
+        return list(params)
+
+    async def call(self, method: str, *params: Any) -> Any:
+        """Call a aria2c JSON-RPC method, the rpc-secret will be added automatically.
+
+        Raises:
+            Aria2RpcError: If aria2c returned an error object.
+        """
+        response = await self.request(
+            {
+                "jsonrpc": "2.0",
+                "id": f"aria2-server-{next(self._ids)}",
+                "method": method,
+                "params": self._with_secret(method, params),
+            }
+        )
+        error = response.get("error")
+        if error is not None:
+            raise Aria2RpcError(error.get("code", -1), error.get("message", ""))
+        return response.get("result")
+
+    async def multicall(
+        self, *calls: Tuple[str, Sequence[Any]], return_exceptions: bool = False
+    ) -> List[Any]:
+        """Call multiple methods in one `system.multicall` request.
+
+        Args:
+            calls: `(method, params)` pairs, the rpc-secret will be added to each `params` automatically.
+            return_exceptions: If `True`, the error of a call is returned as an `Aria2RpcError`
+                in place of its result, like `asyncio.gather`.
+
+        Returns:
+            The result of each call, in order.
+
+        Raises:
+            Aria2RpcError: If aria2c returned an error object for any call,
+                and `return_exceptions` is `False`.
+        """
+        methods: List[Dict[str, Any]] = [
+            {"methodName": method, "params": self._with_secret(method, params)}
+            for method, params in calls
+        ]
+        results: List[Any] = await self.call("system.multicall", methods)
+
+        outputs: List[Any] = []
+        for result in results:
+            # see https://aria2.github.io/manual/en/html/aria2c.html#system.multicall
+            # success: `[result]`, failure: `{"code": ..., "message": ...}`
+            if isinstance(result, dict):
+                error = Aria2RpcError(result.get("code", -1), result.get("message", ""))  # pyright: ignore[reportUnknownArgumentType, reportUnknownMemberType]
+                if not return_exceptions:
+                    raise error
+                outputs.append(error)
+            else:
+                outputs.append(result[0])
+        return outputs
+
+    async def wait_until_ready(self, *, timeout: float, interval: float = 0.05) -> bool:
+        """Poll `aria2.getVersion` until aria2c answers, e.g. after spawning it.
+
+        Returns:
+            Whether aria2c is ready within `timeout` seconds.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                await self.call("aria2.getVersion")
+            except Aria2RpcError:
+                # e.g. wrong rpc-secret, but aria2c is listening
+                return True
+            except (httpx.HTTPError, ValueError):
+                if time.monotonic() >= deadline:
+                    return False
+                await asyncio.sleep(interval)
+            else:
+                return True
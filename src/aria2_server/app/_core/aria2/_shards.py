@@ -0,0 +1,627 @@
+"""Present several aria2c instances as one aria2c JSON-RPC server.
+
+See <https://aria2.github.io/manual/en/html/aria2c.html#methods>
+"""
+
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+from typing_extensions import Self
+
+from aria2_server import logger
+from aria2_server.app._core.aria2._jsonrpc import (
+    INVALID_REQUEST,
+    PARSE_ERROR,
+    JsonRpcRequest,
+    JsonRpcResponse,
+    error_response,
+)
+from aria2_server.app._core.aria2._rpc_client import Aria2RpcClient, Aria2RpcError
+from aria2_server.app._core.aria2._upstream import (
+    create_upstream_client,
+    get_http_base_url,
+    get_ws_base_url,
+)
+from aria2_server.app._core.metrics import MetricsRegistry, metrics_registry
+from aria2_server.app._core.utils.tasks import PeriodicTask
+from aria2_server.config.schemas import Config
+
+__all__ = ("Aria2Backend", "Aria2ShardRouter")
+
+
+# the first param (after the rpc-secret) is the GID
+_GID_METHODS = frozenset(
+    (
+        "aria2.remove",
+        "aria2.forceRemove",
+        "aria2.pause",
+        "aria2.forcePause",
+        "aria2.unpause",
+        "aria2.forceUnpause",
+        "aria2.tellStatus",
+        "aria2.getUris",
+        "aria2.getFiles",
+        "aria2.getPeers",
+        "aria2.getServers",
+        "aria2.changePosition",
+        "aria2.changeUri",
+        "aria2.getOption",
+        "aria2.changeOption",
+        "aria2.removeDownloadResult",
+    )
+)
+# return the new GID (or GIDs for `aria2.addMetalink`)
+_ADD_METHODS = frozenset(("aria2.addUri", "aria2.addTorrent", "aria2.addMetalink"))
+_LIST_METHODS = frozenset(
+    ("aria2.tellActive", "aria2.tellWaiting", "aria2.tellStopped")
+)
+# affect all downloads or the instance itself
+# NOTE: they are sent to the remote instances too, as if all instances were one aria2c,
+# e.g. `aria2.changeGlobalOption` changes the options of the download nodes,
+# and `aria2.purgeDownloadResult` purges their results.
+_BROADCAST_METHODS = frozenset(
+    (
+        "aria2.pauseAll",
+        "aria2.forcePauseAll",
+        "aria2.unpauseAll",
+        "aria2.purgeDownloadResult",
+        "aria2.changeGlobalOption",
+        "aria2.saveSession",
+    )
+)
+# stop the instance, so they are only sent to the local instances,
+# a client of aria2-server must not be able to stop the remote ones (e.g. download nodes).
+_LOCAL_BROADCAST_METHODS = frozenset(("aria2.shutdown", "aria2.forceShutdown"))
+
+# the loads of instances are refreshed at most once per this seconds
+_LOAD_TTL = 1
+
+# `{"result": ...}` or `{"error": ...}`, i.e. a JSON-RPC response without `jsonrpc` and `id`
+_Outcome = Dict[str, Any]
+
+
+def _split_token(params: List[Any]) -> Tuple[List[Any], List[Any]]:
+    """Split `params` into `([token], args)`, the token may be absent."""
+    if params and isinstance(params[0], str) and params[0].startswith("token:"):
+        return params[:1], params[1:]
+    return [], params
+
+
+def _is_int(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+class _RoutedRpcClient(Aria2RpcClient):
+    def __init__(self, router: "Aria2ShardRouter", *, secret: Optional[str]) -> None:
+        first = router.backends[0].rpc_client
+        super().__init__(first.client, first.url, secret=secret)
+        self.router = router
+
+    async def request(self, request: JsonRpcRequest) -> JsonRpcResponse:
+        return await self.router.request(request)
+
+
+@dataclass
+class Aria2Backend:
+    """An aria2c instance behind `Aria2ShardRouter`."""
+
+    name: str
+    """The name in logs and metrics, e.g. `shard-0` or `192.168.1.2:6800`."""
+    rpc_client: Aria2RpcClient
+    """The HTTP client of the instance, its `secret` is the rpc-secret of the instance."""
+    ws_url: str
+    """The WebSocket url of the instance, e.g. `ws://localhost:6800/jsonrpc`"""
+    owns_client: bool = False
+    """Whether `rpc_client.client` is closed by `Aria2ShardRouter.aclose`."""
+    is_remote: bool = False
+    """Whether it's a remote instance of `server.extra.aria2_federation`,
+    i.e. not launched by aria2-server."""
+
+
+def _format_host(host: str) -> str:
+    # e.g. `[::1]` for IPv6
+    return f"[{host}]" if ":" in host and not host.startswith("[") else host
+
+
+class Aria2ShardRouter:
+    """Route JSON-RPC requests to several aria2c instances as if they were one.
+
+    - Calls about a GID (e.g. `aria2.tellStatus`) are routed to the instance owning the GID,
+        by a bounded GID -> instance table, which is filled by the results of
+        `aria2.add*` and `aria2.tell*`; unknown GIDs are looked up on all instances.
+    - New downloads (`aria2.add*`) are placed on the instance
+        with the fewest active and waiting downloads.
+    - The results of `aria2.tellActive`, `aria2.tellWaiting`, `aria2.tellStopped`
+        and `aria2.getGlobalStat` are merged;
+        `offset` and `num` of `aria2.tell{Waiting,Stopped}` apply to the concatenation of instances.
+    - Calls affecting all downloads (e.g. `aria2.pauseAll`, `aria2.changeGlobalOption`
+        and `aria2.purgeDownloadResult`) are sent to all instances, including the remote ones;
+        except `aria2.shutdown` and `aria2.forceShutdown`, which are only sent to the local ones.
+    - `system.multicall` is split, and each call is routed as above.
+    - Others (e.g. `aria2.getVersion`) are answered by the first instance.
+
+    The rpc-secret of clients (i.e. `secret`) is replaced by the one of each instance,
+    so the instances, e.g. remote ones of `server.extra.aria2_federation`, may have their own rpc-secret.
+
+    An instance which failed to connect is unhealthy, and is skipped by the calls above
+    (i.e. they answer with the results of the other instances),
+    until it answers `aria2.getVersion` in the periodic health check.
+    """
+
+    def __init__(
+        self,
+        backends: Sequence[Aria2Backend],
+        *,
+        max_gids: int,
+        secret: Optional[str] = None,
+        health_check_interval: float = 0,
+    ) -> None:
+        """
+        Args:
+            backends: The aria2c instances, only `request` of their `rpc_client` is used for routing.
+            max_gids: The max number of GIDs in the GID -> instance table,
+                the least recently used ones are forgotten.
+            secret: The rpc-secret expected from clients;
+                if `None`, the requests are sent as they are.
+            health_check_interval: The seconds between health checks,
+                which run in the event loop of the first request;
+                if `0`, the instances are always considered healthy.
+        """
+        if not backends:
+            raise ValueError("backends must not be empty")
+        self.backends = list(backends)
+        self.max_gids = max_gids
+        self.secret = secret
+        self.health_check_interval = health_check_interval
+        self.healthy = [True] * len(self.backends)
+        """Whether each instance is healthy."""
+        self.placements = [0] * len(self.backends)
+        """The number of downloads placed on each instance."""
+        self.gid_lookups = 0
+        """The number of GIDs looked up on all instances, i.e. misses of the table."""
+
+        self._gids: "OrderedDict[str, int]" = OrderedDict()
+        self._loads: List[float] = [0] * len(self.backends)
+        self._placed_since_refresh = [0] * len(self.backends)
+        self._loads_refreshed_at = -math.inf
+        self._health_check: Optional[PeriodicTask] = None
+        if health_check_interval > 0:
+            self._health_check = PeriodicTask(
+                self.check_health,
+                interval=health_check_interval,
+                name="aria2c health check",
+            )
+        self._health_check_started = False
+
+    @staticmethod
+    def is_enabled(config: Config) -> bool:
+        """Whether the JSON-RPC calls of `config` must be routed by this class,
+        i.e. there are several aria2c instances."""
+        return (
+            config.server.extra.aria2_shards.count > 1
+            or len(config.server.extra.aria2_federation.backends) > 0
+        )
+
+    @classmethod
+    def from_config(
+        cls,
+        client: httpx.AsyncClient,
+        config: Config,
+        *,
+        name: str,
+        registry: MetricsRegistry = metrics_registry,
+    ) -> Self:
+        """Route to the aria2c instances of `config.server.extra.aria2_shards`
+        and `config.server.extra.aria2_federation`.
+
+        Args:
+            client: The pooled client used to connect to the local instances.
+            name: The prefix of the names of the clients to remote instances in the metrics,
+                each remote instance has its own pool, configured by `config.server.extra.aria2_upstream`.
+            registry: Where to register the pool metrics of the remote instances.
+        """
+        shards_config = config.server.extra.aria2_shards
+        federation_config = config.server.extra.aria2_federation
+        secret = config.aria2.rpc_secret.get_secret_value()
+
+        backends = [
+            Aria2Backend(
+                f"shard-{shard}",
+                Aria2RpcClient(
+                    client,
+                    f"{get_http_base_url(config.aria2, shard=shard)}jsonrpc",
+                    secret=secret,
+                ),
+                f"{get_ws_base_url(config.aria2, shard=shard)}jsonrpc",
+            )
+            for shard in range(shards_config.count)
+        ]
+        for remote in federation_config.backends:
+            netloc = f"{_format_host(remote.host)}:{remote.port}"
+            remote_client = create_upstream_client(
+                f"{name}.{netloc}",
+                upstream_config=config.server.extra.aria2_upstream,
+                registry=registry,
+                verify=remote.verify_tls,
+            )
+            http_proto, ws_proto = ("https", "wss") if remote.secure else ("http", "ws")
+            backends.append(
+                Aria2Backend(
+                    netloc,
+                    Aria2RpcClient(
+                        remote_client,
+                        f"{http_proto}://{netloc}/jsonrpc",
+                        secret=(
+                            remote.secret.get_secret_value()
+                            if remote.secret is not None
+                            else None
+                        ),
+                    ),
+                    f"{ws_proto}://{netloc}/jsonrpc",
+                    owns_client=True,
+                    is_remote=True,
+                )
+            )
+
+        return cls(
+            backends,
+            max_gids=shards_config.max_gids,
+            secret=secret,
+            health_check_interval=federation_config.health_check_interval_second,
+        )
+
+    def rpc_client(self, *, secret: Optional[str]) -> Aria2RpcClient:
+        """Return an `Aria2RpcClient` whose requests are routed by this router."""
+        return _RoutedRpcClient(self, secret=secret)
+
+    @property
+    def shards(self) -> range:
+        return range(len(self.backends))
+
+    def live_shards(self) -> List[int]:
+        """The healthy instances, which answer the merged and broadcast calls."""
+        # NOTE: if all instances are unhealthy, try all of them anyway
+        return [shard for shard in self.shards if self.healthy[shard]] or list(
+            self.shards
+        )
+
+    def _mark(self, shard: int, healthy: bool) -> None:
+        if self.healthy[shard] != healthy:
+            name = self.backends[shard].name
+            if healthy:
+                logger.info(f"aria2c backend '{name}' is healthy again")
+                # its load is unknown, so refresh the loads on the next placement
+                self._loads_refreshed_at = -math.inf
+            else:
+                logger.warning(f"aria2c backend '{name}' is unhealthy")
+        self.healthy[shard] = healthy
+
+    async def check_health(self) -> None:
+        """Check every instance by `aria2.getVersion`, and update `healthy`."""
+
+        async def check(shard: int) -> None:
+            try:
+                await self.backends[shard].rpc_client.call("aria2.getVersion")
+            except (Aria2RpcError, httpx.HTTPError, ValueError) as e:
+                # NOTE: a wrong rpc-secret (i.e. `Aria2RpcError`) makes it unusable, too
+                logger.debug(f"aria2c backend health check failed: {e!r}")
+                self._mark(shard, False)
+            else:
+                self._mark(shard, True)
+
+        await asyncio.gather(*(check(shard) for shard in self.shards))
+
+    async def aclose(self) -> None:
+        """Stop the health check, and close the clients owned by the backends."""
+        if self._health_check is not None:
+            await self._health_check.aclose()
+            self._health_check_started = False
+        for backend in self.backends:
+            if backend.owns_client:
+                await backend.rpc_client.client.aclose()
+
+    def _remember(self, gid: str, shard: int) -> None:
+        self._gids[gid] = shard
+        self._gids.move_to_end(gid)
+        while len(self._gids) > self.max_gids:
+            self._gids.popitem(last=False)
+
+    def shard_of(self, gid: str) -> Optional[int]:
+        """Return the instance owning `gid` in the table, or `None` if unknown."""
+        shard = self._gids.get(gid)
+        if shard is not None:
+            self._gids.move_to_end(gid)
+        return shard
+
+    def _params_for(self, shard: int, params: List[Any]) -> List[Any]:
+        token, args = _split_token(params)
+        if self.secret is None or token != [f"token:{self.secret}"]:
+            # NOTE: a wrong rpc-secret is sent as it is, so that the instance rejects it
+            return params
+        secret = self.backends[shard].rpc_client.secret
+        return [f"token:{secret}", *args] if secret is not None else args
+
+    async def _call(self, shard: int, method: str, params: List[Any]) -> _Outcome:
+        try:
+            response = await self.backends[shard].rpc_client.request(
+                {
+                    "jsonrpc": "2.0",
+                    "id": "aria2-server-shard",
+                    "method": method,
+                    "params": self._params_for(shard, params),
+                }
+            )
+        except (httpx.HTTPError, ValueError):
+            # NOTE: without health checks, it would never be healthy again
+            if self._health_check is not None:
+                self._mark(shard, False)
+            raise
+        if "error" in response:
+            return {"error": response["error"]}
+        return {"result": response.get("result")}
+
+    async def _call_live(
+        self, method: str, params: List[Any], shards: Optional[List[int]] = None
+    ) -> List[Tuple[int, _Outcome]]:
+        """Call `method` on all healthy instances (or `shards`), the failed ones are skipped.
+
+        Raises:
+            httpx.HTTPError: If all instances failed.
+        """
+        if shards is None:
+            shards = self.live_shards()
+        outcomes = await asyncio.gather(
+            *(self._call(shard, method, params) for shard in shards),
+            return_exceptions=True,
+        )
+        succeeded: List[Tuple[int, _Outcome]] = []
+        for shard, outcome in zip(shards, outcomes):
+            if isinstance(outcome, Exception):
+                name = self.backends[shard].name
+                logger.debug(f"aria2c backend '{name}' failed: {outcome!r}")
+                continue
+            if isinstance(outcome, BaseException):
+                raise outcome
+            succeeded.append((shard, outcome))
+        if not succeeded:
+            raise outcomes[0]  # pyright: ignore[reportGeneralTypeIssues]
+        return succeeded
+
+    async def _refresh_loads(self, token: List[Any]) -> None:
+        outcomes = await asyncio.gather(
+            *(self._call(shard, "aria2.getGlobalStat", token) for shard in self.shards),
+            return_exceptions=True,
+        )
+        for shard, outcome in enumerate(outcomes):
+            try:
+                assert isinstance(outcome, dict)
+                stat = outcome["result"]
+                self._loads[shard] = int(stat["numActive"]) + int(stat["numWaiting"])
+            except Exception:
+                # the instance is not available, do not place downloads on it
+                self._loads[shard] = math.inf
+        self._placed_since_refresh = [0] * len(self.backends)
+        self._loads_refreshed_at = time.monotonic()
+
+    async def _pick_shard(self, token: List[Any]) -> int:
+        if time.monotonic() - self._loads_refreshed_at >= _LOAD_TTL:
+            await self._refresh_loads(token)
+        return min(
+            self.live_shards(),
+            key=lambda shard: self._loads[shard] + self._placed_since_refresh[shard],
+        )
+
+    async def _add(self, method: str, params: List[Any]) -> _Outcome:
+        token, _ = _split_token(params)
+        shard = await self._pick_shard(token)
+        outcome = await self._call(shard, method, params)
+        if "result" in outcome:
+            result = outcome["result"]
+            for gid in result if isinstance(result, list) else [result]:
+                if isinstance(gid, str):
+                    self._remember(gid, shard)
+            self.placements[shard] += 1
+            self._placed_since_refresh[shard] += 1
+        return outcome
+
+    async def _locate(self, gid: str, token: List[Any]) -> Optional[int]:
+        self.gid_lookups += 1
+        for shard, outcome in await self._call_live(
+            "aria2.tellStatus", [*token, gid, ["gid"]]
+        ):
+            if "result" in outcome:
+                self._remember(gid, shard)
+                return shard
+        return None
+
+    async def _call_by_gid(self, method: str, params: List[Any]) -> _Outcome:
+        token, args = _split_token(params)
+        gid = args[0] if args and isinstance(args[0], str) else None
+        if gid is None:
+            # invalid params, let aria2c report the error
+            return await self._call(self.live_shards()[0], method, params)
+        shard = self.shard_of(gid)
+        if shard is None:
+            shard = await self._locate(gid, token)
+        # NOTE: if the GID is not found, let the first instance report the error
+        return await self._call(
+            shard if shard is not None else self.live_shards()[0], method, params
+        )
+
+    def _learn(self, items: Any, shard: int) -> List[Any]:
+        if not isinstance(items, list):
+            return []
+        for item in items:  # pyright: ignore[reportUnknownVariableType]
+            if isinstance(item, dict) and isinstance(item.get("gid"), str):  # pyright: ignore[reportUnknownMemberType]
+                self._remember(item["gid"], shard)  # pyright: ignore[reportUnknownArgumentType]
+        return items  # pyright: ignore[reportUnknownVariableType]
+
+    async def _merge_lists(self, method: str, params: List[Any]) -> _Outcome:
+        token, args = _split_token(params)
+        window: Optional[Tuple[int, int]] = None
+        reverse = False
+        if method != "aria2.tellActive":
+            if len(args) < 2 or not _is_int(args[0]) or not _is_int(args[1]):
+                # invalid params, let aria2c report the error
+                return await self._call(self.live_shards()[0], method, params)
+            offset, num, keys = args[0], args[1], args[2:]
+            if offset >= 0:
+                params = [*token, 0, offset + num, *keys]
+                window = (offset, offset + num)
+            else:
+                # a negative offset counts from the last item, in reverse order,
+                # so the reversed concatenation starts from the last instance
+                skip = -offset - 1
+                params = [*token, -1, skip + num, *keys]
+                window = (skip, skip + num)
+                reverse = True
+
+        outcomes = await self._call_live(method, params)
+        items: List[Any] = []
+        for shard, outcome in reversed(outcomes) if reverse else outcomes:
+            if "error" in outcome:
+                return outcome
+            items.extend(self._learn(outcome["result"], shard))
+        if window is not None:
+            items = items[window[0] : window[1]]
+        return {"result": items}
+
+    async def _merge_stats(self, params: List[Any]) -> _Outcome:
+        merged: Dict[str, Any] = {}
+        for _, outcome in await self._call_live("aria2.getGlobalStat", params):
+            if "error" in outcome:
+                return outcome
+            for key, value in outcome["result"].items():
+                # e.g. `{"downloadSpeed": "1024", "numActive": "1", ...}`
+                try:
+                    merged[key] = str(int(merged.get(key, 0)) + int(value))
+                except (TypeError, ValueError):
+                    merged.setdefault(key, value)
+        return {"result": merged}
+
+    async def _broadcast(
+        self, method: str, params: List[Any], shards: Optional[List[int]] = None
+    ) -> _Outcome:
+        outcomes = await self._call_live(method, params, shards)
+        for _, outcome in outcomes:
+            if "error" in outcome:
+                return outcome
+        return outcomes[0][1]
+
+    async def _broadcast_locally(self, method: str, params: List[Any]) -> _Outcome:
+        local_shards = [
+            shard for shard in self.shards if not self.backends[shard].is_remote
+        ]
+        if not local_shards:
+            return {
+                "error": {
+                    "code": 1,
+                    "message": f"{method} is not sent to remote aria2c instances",
+                }
+            }
+        # NOTE: if all of them are unhealthy, try all of them anyway
+        live_shards = [shard for shard in local_shards if self.healthy[shard]]
+        return await self._broadcast(method, params, live_shards or local_shards)
+
+    async def _multicall(self, params: List[Any]) -> _Outcome:
+        if len(params) != 1 or not isinstance(params[0], list):
+            # invalid params, let aria2c report the error
+            return await self._call(self.live_shards()[0], "system.multicall", params)
+
+        async def call(method_call: Any) -> Any:
+            # see https://aria2.github.io/manual/en/html/aria2c.html#system.multicall
+            # success: `[result]`, failure: `{"code": ..., "message": ...}`
+            if (
+                not isinstance(method_call, dict)
+                or not isinstance(method_call.get("methodName"), str)  # pyright: ignore[reportUnknownMemberType]
+                or method_call["methodName"] == "system.multicall"
+            ):
+                return {"code": 1, "message": "Invalid method call"}
+            method_params = method_call.get("params", [])  # pyright: ignore[reportUnknownMemberType]
+            outcome = await self._route(
+                method_call["methodName"],  # pyright: ignore[reportUnknownArgumentType]
+                method_params if isinstance(method_params, list) else [],  # pyright: ignore[reportUnknownArgumentType]
+            )
+            if "error" in outcome:
+                return outcome["error"]
+            return [outcome["result"]]
+
+        # NOTE: unlike aria2c, the calls are executed concurrently
+        return {"result": list(await asyncio.gather(*(call(c) for c in params[0])))}
+
+    async def _route(self, method: str, params: List[Any]) -> _Outcome:
+        if method == "system.multicall":
+            return await self._multicall(params)
+        if method in _ADD_METHODS:
+            return await self._add(method, params)
+        if method in _GID_METHODS:
+            return await self._call_by_gid(method, params)
+        if method in _LIST_METHODS:
+            return await self._merge_lists(method, params)
+        if method == "aria2.getGlobalStat":
+            return await self._merge_stats(params)
+        if method in _BROADCAST_METHODS:
+            return await self._broadcast(method, params)
+        if method in _LOCAL_BROADCAST_METHODS:
+            return await self._broadcast_locally(method, params)
+        return await self._call(self.live_shards()[0], method, params)
+
+    async def request(self, request: JsonRpcRequest) -> JsonRpcResponse:
+        """Route a JSON-RPC request object, and return its response object.
+
+        It has the same signature as `Aria2RpcClient.request`,
+        so it can be used by `Aria2RpcCache` and `Aria2RpcBatcher` as the upstream.
+
+        Raises:
+            httpx.HTTPError: If failed to connect to any involved instance.
+        """
+        if self._health_check is not None and not self._health_check_started:
+            self._health_check_started = True
+            self._health_check.start()
+        if not isinstance(request, dict) or not isinstance(request.get("method"), str):  # pyright: ignore[reportUnnecessaryIsInstance]
+            return error_response(
+                request.get("id") if isinstance(request, dict) else None,  # pyright: ignore[reportUnnecessaryIsInstance]
+                INVALID_REQUEST,
+                "Invalid Request",
+            )
+        params = request.get("params", [])
+        outcome = await self._route(
+            request["method"], params if isinstance(params, list) else []
+        )
+        return {"jsonrpc": "2.0", "id": request.get("id"), **outcome}
+
+    async def handle(self, payload: Any) -> Any:
+        """Route a parsed JSON-RPC payload, i.e. a request object or a batch of them.
+
+        `None` means the body is not valid JSON.
+        """
+        if payload is None:
+            return error_response(None, PARSE_ERROR, "Parse error")
+        if isinstance(payload, list):
+            if not payload:
+                return error_response(None, INVALID_REQUEST, "Invalid Request")
+            return list(
+                await asyncio.gather(*(self.request(request) for request in payload))  # pyright: ignore[reportUnknownVariableType]
+            )
+        return await self.request(payload)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "gids": len(self._gids),
+            "gid_lookups": self.gid_lookups,
+            "backends": [
+                {
+                    "name": backend.name,
+                    "healthy": healthy,
+                    "placements": placements,
+                }
+                for backend, healthy, placements in zip(
+                    self.backends, self.healthy, self.placements
+                )
+            ],
+        }
@@ -0,0 +1,255 @@
+"""Poll aria2c once per tick, and share the result with all readers.
+
+Instead of letting every viewer poll aria2c by itself,
+readers (e.g. the proxy, NiceGUI pages and APIs) should read the latest snapshot
+from `aria2_state_store`, so that the cost of aria2c RPC stays flat
+no matter how many viewers there are.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set
+
+import httpx
+from typing_extensions import Self
+
+from aria2_server import logger
+from aria2_server.app._core.aria2._rpc_client import Aria2RpcClient, Aria2RpcError
+from aria2_server.app._core.aria2._shards import Aria2ShardRouter
+from aria2_server.app._core.aria2._upstream import get_http_base_url
+from aria2_server.app._core.utils.tasks import PeriodicTask
+from aria2_server.config.schemas import Config
+
+__all__ = (
+    "Aria2StatePoller",
+    "Aria2StateSnapshot",
+    "Aria2StateStore",
+    "aria2_state_store",
+)
+
+
+_DEFAULT_HISTORY_SIZE = 16
+
+
+@dataclass(frozen=True)
+class Aria2StateSnapshot:
+    """The state of aria2c at a moment.
+
+    The downloads are the results of `aria2.tellActive`, `aria2.tellWaiting` and `aria2.tellStopped`,
+    see <https://aria2.github.io/manual/en/html/aria2c.html#aria2.tellStatus>
+    """
+
+    version: int
+    """Increased by one every time the state of aria2c changes."""
+    timestamp: float
+    """The unix timestamp when this snapshot was polled."""
+    global_stat: Dict[str, Any]
+    """The result of `aria2.getGlobalStat`."""
+    active: List[Dict[str, Any]]
+    waiting: List[Dict[str, Any]]
+    stopped: List[Dict[str, Any]]
+
+    @property
+    def truncated(self) -> bool:
+        """Whether aria2c has more waiting or stopped downloads than this snapshot,
+        i.e. the poller only fetched a window of them."""
+        # NOTE: `numStopped` is capped by `--max-download-result`, like `aria2.tellStopped`
+        num_waiting = int(self.global_stat.get("numWaiting", 0))
+        num_stopped = int(self.global_stat.get("numStopped", 0))
+        return num_waiting > len(self.waiting) or num_stopped > len(self.stopped)
+
+    def downloads(self) -> Dict[str, Dict[str, Any]]:
+        """All downloads in this snapshot, keyed by `gid`."""
+        return {
+            download["gid"]: download
+            for downloads in (self.active, self.waiting, self.stopped)
+            for download in downloads
+        }
+
+
+class Aria2StateStore:
+    """Keep the latest snapshots of aria2c state in memory.
+
+    The store only keeps the latest `history_size` snapshots,
+    so that readers can compare the latest snapshot with a recent one.
+    """
+
+    def __init__(self, history_size: int = _DEFAULT_HISTORY_SIZE) -> None:
+        if history_size < 1:
+            raise ValueError("history_size must be greater than 0")
+        self.history_size = history_size
+        self._history: "OrderedDict[int, Aria2StateSnapshot]" = OrderedDict()
+        self._version = 0
+        self._waiters: "Set[asyncio.Future[Aria2StateSnapshot]]" = set()
+
+    @property
+    def version(self) -> int:
+        """The version of the latest snapshot, `0` means there is no snapshot yet."""
+        return self._version
+
+    @property
+    def latest(self) -> Optional[Aria2StateSnapshot]:
+        return self._history.get(self._version)
+
+    def get(self, version: int) -> Optional[Aria2StateSnapshot]:
+        """Get the snapshot of `version`, return `None` if it is too old or not existent."""
+        return self._history.get(version)
+
+    def update(
+        self,
+        *,
+        global_stat: Dict[str, Any],
+        active: List[Dict[str, Any]],
+        waiting: List[Dict[str, Any]],
+        stopped: List[Dict[str, Any]],
+    ) -> Aria2StateSnapshot:
+        """Put a new snapshot into the store.
+
+        If nothing changed compared with the latest snapshot, the version will not be increased.
+        """
+        latest = self.latest
+        if (
+            latest is not None
+            and latest.global_stat == global_stat
+            and latest.active == active
+            and latest.waiting == waiting
+            and latest.stopped == stopped
+        ):
+            return latest
+
+        self._version += 1
+        snapshot = Aria2StateSnapshot(
+            version=self._version,
+            timestamp=time.time(),
+            global_stat=global_stat,
+            active=active,
+            waiting=waiting,
+            stopped=stopped,
+        )
+        self._history[snapshot.version] = snapshot
+        while len(self._history) > self.history_size:
+            self._history.popitem(last=False)
+
+        for waiter in self._waiters:
+            if not waiter.done():
+                waiter.set_result(snapshot)
+        self._waiters.clear()
+        return snapshot
+
+    async def wait_for_update(self, after_version: int) -> Aria2StateSnapshot:
+        """Wait until the version of the latest snapshot is greater than `after_version`."""
+        latest = self.latest
+        if latest is not None and latest.version > after_version:
+            return latest
+
+        waiter: "asyncio.Future[Aria2StateSnapshot]" = (
+            asyncio.get_running_loop().create_future()
+        )
+        self._waiters.add(waiter)
+        try:
+            return await waiter
+        finally:
+            self._waiters.discard(waiter)
+
+
+aria2_state_store = Aria2StateStore()
+"""The store shared by all readers in aria2-server."""
+
+
+class Aria2StatePoller(PeriodicTask):
+    """Poll aria2c with one `system.multicall` per tick, and put the result into the store.
+
+    Examples:
+        ```py
+        poller = Aria2StatePoller(
+            rpc_client, aria2_state_store, interval=1, max_waiting=100, max_stopped=100
+        )
+        app.on_startup(poller.start)
+        app.on_shutdown(poller.aclose)
+        ```
+    """
+
+    def __init__(
+        self,
+        rpc_client: Aria2RpcClient,
+        store: Aria2StateStore,
+        *,
+        interval: float,
+        max_waiting: int,
+        max_stopped: int,
+    ) -> None:
+        """
+        Args:
+            rpc_client: The client used to poll aria2c, its `client` is not closed by `aclose`.
+            store: The store to put the polled snapshots.
+            interval: The seconds between two polls.
+            max_waiting: The max number of waiting downloads to poll.
+            max_stopped: The max number of stopped downloads to poll.
+        """
+        super().__init__(self.poll, interval=interval, name="aria2 state poller")
+        self.rpc_client = rpc_client
+        self.store = store
+        self.max_waiting = max_waiting
+        self.max_stopped = max_stopped
+        self._is_available = True
+
+    @classmethod
+    def from_config(
+        cls,
+        client: httpx.AsyncClient,
+        config: Config,
+        store: Aria2StateStore,
+        *,
+        shard_router: Optional[Aria2ShardRouter] = None,
+    ) -> Self:
+        """Poll the aria2c of `config`, or all of its instances as one if they are routed,
+        see `Aria2ShardRouter.is_enabled`.
+
+        Args:
+            client: The pooled client used to connect to aria2c if it's not routed.
+            store: The store to put the polled snapshots.
+            shard_router: The router of the aria2c instances, required if they are routed.
+                It should be the one of the aria2c proxy; it's not closed by `aclose`.
+        """
+        polling_config = config.server.extra.aria2_state_polling
+        secret = config.aria2.rpc_secret.get_secret_value()
+        if Aria2ShardRouter.is_enabled(config):
+            if shard_router is None:
+                raise ValueError(
+                    "`shard_router` is required by several aria2c instances"
+                )
+            rpc_client = shard_router.rpc_client(secret=secret)
+        else:
+            rpc_client = Aria2RpcClient(
+                client, f"{get_http_base_url(config.aria2)}jsonrpc", secret=secret
+            )
+        return cls(
+            rpc_client,
+            store,
+            interval=polling_config.interval_second,
+            max_waiting=polling_config.max_waiting,
+            max_stopped=polling_config.max_stopped,
+        )
+
+    async def poll(self) -> Optional[Aria2StateSnapshot]:
+        """Poll aria2c once, return `None` if aria2c is not available."""
+        try:
+            global_stat, active, waiting, stopped = await self.rpc_client.multicall(
+                ("aria2.getGlobalStat", []),
+                ("aria2.tellActive", []),
+                ("aria2.tellWaiting", [0, self.max_waiting]),
+                ("aria2.tellStopped", [0, self.max_stopped]),
+            )
+        except (httpx.HTTPError, ValueError, Aria2RpcError) as e:
+            # NOTE: only log once, aria2c may be restarting.
+            if self._is_available:
+                logger.warning(f"Failed to poll aria2c state: {e!r}")
+            self._is_available = False
+            return None
+
+        self._is_available = True
+        return self.store.update(
+            global_stat=global_stat, active=active, waiting=waiting, stopped=stopped
+        )
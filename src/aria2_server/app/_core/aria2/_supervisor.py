@@ -0,0 +1,464 @@
+"""Spawn aria2c and restart it when it exits, in an event loop.
+
+The exit of aria2c is awaited by `asyncio.subprocess.Process.wait`,
+i.e. notified by the child watcher of asyncio (a pidfd on Linux with Python 3.12+),
+so no thread is blocked for the lifetime of aria2c.
+"""
+
+import asyncio
+import math
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import threading
+import time
+from contextlib import AbstractContextManager
+from typing import (
+    Any,
+    Coroutine,
+    Dict,
+    List,
+    Literal,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
+
+import httpx
+from typing_extensions import Self
+
+from aria2_server import logger
+from aria2_server.app._core.aria2._readiness import (
+    Aria2ReadinessGate,
+    aria2_readiness_gate,
+)
+from aria2_server.app._core.aria2._rpc_client import Aria2RpcClient
+from aria2_server.app._core.aria2._upstream import get_http_base_url
+from aria2_server.app._core.metrics import MetricsRegistry, metrics_registry
+from aria2_server.config import GLOBAL_CONFIG
+
+__all__ = ("Aria2Supervisor", "Aria2SupervisorState", "Aria2WatchdogLifespan")
+
+
+_T = TypeVar("_T")
+
+_PROBE_REQUEST_TIMEOUT = 1
+
+Aria2SupervisorState = Literal["starting", "ready", "backoff", "crash_loop", "stopped"]
+
+
+def _get_cmd_args(shard: int = 0) -> List[str]:
+    """The command of the aria2c instance `shard`, see `server.extra.aria2_shards`."""
+    aria2c_exec = shutil.which("aria2c")
+    if aria2c_exec is None:
+        raise RuntimeError("aria2c executable not found")
+
+    # https://aria2.github.io/manual/en/html/aria2c.html
+    logger.info(f"aria2c executable: {aria2c_exec}")
+    assert (
+        GLOBAL_CONFIG.aria2.enable_rpc == "true"
+    ), "aria2.enable_rpc can only be set to 'ture'"
+    cmd_args = [
+        aria2c_exec,
+        f"--rpc-listen-port={GLOBAL_CONFIG.aria2.rpc_listen_port + shard}",
+        f"--rpc-secret={GLOBAL_CONFIG.aria2.rpc_secret.get_secret_value()}",
+        f"--enable-rpc={GLOBAL_CONFIG.aria2.enable_rpc}",
+        f"--rpc-listen-all={GLOBAL_CONFIG.aria2.rpc_listen_all}",
+        f"--rpc-secure={GLOBAL_CONFIG.aria2.rpc_secure}",
+    ]
+
+    if GLOBAL_CONFIG.aria2.conf_path is not None:
+        cmd_args.append(f"--conf-path={GLOBAL_CONFIG.aria2.conf_path}")
+
+    # NOTE: the cli args take precedence over `aria2.conf`
+    download_dirs = GLOBAL_CONFIG.server.extra.aria2_shards.download_dirs
+    if download_dirs:
+        cmd_args.append(f"--dir={download_dirs[shard]}")
+
+    return cmd_args
+
+
+async def _spawn(cmd_args: Sequence[str]) -> asyncio.subprocess.Process:
+    # modified from: https://github.com/WSH032/aria2-wheel/blob/f11f10a4fc7c315a7432e26a3f17041945a8123e/README.md?plain=1#L92-L138
+    if sys.platform == "win32":
+        return await asyncio.create_subprocess_exec(
+            *cmd_args, creationflags=subprocess.CREATE_NEW_PROCESS_GROUP
+        )
+    # TODO: prefer `process_group = value`, but the param is only available on Python 3.11+,
+    # maybe we can use `preexec_fn = lambda: setpgid(0, value)`
+    return await asyncio.create_subprocess_exec(*cmd_args, start_new_session=True)
+
+
+def _send_signal(process: asyncio.subprocess.Process, *, kill: bool) -> None:
+    try:
+        if sys.platform == "win32":
+            # https://stackoverflow.com/questions/44124338/trying-to-implement-signal-ctrl-c-event-in-python3-6
+            if kill:
+                process.kill()
+            else:
+                process.send_signal(signal.CTRL_BREAK_EVENT)
+        else:
+            os.killpg(
+                os.getpgid(process.pid), signal.SIGKILL if kill else signal.SIGINT
+            )
+    except ProcessLookupError:
+        # it has exited
+        pass
+
+
+class Aria2Supervisor:
+    """Spawn aria2c, and restart it when it exits, in the running event loop.
+
+    aria2c is restarted immediately after a normal exit
+    (e.g. the user closed it through the rpc interface);
+    if it exits sooner than `min_uptime` seconds after starting, it is a failed start,
+    and the next restart is delayed by an exponential backoff.
+    After `crash_loop_max_failures` consecutive failed starts, it is not restarted anymore.
+
+    Examples:
+        ```py
+        supervisor = Aria2Supervisor(...)
+        if not await supervisor.start():
+            ...  # aria2c exited, or is not ready in time
+        await supervisor.aclose()
+        ```
+    """
+
+    def __init__(
+        self,
+        cmd_args: Sequence[str],
+        rpc_url: str,
+        *,
+        secret: Optional[str],
+        readiness_gate: Aria2ReadinessGate,
+        readiness_part: int = 0,
+        startup_timeout: float,
+        restart_backoff_initial: float,
+        restart_backoff_max: float,
+        min_uptime: float,
+        crash_loop_max_failures: int,
+        shutdown_timeout: float,
+    ) -> None:
+        """
+        Args:
+            cmd_args: The command to spawn aria2c.
+            rpc_url: The HTTP url of aria2c JSON-RPC interface, e.g. `http://localhost:6800/jsonrpc`
+            secret: The rpc-secret of aria2c.
+            readiness_gate: Opened after aria2c answers `aria2.getVersion`,
+                and closed after it exits.
+            readiness_part: The part of `readiness_gate` owned by this aria2c instance.
+            startup_timeout: The max seconds `start` waits for aria2c to answer `aria2.getVersion`
+                after spawning it, and after which a warning is logged on restarts;
+                aria2c is still probed in the background until it answers or exits.
+            restart_backoff_initial: The seconds to wait before restarting aria2c
+                after the first failed start, doubled after each consecutive failed start.
+            restart_backoff_max: The max seconds to wait before restarting aria2c.
+            min_uptime: If aria2c exits sooner than it after starting, it is a failed start.
+            crash_loop_max_failures: Stop restarting aria2c after this many
+                consecutive failed starts, `0` means never.
+            shutdown_timeout: The max seconds to wait for aria2c to exit gracefully
+                in `aclose`, then it will be killed.
+        """
+        self.cmd_args = list(cmd_args)
+        self.rpc_url = rpc_url
+        self.secret = secret
+        self.readiness_gate = readiness_gate
+        self.readiness_part = readiness_part
+        self.startup_timeout = startup_timeout
+        self.restart_backoff_initial = restart_backoff_initial
+        self.restart_backoff_max = restart_backoff_max
+        self.min_uptime = min_uptime
+        self.crash_loop_max_failures = crash_loop_max_failures
+        self.shutdown_timeout = shutdown_timeout
+
+        self.state: Aria2SupervisorState = "stopped"
+        self.restarts = 0
+        self.consecutive_failures = 0
+        self.last_exit_code: Optional[int] = None
+        self.last_restart_latency_second: Optional[float] = None
+        """From the exit of aria2c to the restarted one being ready, including the backoff."""
+        self.max_restart_latency_second: Optional[float] = None
+
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._started_at = 0.0
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._http_client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def process(self) -> Optional[asyncio.subprocess.Process]:
+        """The current aria2c subprocess, it may have exited."""
+        return self._process
+
+    def _backoff(self, failures: int) -> float:
+        if failures == 0:
+            return 0
+        return min(
+            self.restart_backoff_initial * 2 ** (failures - 1), self.restart_backoff_max
+        )
+
+    async def _spawn(self) -> asyncio.subprocess.Process:
+        self.state = "starting"
+        self._process = await _spawn(self.cmd_args)
+        self._started_at = time.monotonic()
+        return self._process
+
+    async def _wait_until_ready(
+        self, process: asyncio.subprocess.Process, *, timeout: float
+    ) -> bool:
+        """Wait for `process` to answer `aria2.getVersion`, then open the gate.
+
+        Return `False` if it exits or is not ready within `timeout` seconds.
+        """
+        assert self._http_client is not None
+        rpc_client = Aria2RpcClient(self._http_client, self.rpc_url, secret=self.secret)
+        probe = asyncio.ensure_future(rpc_client.wait_until_ready(timeout=timeout))
+        exited = asyncio.ensure_future(process.wait())
+        try:
+            await asyncio.wait((probe, exited), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            probe.cancel()
+            exited.cancel()
+
+        if probe.done() and not probe.cancelled() and probe.result():
+            self.state = "ready"
+            self.readiness_gate.set_ready(self.readiness_part)
+            return True
+        # NOTE: if it has exited, the exit code will be logged by `_supervise`
+        if process.returncode is None:
+            logger.warning(f"aria2c is not ready after {timeout} seconds")
+        return False
+
+    def _record_restart(self, exited_at: float) -> None:
+        latency = time.monotonic() - exited_at
+        self.last_restart_latency_second = latency
+        self.max_restart_latency_second = max(
+            latency, self.max_restart_latency_second or 0
+        )
+        logger.info(f"aria2c restarted in {latency * 1000:.1f} ms")
+
+    async def _restart(
+        self, exited_at: float
+    ) -> Tuple[Optional[asyncio.subprocess.Process], bool]:
+        """Return the new process (`None` if failed to spawn aria2c), and whether it's ready."""
+        try:
+            process = await self._spawn()
+        except OSError:
+            logger.exception("Failed to restart aria2c")
+            return None, False
+        self.restarts += 1
+        ready = await self._wait_until_ready(process, timeout=self.startup_timeout)
+        if ready:
+            self._record_restart(exited_at)
+        return process, ready
+
+    async def _supervise(
+        self, process: Optional[asyncio.subprocess.Process], *, ready: bool
+    ) -> None:
+        # `None` for the process spawned by `start`
+        exited_at: Optional[float] = None
+        while True:
+            if process is not None:
+                if not ready:
+                    # NOTE: e.g. aria2c is loading a large session file,
+                    # keep probing it, so that the gate opens as soon as it answers.
+                    ready = await self._wait_until_ready(process, timeout=math.inf)
+                    if ready and exited_at is not None:
+                        self._record_restart(exited_at)
+                returncode = await process.wait()
+                self.last_exit_code = returncode
+                uptime = time.monotonic() - self._started_at
+                logger.warning(
+                    f"aria2c subprocess exited with code {returncode} "
+                    f"after {uptime:.1f} seconds, "
+                    "perhaps the user closed it through the rpc interface"
+                )
+                failed = uptime < self.min_uptime
+            else:
+                failed = True
+            exited_at = time.monotonic()
+            # NOTE: hold the new requests until the next subprocess is ready
+            self.readiness_gate.set_not_ready(self.readiness_part)
+
+            self.consecutive_failures = self.consecutive_failures + 1 if failed else 0
+            if 0 < self.crash_loop_max_failures <= self.consecutive_failures:
+                self.state = "crash_loop"
+                logger.error(
+                    f"aria2c failed to start {self.consecutive_failures} times "
+                    "in a row, stop restarting it, "
+                    "check the output of aria2c for details"
+                )
+                return
+
+            delay = self._backoff(self.consecutive_failures)
+            if delay > 0:
+                self.state = "backoff"
+                logger.warning(f"restarting aria2c in {delay} seconds...")
+                await asyncio.sleep(delay)
+            else:
+                logger.warning("restarting aria2c...")
+            process, ready = await self._restart(exited_at)
+
+    async def start(self) -> bool:
+        """Spawn aria2c, and keep restarting it in the running event loop until `aclose`.
+
+        Returns:
+            Whether aria2c answers `aria2.getVersion` within `startup_timeout` seconds.
+
+        Raises:
+            OSError: If failed to spawn aria2c.
+        """
+        if self._task is not None:
+            raise RuntimeError("The supervisor of aria2c is already started")
+        # NOTE: a short-lived client without metrics, forbid the system proxy settings
+        self._http_client = httpx.AsyncClient(
+            timeout=_PROBE_REQUEST_TIMEOUT, mounts={"all://": None}
+        )
+        try:
+            process = await self._spawn()
+        except BaseException:
+            await self.aclose()
+            raise
+        ready = await self._wait_until_ready(process, timeout=self.startup_timeout)
+        self._task = asyncio.get_running_loop().create_task(
+            self._supervise(process, ready=ready)
+        )
+        return ready
+
+    async def _shutdown(self, process: asyncio.subprocess.Process) -> None:
+        _send_signal(process, kill=False)
+        try:
+            await asyncio.wait_for(process.wait(), self.shutdown_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"aria2c did not exit in {self.shutdown_timeout} seconds, killing it"
+            )
+            _send_signal(process, kill=True)
+            await process.wait()
+
+    async def aclose(self) -> None:
+        """Stop restarting aria2c, then shutdown it gracefully."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._process is not None and self._process.returncode is None:
+            await self._shutdown(self._process)
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+        self.readiness_gate.set_not_ready(self.readiness_part)
+        self.state = "stopped"
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "pid": self._process.pid if self._process is not None else None,
+            "restarts": self.restarts,
+            "consecutive_failures": self.consecutive_failures,
+            "last_exit_code": self.last_exit_code,
+            "last_restart_latency_second": self.last_restart_latency_second,
+            "max_restart_latency_second": self.max_restart_latency_second,
+        }
+
+
+# HACK: `AbstractContextManager` is not a generic class before `Python 3.9`
+# see: https://github.com/microsoft/pyright/issues/7893
+class Aria2WatchdogLifespan(AbstractContextManager):  # pyright: ignore[reportMissingTypeArgument]
+    """Spawn aria2c on enter, and return after it answers `aria2.getVersion`.
+
+    Each aria2c instance (see `server.extra.aria2_shards`) is supervised by an `Aria2Supervisor`,
+    in an event loop of a background thread,
+    because the lifespan is entered before the server (and its event loop) starts,
+    and exited after the server stops.
+
+    Raises:
+        RuntimeError: If aria2c exits, or is not ready within
+            `server.extra.aria2_readiness.startup_timeout_second` seconds.
+    """
+
+    def __init__(
+        self,
+        *,
+        readiness_gate: Aria2ReadinessGate = aria2_readiness_gate,
+        registry: MetricsRegistry = metrics_registry,
+    ) -> None:
+        supervisor_config = GLOBAL_CONFIG.server.extra.aria2_supervisor
+        self.startup_timeout = (
+            GLOBAL_CONFIG.server.extra.aria2_readiness.startup_timeout_second
+        )
+        shard_count = GLOBAL_CONFIG.server.extra.aria2_shards.count
+        if readiness_gate.parts != shard_count:
+            raise ValueError(f"readiness_gate must have {shard_count} parts")
+        self.supervisors = [
+            Aria2Supervisor(
+                _get_cmd_args(shard),
+                f"{get_http_base_url(shard=shard)}jsonrpc",
+                secret=GLOBAL_CONFIG.aria2.rpc_secret.get_secret_value(),
+                readiness_gate=readiness_gate,
+                readiness_part=shard,
+                startup_timeout=self.startup_timeout,
+                restart_backoff_initial=supervisor_config.restart_backoff_initial_second,
+                restart_backoff_max=supervisor_config.restart_backoff_max_second,
+                min_uptime=supervisor_config.min_uptime_second,
+                crash_loop_max_failures=supervisor_config.crash_loop_max_failures,
+                shutdown_timeout=supervisor_config.shutdown_timeout_second,
+            )
+            for shard in range(shard_count)
+        ]
+        """The supervisor of each aria2c instance, in the order of shards."""
+        for shard, supervisor in enumerate(self.supervisors):
+            registry.register(f"aria2_supervisor.{shard}", supervisor.metrics)
+        self.readiness_gate = readiness_gate
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="aria2c-supervisor", daemon=True
+        )
+
+    def _stop_loop(self) -> None:
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def _run(self, coro: "Coroutine[Any, Any, _T]") -> _T:
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    async def _start_all(self) -> bool:
+        results = await asyncio.gather(
+            *(supervisor.start() for supervisor in self.supervisors),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, BaseException):
+                await self._aclose_all()
+                raise result
+        return all(results)
+
+    async def _aclose_all(self) -> None:
+        await asyncio.gather(*(supervisor.aclose() for supervisor in self.supervisors))
+
+    def __enter__(self) -> Self:
+        self._thread.start()
+        try:
+            ready = self._run(self._start_all())
+        except BaseException:
+            self._stop_loop()
+            raise
+
+        if not ready:
+            self.__exit__()
+            raise RuntimeError(
+                "aria2c exited or is not ready after "
+                f"{self.startup_timeout} seconds, "
+                "check the output of aria2c for details"
+            )
+        return self
+
+    def __exit__(self, *_) -> None:
+        self._run(self._aclose_all())
+        self._stop_loop()
@@ -0,0 +1,132 @@
+"""Where and how to connect to the aria2c JSON-RPC server launched by aria2-server."""
+
+from typing import Any, Dict, Optional
+
+import httpx
+
+from aria2_server.app._core.metrics import MetricsRegistry, metrics_registry
+from aria2_server.config import GLOBAL_CONFIG
+from aria2_server.config.schemas import Aria2, Aria2Upstream
+
+__all__ = ("create_upstream_client", "get_http_base_url", "get_ws_base_url")
+
+
+def _get_netloc(aria2: Aria2, shard: int) -> str:
+    # e.g. localhost:6800
+    return f"localhost:{aria2.rpc_listen_port + shard}"
+
+
+def _is_secure_rpc(aria2: Aria2) -> bool:
+    return aria2.rpc_secure == "true"
+
+
+# NOTE: DO NOT return `.../jsonrpc/`,
+# because aria2c allow GET method,
+# e.g. /jsonrpc?method=METHOD_NAME&id=ID&params=BASE64_ENCODED_PARAMS
+
+
+def get_http_base_url(aria2: Optional[Aria2] = None, *, shard: int = 0) -> str:
+    """e.g. `http://localhost:6800/`
+
+    Args:
+        aria2: The config of aria2c, defaults to `GLOBAL_CONFIG.aria2`.
+        shard: The index of the aria2c instance, see `server.extra.aria2_shards`.
+    """
+    aria2 = aria2 if aria2 is not None else GLOBAL_CONFIG.aria2
+    http_proto = "https" if _is_secure_rpc(aria2) else "http"
+    return f"{http_proto}://{_get_netloc(aria2, shard)}/"
+
+
+def get_ws_base_url(aria2: Optional[Aria2] = None, *, shard: int = 0) -> str:
+    """e.g. `ws://localhost:6800/`
+
+    Args:
+        aria2: The config of aria2c, defaults to `GLOBAL_CONFIG.aria2`.
+        shard: The index of the aria2c instance, see `server.extra.aria2_shards`.
+    """
+    aria2 = aria2 if aria2 is not None else GLOBAL_CONFIG.aria2
+    ws_proto = "wss" if _is_secure_rpc(aria2) else "ws"
+    return f"{ws_proto}://{_get_netloc(aria2, shard)}/"
+
+
+class _PoolMeteredTransport(httpx.AsyncHTTPTransport):
+    """Count the saturation of the connection pool.
+
+    - in_use: connections which are serving a request (or a WebSocket).
+    - waiting: requests which are queued for a free connection.
+    - rejected: requests which timed out waiting for a free connection, i.e. `httpx.PoolTimeout`.
+    """
+
+    def __init__(self, *, limits: httpx.Limits, **kwargs: Any) -> None:
+        super().__init__(limits=limits, **kwargs)
+        self.limits = limits
+        self.rejected = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        try:
+            return await super().handle_async_request(request)
+        except httpx.PoolTimeout:
+            self.rejected += 1
+            raise
+
+    def metrics(self) -> Dict[str, Any]:
+        # NOTE: httpx and httpcore do not expose the pool and its queue publicly,
+        # so read them defensively, and report nothing rather than break if they change.
+        pool = getattr(self, "_pool", None)
+        connections = list(getattr(pool, "connections", ()))
+        in_use = sum(1 for connection in connections if not connection.is_idle())
+        waiting = sum(
+            1
+            for pool_request in getattr(pool, "_requests", ())
+            if getattr(pool_request, "is_queued", lambda: False)()
+        )
+        return {
+            "max_connections": self.limits.max_connections,
+            "connections": len(connections),
+            "in_use": in_use,
+            "idle": len(connections) - in_use,
+            "waiting": waiting,
+            "rejected": self.rejected,
+        }
+
+
+def create_upstream_client(
+    name: str,
+    *,
+    upstream_config: Optional[Aria2Upstream] = None,
+    registry: MetricsRegistry = metrics_registry,
+    verify: bool = True,
+) -> httpx.AsyncClient:
+    """Create a pooled client to aria2c.
+
+    The pool metrics are registered in `registry` as `aria2_upstream_pool.{name}`.
+
+    Args:
+        name: The name of the client in the metrics.
+        upstream_config: Defaults to `GLOBAL_CONFIG.server.extra.aria2_upstream`.
+        registry: Where to register the pool metrics.
+        verify: Whether to verify the TLS certificate of aria2c, if it uses https.
+    """
+    if upstream_config is None:
+        upstream_config = GLOBAL_CONFIG.server.extra.aria2_upstream
+    limits = httpx.Limits(
+        max_connections=upstream_config.max_connections,
+        max_keepalive_connections=upstream_config.max_keepalive_connections,
+        keepalive_expiry=upstream_config.keepalive_expiry_second,
+    )
+    timeout = httpx.Timeout(
+        connect=upstream_config.connect_timeout_second,
+        read=upstream_config.read_timeout_second,
+        # aria2c JSON-RPC requests are small, so reuse the read timeout
+        write=upstream_config.read_timeout_second,
+        pool=upstream_config.pool_timeout_second,
+    )
+    transport = _PoolMeteredTransport(limits=limits, verify=verify)
+    registry.register(f"aria2_upstream_pool.{name}", transport.metrics)
+    # NOTE: httpx will automatically set proxy via system proxy settings,
+    # we forbidden it here, because we will connect to localhost, which does not need proxy.
+    # The remote aria2c (see `server.extra.aria2_federation`) is usually in the LAN, too.
+    # ref: https://www.python-httpx.org/advanced/#routing
+    return httpx.AsyncClient(
+        transport=transport, timeout=timeout, mounts={"all://": None}
+    )
@@ -0,0 +1,388 @@
+"""Share one upstream aria2c WebSocket connection between many clients."""
+
+import asyncio
+import itertools
+import json
+from typing import Any, Callable, Dict, List, Optional, Set, Union
+
+import httpx
+from httpx_ws import AsyncWebSocketSession, HTTPXWSException, aconnect_ws
+from starlette.websockets import WebSocket, WebSocketDisconnect
+from wsproto.utilities import LocalProtocolError
+
+from aria2_server import logger
+from aria2_server.app._core.aria2._jsonrpc import (
+    INTERNAL_ERROR,
+    INVALID_REQUEST,
+    PARSE_ERROR,
+    JsonRpcRequest,
+    JsonRpcResponse,
+    dumps,
+    error_response,
+    is_notification,
+)
+from aria2_server.app._core.aria2._rpc_cache import Aria2RpcCache
+from aria2_server.app._core.aria2._shards import Aria2ShardRouter
+
+__all__ = ("Aria2WebSocketMultiplexer",)
+
+
+class _Aria2UpstreamWebSocket:
+    """A single, lazily (re)connected WebSocket session to aria2c.
+
+    Request ids are rewritten to ids owned by this session,
+    so that responses of different clients never collide.
+    """
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        url: str,
+        *,
+        on_notification: Callable[[str], None],
+    ) -> None:
+        self._client = client
+        self._url = url
+        self._on_notification = on_notification
+
+        self._ids = itertools.count()
+        self._pending: Dict[int, "asyncio.Future[JsonRpcResponse]"] = {}
+        # NOTE: create asyncio objects lazily in the running loop,
+        # because they are bound to the loop on creation before `Python 3.10`
+        self._runner: Optional["asyncio.Task[None]"] = None
+        self._session: Optional["asyncio.Future[AsyncWebSocketSession]"] = None
+
+    async def _run(
+        self, session_future: "asyncio.Future[AsyncWebSocketSession]"
+    ) -> None:
+        try:
+            async with aconnect_ws(self._url, self._client) as session:
+                session_future.set_result(session)
+                logger.debug(f"Connected to aria2c WebSocket: {self._url}")
+                while True:
+                    self._dispatch(await session.receive_text())
+        except Exception as e:
+            if not session_future.done():
+                session_future.set_exception(
+                    ConnectionError(f"Can not connect to aria2c WebSocket: {e!r}")
+                )
+            else:
+                logger.warning(f"aria2c WebSocket connection closed: {e!r}")
+        finally:
+            if not session_future.done():
+                session_future.cancel()
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(
+                        ConnectionError("aria2c WebSocket connection closed")
+                    )
+            self._pending.clear()
+
+    def _dispatch(self, message: str) -> None:
+        try:
+            payload = json.loads(message)
+        except ValueError:
+            logger.warning(f"Invalid JSON from aria2c WebSocket: {message!r}")
+            return
+
+        if is_notification(payload):
+            self._on_notification(message)
+            return
+
+        responses = payload if isinstance(payload, list) else [payload]
+        for response in responses:  # pyright: ignore[reportUnknownVariableType]
+            if not isinstance(response, dict):
+                continue
+            future = self._pending.pop(response.get("id"), None)  # pyright: ignore[reportUnknownArgumentType, reportUnknownMemberType]
+            if future is not None and not future.done():
+                future.set_result(response)  # pyright: ignore[reportUnknownArgumentType]
+
+    async def _get_session(self) -> AsyncWebSocketSession:
+        if self._runner is None or self._runner.done():
+            loop = asyncio.get_running_loop()
+            self._session = loop.create_future()
+            self._runner = loop.create_task(self._run(self._session))
+        assert self._session is not None
+        # NOTE: shield it, so that a cancelled caller will not cancel the shared future
+        return await asyncio.shield(self._session)
+
+    async def _send(self, request: JsonRpcRequest) -> None:
+        session = await self._get_session()
+        try:
+            await session.send_text(dumps(request))
+        except (HTTPXWSException, httpx.HTTPError, LocalProtocolError) as e:
+            # e.g. the session is closed by aria2c, but not noticed by `_run` yet
+            raise ConnectionError(f"Can not send to aria2c WebSocket: {e!r}") from e
+
+    async def call(self, request: JsonRpcRequest) -> JsonRpcResponse:
+        """Send a request to aria2c and wait for its response.
+
+        The `id` of the returned response is the upstream id, not the `id` of `request`.
+
+        Raises:
+            ConnectionError: If the upstream connection is not available.
+        """
+        upstream_id = next(self._ids)
+        future: "asyncio.Future[JsonRpcResponse]" = (
+            asyncio.get_running_loop().create_future()
+        )
+        self._pending[upstream_id] = future
+        try:
+            await self._send({**request, "id": upstream_id})
+            return await future
+        finally:
+            self._pending.pop(upstream_id, None)
+
+    async def notify(self, request: JsonRpcRequest) -> None:
+        """Send a request without `id` to aria2c, no response is expected.
+
+        Raises:
+            ConnectionError: If the upstream connection is not available.
+        """
+        await self._send(request)
+
+    async def aclose(self) -> None:
+        if self._runner is not None:
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+            self._runner = None
+
+
+# the seconds to wait before reconnecting to the WebSocket of an aria2c instance,
+# doubled after each failed connection
+_LISTEN_RETRY_INITIAL = 0.5
+_LISTEN_RETRY_MAX = 30
+
+
+class _Aria2ShardedUpstream:
+    """Route requests by `Aria2ShardRouter` over HTTP,
+    and receive the notifications of all aria2c instances by their WebSocket.
+    """
+
+    def __init__(
+        self,
+        router: Aria2ShardRouter,
+        *,
+        on_notification: Callable[[str], None],
+    ) -> None:
+        self._router = router
+        self._on_notification = on_notification
+        # NOTE: the listeners are started in the running loop of the first request
+        self._listeners: "List[asyncio.Task[None]]" = []
+
+    async def _listen(self, shard: int) -> None:
+        """Keep a WebSocket connection to the instance `shard`, and forward its notifications.
+
+        The connection is retried with backoff, and not tried while the instance is unhealthy.
+        """
+        backend = self._router.backends[shard]
+        delay = _LISTEN_RETRY_INITIAL
+        while True:
+            if self._router.healthy[shard]:
+                try:
+                    async with aconnect_ws(
+                        backend.ws_url, backend.rpc_client.client
+                    ) as session:
+                        logger.debug(f"Connected to aria2c WebSocket: {backend.ws_url}")
+                        delay = _LISTEN_RETRY_INITIAL
+                        while True:
+                            message = await session.receive_text()
+                            try:
+                                payload = json.loads(message)
+                            except ValueError:
+                                continue
+                            if is_notification(payload):
+                                self._on_notification(message)
+                except Exception as e:
+                    logger.debug(
+                        f"aria2c WebSocket of '{backend.name}' is closed: {e!r}"
+                    )
+                    delay = min(delay * 2, _LISTEN_RETRY_MAX)
+            await asyncio.sleep(delay)
+
+    def _start_listeners(self) -> None:
+        if self._listeners:
+            return
+        loop = asyncio.get_running_loop()
+        self._listeners = [
+            loop.create_task(self._listen(shard)) for shard in self._router.shards
+        ]
+
+    async def call(self, request: JsonRpcRequest) -> JsonRpcResponse:
+        # NOTE: the listeners run in background,
+        # an unavailable instance should not delay the requests to others.
+        self._start_listeners()
+        try:
+            return await self._router.request(request)
+        except httpx.HTTPError as e:
+            raise ConnectionError(f"Can not connect to aria2c: {e!r}") from e
+
+    async def notify(self, request: JsonRpcRequest) -> None:
+        await self.call(request)
+
+    async def aclose(self) -> None:
+        for listener in self._listeners:
+            listener.cancel()
+        await asyncio.gather(*self._listeners, return_exceptions=True)
+        self._listeners = []
+
+
+class _Client:
+    def __init__(self, websocket: WebSocket) -> None:
+        self.websocket = websocket
+        self._send_lock: Optional[asyncio.Lock] = None
+
+    async def send_text(self, text: str) -> None:
+        if self._send_lock is None:
+            self._send_lock = asyncio.Lock()
+        async with self._send_lock:
+            await self.websocket.send_text(text)
+
+
+class Aria2WebSocketMultiplexer:
+    """Serve many WebSocket clients through one upstream WebSocket to aria2c.
+
+    - Every request from clients is sent through the shared upstream connection,
+        and its response is routed back to the client with the original `id`.
+    - aria2c notifications (e.g. `aria2.onDownloadComplete`) are received once,
+        and fanned out to all connected clients.
+
+    The upstream connection is created on demand and re-created on the next request after it was closed.
+
+    Examples:
+        ```py
+        multiplexer = Aria2WebSocketMultiplexer(
+            httpx.AsyncClient(), "ws://localhost:6800/jsonrpc"
+        )
+
+
+        @app.websocket("/jsonrpc")
+        async def _(websocket: WebSocket):
+            await multiplexer.serve(websocket)
+        ```
+    """
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        url: str,
+        *,
+        rpc_cache: Optional[Aria2RpcCache] = None,
+        shard_router: Optional[Aria2ShardRouter] = None,
+    ) -> None:
+        """
+        Args:
+            client: The client used to connect to aria2c.
+            url: The WebSocket url of aria2c JSON-RPC interface, e.g. `ws://localhost:6800/jsonrpc`
+            rpc_cache: If not `None`, requests will be answered through this cache.
+            shard_router: If not `None`, requests will be routed by it instead of sent to `url`,
+                and notifications are received from all of its backends.
+        """
+        self._upstream: Union[_Aria2UpstreamWebSocket, _Aria2ShardedUpstream]
+        if shard_router is None:
+            self._upstream = _Aria2UpstreamWebSocket(
+                client, url, on_notification=self._broadcast
+            )
+        else:
+            self._upstream = _Aria2ShardedUpstream(
+                shard_router, on_notification=self._broadcast
+            )
+        self._rpc_cache = rpc_cache
+        self._clients: Set[_Client] = set()
+        # store strong references of the background tasks
+        self._tasks: "Set[asyncio.Task[Any]]" = set()
+
+    def _spawn(self, coro: Any) -> "asyncio.Task[Any]":
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._on_task_done)
+        return task
+
+    def _on_task_done(self, task: "asyncio.Task[Any]") -> None:
+        self._tasks.discard(task)
+        # e.g. the client was disconnected before we send the response
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(
+                f"aria2c WebSocket multiplexer task failed: {task.exception()!r}"
+            )
+
+    def _broadcast(self, message: str) -> None:
+        async def send_to_all() -> None:
+            await asyncio.gather(
+                *(client.send_text(message) for client in self._clients.copy()),
+                return_exceptions=True,
+            )
+
+        if self._clients:
+            self._spawn(send_to_all())
+
+    async def _handle_request(self, request: Any) -> Optional[JsonRpcResponse]:
+        if not isinstance(request, dict):
+            return error_response(None, INVALID_REQUEST, "Invalid Request")
+
+        request_: JsonRpcRequest = request  # pyright: ignore[reportUnknownVariableType]
+        try:
+            if "id" not in request_:
+                await self._upstream.notify(request_)
+                return None
+            if self._rpc_cache is not None:
+                return await self._rpc_cache.call(request_, self._upstream.call)
+            response = await self._upstream.call(request_)
+        except ConnectionError as e:
+            return error_response(request_.get("id"), INTERNAL_ERROR, str(e))
+        return {**response, "id": request_["id"]}
+
+    async def _handle_message(self, client: _Client, message: str) -> None:
+        try:
+            payload = json.loads(message)
+        except ValueError:
+            await client.send_text(
+                dumps(error_response(None, PARSE_ERROR, "Parse error"))
+            )
+            return
+
+        # batch request, see https://www.jsonrpc.org/specification#batch
+        if isinstance(payload, list):
+            if not payload:
+                result: Any = error_response(None, INVALID_REQUEST, "Invalid Request")
+            else:
+                responses = await asyncio.gather(
+                    *(self._handle_request(request) for request in payload)  # pyright: ignore[reportUnknownVariableType]
+                )
+                result = [response for response in responses if response is not None]
+                if not result:
+                    return
+        else:
+            result = await self._handle_request(payload)
+            if result is None:
+                return
+        await client.send_text(dumps(result))
+
+    async def serve(self, websocket: WebSocket) -> None:
+        """Accept the `websocket` and serve it until it is disconnected."""
+        await websocket.accept()
+        client = _Client(websocket)
+        self._clients.add(client)
+        handlers: "Set[asyncio.Task[None]]" = set()
+        try:
+            while True:
+                message = await websocket.receive_text()
+                # NOTE: handle messages concurrently,
+                # so that a slow call will not block the following calls of the same client.
+                handler = self._spawn(self._handle_message(client, message))
+                handlers.add(handler)
+                handler.add_done_callback(handlers.discard)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            self._clients.discard(client)
+            for handler in handlers:
+                handler.cancel()
+
+    async def aclose(self) -> None:
+        for task in self._tasks.copy():
+            task.cancel()
+        await self._upstream.aclose()
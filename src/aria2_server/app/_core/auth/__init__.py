@@ -3,11 +3,22 @@ from aria2_server.app._core.auth._core import (
     AUTH_COOKIE_NAME,
     COOKIE_SECURE,
     UUID_ID,
+    Auth,
     User,
     UserManager,
+    auth,
     fastapi_users_helper,
     get_user_manager,
+    session_cache,
 )
+from aria2_server.app._core.auth._jwt import JWTState, load_jwt_state, token_deny_list
+from aria2_server.app._core.auth._password import (
+    PasswordHasher,
+    PasswordHasherBusyError,
+    password_hasher,
+)
+from aria2_server.app._core.auth._session_cache import SessionCache
+from aria2_server.app._core.auth._token_gc import TokenGarbageCollector
 from aria2_server.app._core.auth.dependencies import (
     UserRedirect,
 )
@@ -16,10 +27,21 @@ __all__ = (
     "AUTH_COOKIE_NAME",
     "COOKIE_SECURE",
     "UUID_ID",
+    "Auth",
     "ConnAPIKeyCookie",
+    "JWTState",
+    "PasswordHasher",
+    "PasswordHasherBusyError",
+    "SessionCache",
+    "TokenGarbageCollector",
     "User",
     "UserManager",
     "UserRedirect",
+    "auth",
     "fastapi_users_helper",
     "get_user_manager",
+    "load_jwt_state",
+    "password_hasher",
+    "session_cache",
+    "token_deny_list",
 )
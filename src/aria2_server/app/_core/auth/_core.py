@@ -1,27 +1,54 @@
-from typing import AsyncGenerator
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncGenerator, Dict, Optional
 
-from fastapi import Depends
-from fastapi_users import BaseUserManager, FastAPIUsers, UUIDIDMixin
-from fastapi_users.authentication import AuthenticationBackend, CookieTransport
+from fastapi import Depends, Request
+from fastapi.security import OAuth2PasswordRequestForm
+from fastapi_users import (
+    BaseUserManager,
+    FastAPIUsers,
+    UUIDIDMixin,
+    exceptions,
+    schemas,
+)
+from fastapi_users.authentication import (
+    AuthenticationBackend,
+    CookieTransport,
+    Strategy,
+)
 from fastapi_users.authentication.strategy.db import (
     AccessTokenDatabase,
     DatabaseStrategy,
 )
-from fastapi_users.db import SQLAlchemyUserDatabase
+from fastapi_users.db import BaseUserDatabase, SQLAlchemyUserDatabase
+from fastapi_users.password import PasswordHelperProtocol
 from fastapi_users_db_sqlalchemy import UUID_ID
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing_extensions import override
 
+from aria2_server.app._core.auth._jwt import DenyListJWTStrategy, JWTState, jwt_state
+from aria2_server.app._core.auth._password import PasswordHasher, password_hasher
+from aria2_server.app._core.auth._session_cache import SessionCache, session_cache
 from aria2_server.config import GLOBAL_CONFIG
-from aria2_server.db.access_token import AccessToken, get_access_token_db
-from aria2_server.db.user import User, get_user_db
+from aria2_server.config.schemas import ServerExtra
+from aria2_server.db import Database, database
+from aria2_server.db.access_token import (
+    AccessToken,
+    SQLAlchemyAccessTokenDatabase,
+)
+from aria2_server.db.user import User
 
 __all__ = (
     "AUTH_COOKIE_NAME",
     "COOKIE_SECURE",
     "UUID_ID",
+    "Auth",
     "User",
     "UserManager",
+    "auth",
+    "build_strategy",
     "fastapi_users_helper",
     "get_user_manager",
+    "session_cache",
 )
 
 
@@ -30,41 +57,279 @@ AUTH_COOKIE_NAME = "fastapiusersauth"
 COOKIE_SECURE = True
 
 
-# NOTE: Don't unpack `GLOBAL_CONFIG` outside of a function
-_cookie_transport = CookieTransport(
-    AUTH_COOKIE_NAME,
-    cookie_max_age=GLOBAL_CONFIG.server.extra.expiration_second,
-    cookie_secure=COOKIE_SECURE,
-)
+class _CachedDatabaseStrategy(DatabaseStrategy[User, UUID_ID, AccessToken]):
+    """`DatabaseStrategy` with `session_cache`, so that most reads do not query the database."""
 
+    def __init__(
+        self,
+        database: AccessTokenDatabase[AccessToken],
+        session_cache: SessionCache,
+        *,
+        lifetime_seconds: Optional[int],
+    ) -> None:
+        super().__init__(database, lifetime_seconds)
+        self.session_cache = session_cache
 
-def _get_database_strategy(
-    access_token_db: AccessTokenDatabase[AccessToken] = Depends(get_access_token_db),
-) -> DatabaseStrategy[User, UUID_ID, AccessToken]:
-    # NOTE: Don't unpack `GLOBAL_CONFIG` outside of a function
-    return DatabaseStrategy[User, UUID_ID, AccessToken](
-        access_token_db, lifetime_seconds=GLOBAL_CONFIG.server.extra.expiration_second
-    )
+    @override
+    async def read_token(
+        self, token: Optional[str], user_manager: BaseUserManager[User, UUID_ID]
+    ) -> Optional[User]:
+        # Modified: `fastapi_users.authentication.strategy.db.DatabaseStrategy.read_token` (v12.1)
+        if token is None:
+            return None
 
+        assert isinstance(self.database, SQLAlchemyAccessTokenDatabase)
+        user = await self.session_cache.get(token, self.database.session)
+        if user is not None:
+            return user
 
-_auth_backend = AuthenticationBackend(
-    name="cookie_database",
-    transport=_cookie_transport,
-    get_strategy=_get_database_strategy,
-)
+        now = datetime.now(timezone.utc)
+        max_age = None
+        if self.lifetime_seconds:
+            max_age = now - timedelta(seconds=self.lifetime_seconds)
+
+        access_token = await self.database.get_by_token(token, max_age)
+        if access_token is None:
+            return None
+
+        try:
+            parsed_id = user_manager.parse_id(access_token.user_id)
+            user = await user_manager.get(parsed_id)
+        except (exceptions.UserNotExists, exceptions.InvalidID):
+            return None
+
+        token_ttl = None
+        if max_age is not None:
+            token_ttl = (access_token.created_at - max_age).total_seconds()
+        self.session_cache.put(token, user, token_ttl=token_ttl)
+        return user
+
+    @override
+    async def destroy_token(self, token: str, user: User) -> None:
+        self.session_cache.invalidate_token(token)
+        await super().destroy_token(token, user)
 
 
 class UserManager(UUIDIDMixin, BaseUserManager[User, UUID_ID]):
-    pass
+    """`BaseUserManager` which hashes and verifies passwords in `password_hasher`.
+
+    They may raise `PasswordHasherBusyError`, which should be responded with `503`.
+    """
+
+    def __init__(
+        self,
+        user_db: BaseUserDatabase[User, UUID_ID],
+        password_helper: Optional[PasswordHelperProtocol] = None,
+        *,
+        password_hasher: PasswordHasher = password_hasher,
+        session_cache: SessionCache = session_cache,
+    ) -> None:
+        super().__init__(user_db, password_helper)
+        self.password_hasher = password_hasher
+        self.session_cache = session_cache
+
+    @override
+    async def create(
+        self,
+        user_create: schemas.UC,
+        safe: bool = False,
+        request: Optional[Request] = None,
+    ) -> User:
+        # Modified: `fastapi_users.manager.BaseUserManager.create` (v12.1)
+        await self.validate_password(user_create.password, user_create)
+
+        existing_user = await self.user_db.get_by_email(user_create.email)
+        if existing_user is not None:
+            raise exceptions.UserAlreadyExists()
+
+        user_dict = (
+            user_create.create_update_dict()
+            if safe
+            else user_create.create_update_dict_superuser()
+        )
+        password = user_dict.pop("password")
+        user_dict["hashed_password"] = await self.password_hasher.hash(password)
+
+        created_user = await self.user_db.create(user_dict)
+
+        await self.on_after_register(created_user, request)
+
+        return created_user
+
+    @override
+    async def authenticate(
+        self, credentials: OAuth2PasswordRequestForm
+    ) -> Optional[User]:
+        # Modified: `fastapi_users.manager.BaseUserManager.authenticate` (v12.1)
+        try:
+            user = await self.get_by_email(credentials.username)
+        except exceptions.UserNotExists:
+            # Run the hasher to mitigate timing attack
+            await self.password_hasher.hash(credentials.password)
+            return None
+
+        verified, updated_password_hash = await self.password_hasher.verify_and_update(
+            credentials.password, user.hashed_password
+        )
+        if not verified:
+            return None
+        # Update password hash to a more robust one if needed
+        if updated_password_hash is not None:
+            await self.user_db.update(user, {"hashed_password": updated_password_hash})
 
+        return user
 
-async def get_user_manager(
-    user_db: SQLAlchemyUserDatabase[User, UUID_ID] = Depends(get_user_db),
-) -> AsyncGenerator[UserManager, None]:
-    yield UserManager(user_db)
+    @override
+    async def _update(self, user: User, update_dict: Dict[str, Any]) -> User:
+        password = update_dict.get("password")
+        if password is not None:
+            await self.validate_password(password, user)
+            update_dict = {
+                key: value for key, value in update_dict.items() if key != "password"
+            }
+            # NOTE: unknown fields are updated as is by `BaseUserManager._update`
+            update_dict["hashed_password"] = await self.password_hasher.hash(password)
+        return await super()._update(user, update_dict)
 
+    @override
+    async def on_after_update(
+        self, user: User, update_dict: Dict[str, Any], request: Optional[Request] = None
+    ) -> None:
+        # e.g. `PATCH /users/me`, the cached sessions hold the old user
+        self.session_cache.invalidate_user(user.id)
 
-fastapi_users_helper = FastAPIUsers[User, UUID_ID](
-    get_user_manager,
-    [_auth_backend],
+    @override
+    async def on_after_delete(
+        self, user: User, request: Optional[Request] = None
+    ) -> None:
+        self.session_cache.invalidate_user(user.id)
+
+
+class Auth:
+    """The auth backend of one app, bound to its own db, caches and config.
+
+    The dependencies (e.g. `get_user_manager`) are attributes instead of methods,
+    because fastapi resolves their sub-dependencies from the signature,
+    which must refer to the db of this instance.
+    """
+
+    def __init__(
+        self,
+        extra: ServerExtra,
+        database: Database,
+        *,
+        session_cache: SessionCache,
+        password_hasher: PasswordHasher,
+        jwt_state: JWTState,
+    ) -> None:
+        self.extra = extra
+        self.database = database
+        self.session_cache = session_cache
+        self.password_hasher = password_hasher
+        self.jwt_state = jwt_state
+
+        async def get_user_db(
+            session: AsyncSession = Depends(database.get_session),
+        ) -> AsyncGenerator[SQLAlchemyUserDatabase[User, UUID_ID], None]:
+            yield SQLAlchemyUserDatabase[User, UUID_ID](session, User)
+
+        async def get_access_token_db(
+            session: AsyncSession = Depends(database.get_session),
+        ) -> AsyncGenerator[SQLAlchemyAccessTokenDatabase[AccessToken], None]:
+            yield SQLAlchemyAccessTokenDatabase(session, AccessToken)
+
+        async def get_user_manager(
+            user_db: SQLAlchemyUserDatabase[User, UUID_ID] = Depends(get_user_db),
+        ) -> AsyncGenerator[UserManager, None]:
+            yield self.user_manager(user_db)
+
+        def get_database_strategy(
+            access_token_db: AccessTokenDatabase[AccessToken] = Depends(
+                get_access_token_db
+            ),
+        ) -> DatabaseStrategy[User, UUID_ID, AccessToken]:
+            return self._database_strategy(access_token_db)
+
+        self.get_user_db = get_user_db
+        self.get_access_token_db = get_access_token_db
+        self.get_user_manager = get_user_manager
+
+        cookie_transport = CookieTransport(
+            AUTH_COOKIE_NAME,
+            cookie_max_age=extra.expiration_second,
+            cookie_secure=COOKIE_SECURE,
+        )
+        self.backend: AuthenticationBackend[User, UUID_ID] = (
+            AuthenticationBackend(
+                name="cookie_jwt",
+                transport=cookie_transport,
+                get_strategy=self._jwt_strategy,
+            )
+            if extra.auth_strategy == "jwt"
+            else AuthenticationBackend(
+                name="cookie_database",
+                transport=cookie_transport,
+                get_strategy=get_database_strategy,
+            )
+        )
+        self.fastapi_users = FastAPIUsers[User, UUID_ID](
+            get_user_manager, [self.backend]
+        )
+
+    def _database_strategy(
+        self, access_token_db: AccessTokenDatabase[AccessToken]
+    ) -> DatabaseStrategy[User, UUID_ID, AccessToken]:
+        return _CachedDatabaseStrategy(
+            access_token_db,
+            self.session_cache,
+            lifetime_seconds=self.extra.expiration_second,
+        )
+
+    def _jwt_strategy(self) -> DenyListJWTStrategy:
+        return DenyListJWTStrategy(
+            self.jwt_state,
+            self.session_cache,
+            lifetime_seconds=self.extra.expiration_second,
+        )
+
+    def user_manager(self, user_db: BaseUserDatabase[User, UUID_ID]) -> UserManager:
+        return UserManager(
+            user_db,
+            password_hasher=self.password_hasher,
+            session_cache=self.session_cache,
+        )
+
+    def build_strategy(self, session: AsyncSession) -> Strategy[User, UUID_ID]:
+        """Build the strategy of the auth backend without fastapi dependency injection."""
+        if self.extra.auth_strategy == "jwt":
+            return self._jwt_strategy()
+        return self._database_strategy(
+            SQLAlchemyAccessTokenDatabase(session, AccessToken)
+        )
+
+    async def read_token(self, token: str) -> Optional[User]:
+        """Read the user of `token` in a new session, without fastapi dependency injection."""
+        async with self.database.session_maker() as session:
+            user_manager = self.user_manager(
+                SQLAlchemyUserDatabase[User, UUID_ID](session, User)
+            )
+            return await self.build_strategy(session).read_token(token, user_manager)
+
+    async def load(self) -> None:
+        """Load the state of the auth strategy from the db, should be called on startup."""
+        if self.extra.auth_strategy == "jwt":
+            await self.jwt_state.load()
+
+
+# NOTE: Don't unpack `GLOBAL_CONFIG` outside of a function
+auth = Auth(
+    GLOBAL_CONFIG.server.extra,
+    database,
+    session_cache=session_cache,
+    password_hasher=password_hasher,
+    jwt_state=jwt_state,
 )
+"""The auth of the app launched by `aria2_server.app.main`."""
+get_user_manager = auth.get_user_manager
+build_strategy = auth.build_strategy
+fastapi_users_helper = auth.fastapi_users
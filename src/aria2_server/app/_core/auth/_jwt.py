@@ -0,0 +1,219 @@
+"""Stateless signed session tokens, i.e. the `jwt` auth strategy.
+
+A JWT is verified in CPU, so reading a session does not need the database,
+except loading the user on a miss of `session_cache`.
+Logged out tokens are put into the deny-list of `JWTState`,
+which is kept in memory and persisted in the database, and is loaded on startup by `JWTState.load`.
+"""
+
+import hashlib
+import hmac
+import secrets
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+import jwt
+from fastapi_users import BaseUserManager, exceptions
+from fastapi_users.authentication import JWTStrategy
+from fastapi_users.db import SQLAlchemyUserDatabase
+from fastapi_users.jwt import decode_jwt, generate_jwt
+from fastapi_users_db_sqlalchemy import UUID_ID
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from typing_extensions import override
+
+from aria2_server.app._core.auth._session_cache import SessionCache
+from aria2_server.db import async_session_maker
+from aria2_server.db.revoked_token import RevokedTokenDatabase
+from aria2_server.db.revoked_token.models import RevokedToken
+from aria2_server.db.server_config import ServerConfigDatabase
+from aria2_server.db.server_config.models import ServerConfig
+from aria2_server.db.user import User
+
+__all__ = (
+    "DenyListJWTStrategy",
+    "JWTState",
+    "TokenDenyList",
+    "jwt_state",
+    "load_jwt_state",
+    "token_deny_list",
+)
+
+
+class TokenDenyList:
+    """The revoked tokens which are not expired yet.
+
+    Only the digests of tokens are kept, and the deny-list is only consulted when it is non-empty,
+    so it costs nothing before anyone logs out.
+    """
+
+    def __init__(self) -> None:
+        # digest -> unix timestamp of expiration
+        self._revoked: Dict[str, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+    @staticmethod
+    def _digest(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def is_revoked(self, token: str) -> bool:
+        if not self._revoked:
+            return False
+        return self._digest(token) in self._revoked
+
+    def _prune(self) -> None:
+        now = time.time()
+        for digest in [
+            digest for digest, expires_at in self._revoked.items() if expires_at <= now
+        ]:
+            del self._revoked[digest]
+
+    async def load(self, revoked_token_db: RevokedTokenDatabase) -> None:
+        """Replace the in-memory deny-list with the unexpired ones in the database."""
+        now = datetime.now(timezone.utc)
+        await revoked_token_db.delete_expired(now)
+        self._revoked = {
+            revoked_token.token_hash: revoked_token.expires_at.timestamp()
+            for revoked_token in await revoked_token_db.get_unexpired(now)
+        }
+
+    async def revoke(
+        self, token: str, expires_at: datetime, revoked_token_db: RevokedTokenDatabase
+    ) -> None:
+        digest = self._digest(token)
+        # NOTE: persist first, so that the token is never accepted after a restart
+        await revoked_token_db.add(digest, expires_at)
+        self._prune()
+        self._revoked[digest] = expires_at.timestamp()
+
+
+# NOTE: `ServerConfig.secret_token` is also the `storage_secret` of NiceGUI,
+# so JWTs are signed by a key derived from it, instead of by the secret itself.
+_JWT_KEY_CONTEXT = b"aria2-server jwt"
+
+
+def _derive_signing_key(secret_token: str) -> str:
+    return hmac.new(
+        secret_token.encode("utf-8"), _JWT_KEY_CONTEXT, hashlib.sha256
+    ).hexdigest()
+
+
+class JWTState:
+    """The signing secret and the deny-list of one db."""
+
+    def __init__(self, session_maker: "async_sessionmaker[AsyncSession]") -> None:
+        self.session_maker = session_maker
+        self.deny_list = TokenDenyList()
+        self._secret: Optional[str] = None
+
+    @property
+    def secret(self) -> str:
+        if self._secret is None:
+            raise RuntimeError("`JWTState.load` must be called on startup")
+        return self._secret
+
+    async def load(self) -> None:
+        """Load the signing secret (derived from `ServerConfig.secret_token`)
+        and the deny-list from the database."""
+        async with self.session_maker() as session:
+            server_config = await ServerConfigDatabase(session, ServerConfig).get()
+            self._secret = _derive_signing_key(server_config.secret_token)
+            await self.deny_list.load(RevokedTokenDatabase(session, RevokedToken))
+
+
+jwt_state = JWTState(async_session_maker)
+"""The state of the default db."""
+token_deny_list = jwt_state.deny_list
+"""The deny-list shared by all requests."""
+
+
+async def load_jwt_state() -> None:
+    """Load the signing secret and the deny-list of the default db."""
+    await jwt_state.load()
+
+
+class DenyListJWTStrategy(JWTStrategy[User, UUID_ID]):
+    """`JWTStrategy` with the deny-list of `state` for logout, and `session_cache` for the user."""
+
+    def __init__(
+        self,
+        state: JWTState,
+        session_cache: SessionCache,
+        *,
+        lifetime_seconds: Optional[int],
+    ) -> None:
+        super().__init__(state.secret, lifetime_seconds)
+        self.state = state
+        self.session_cache = session_cache
+
+    @override
+    async def read_token(
+        self, token: Optional[str], user_manager: BaseUserManager[User, UUID_ID]
+    ) -> Optional[User]:
+        # Modified: `fastapi_users.authentication.strategy.jwt.JWTStrategy.read_token` (v12.1)
+        if token is None or self.state.deny_list.is_revoked(token):
+            return None
+
+        assert isinstance(user_manager.user_db, SQLAlchemyUserDatabase)
+        user = await self.session_cache.get(token, user_manager.user_db.session)
+        if user is not None:
+            return user
+
+        try:
+            data = decode_jwt(
+                token, self.decode_key, self.token_audience, algorithms=[self.algorithm]
+            )
+            user_id = data.get("sub")
+            if user_id is None:
+                return None
+        except jwt.PyJWTError:
+            return None
+
+        try:
+            parsed_id = user_manager.parse_id(user_id)
+            user = await user_manager.get(parsed_id)
+        except (exceptions.UserNotExists, exceptions.InvalidID):
+            return None
+
+        exp = data.get("exp")
+        token_ttl = exp - time.time() if exp is not None else None
+        self.session_cache.put(token, user, token_ttl=token_ttl)
+        return user
+
+    @override
+    async def write_token(self, user: User) -> str:
+        # NOTE: `jti` makes every token unique,
+        # otherwise two logins in the same second get the same token, and revoking one revokes both.
+        data = {
+            "sub": str(user.id),
+            "aud": self.token_audience,
+            "jti": secrets.token_urlsafe(16),
+        }
+        return generate_jwt(
+            data, self.encode_key, self.lifetime_seconds, algorithm=self.algorithm
+        )
+
+    @override
+    async def destroy_token(self, token: str, user: User) -> None:
+        self.session_cache.invalidate_token(token)
+        try:
+            data = decode_jwt(
+                token, self.decode_key, self.token_audience, algorithms=[self.algorithm]
+            )
+        except jwt.PyJWTError:
+            # invalid or expired token, nothing to revoke
+            return
+
+        exp = data.get("exp")
+        expires_at = (
+            datetime.fromtimestamp(exp, timezone.utc)
+            if exp is not None
+            # never expires, keep it in the deny-list for a long time
+            else datetime.now(timezone.utc) + timedelta(days=365 * 100)
+        )
+        async with self.state.session_maker() as session:
+            await self.state.deny_list.revoke(
+                token, expires_at, RevokedTokenDatabase(session, RevokedToken)
+            )
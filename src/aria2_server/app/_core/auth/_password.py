@@ -0,0 +1,103 @@
+"""Hash and verify passwords in a bounded thread pool.
+
+Hashing a password (bcrypt) takes hundreds of milliseconds of CPU by design,
+which would stall every request in the same event loop if it ran inline.
+bcrypt releases the GIL while hashing, so a thread pool is enough.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar
+
+from fastapi_users.password import PasswordHelper
+
+from aria2_server.app._core.metrics import metrics_registry
+from aria2_server.config import GLOBAL_CONFIG
+
+__all__ = ("PasswordHasher", "PasswordHasherBusyError", "password_hasher")
+
+
+_T = TypeVar("_T")
+
+
+class PasswordHasherBusyError(Exception):
+    """Too many passwords are waiting to be hashed or verified."""
+
+
+class PasswordHasher:
+    """The async version of `PasswordHelper`, running in a bounded thread pool.
+
+    At most `max_workers` passwords are hashed concurrently,
+    and at most `max_queue` more are waiting for a free worker;
+    beyond it, `PasswordHasherBusyError` is raised immediately instead of queueing,
+    so that a login storm can not pile up unbounded work.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_workers: int,
+        max_queue: int,
+        password_helper: Optional[PasswordHelper] = None,
+    ) -> None:
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.password_helper = (
+            password_helper if password_helper is not None else PasswordHelper()
+        )
+        self.rejected = 0
+        self._pending = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # NOTE: create it lazily, so that no thread is started on import
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="password-hasher"
+            )
+        return self._executor
+
+    async def _run(self, func: Callable[..., _T], *args: Any) -> _T:
+        if self._pending >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise PasswordHasherBusyError()
+
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._get_executor(), func, *args
+            )
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.password_helper.hash, password)
+
+    async def verify_and_update(
+        self, plain_password: str, hashed_password: str
+    ) -> Tuple[bool, Optional[str]]:
+        return await self._run(
+            self.password_helper.verify_and_update, plain_password, hashed_password
+        )
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "pending": self._pending,
+            "rejected": self.rejected,
+        }
+
+
+# NOTE: Don't unpack `GLOBAL_CONFIG` outside of a function
+password_hasher = PasswordHasher(
+    max_workers=GLOBAL_CONFIG.server.extra.password_hashing.max_workers,
+    max_queue=GLOBAL_CONFIG.server.extra.password_hashing.max_queue,
+)
+"""The password hasher shared by all requests."""
+metrics_registry.register("password_hashing", password_hasher.metrics)
@@ -0,0 +1,133 @@
+"""An in-memory cache of authenticated sessions, i.e. `token -> user`."""
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+
+from aria2_server.app._core.metrics import metrics_registry
+from aria2_server.config import GLOBAL_CONFIG
+from aria2_server.db.user import User
+
+__all__ = ("SessionCache", "session_cache")
+
+
+@dataclass(frozen=True)
+class _Session:
+    user_id: Any
+    user_values: Dict[str, Any]
+    """The column values of the user, see `SessionCache._snapshot`."""
+    expires_at: float
+    """`time.monotonic()` based."""
+
+
+class SessionCache:
+    """An LRU cache of `token -> user` with TTL.
+
+    Each entry expires after `ttl` seconds, or when the token itself expires, whichever is earlier.
+    The cache is not aware of changes made outside of aria2-server,
+    so `invalidate_token` and `invalidate_user` must be called when a session or a user is changed.
+
+    The cached user is not a SQLAlchemy instance, but a snapshot of its column values,
+    so that concurrent requests never share (and mutate) the same instance;
+    `get` returns a new instance merged into the caller's session without loading from the database.
+    """
+
+    def __init__(self, *, ttl: float, max_entries: int) -> None:
+        """
+        Args:
+            ttl: The max seconds an entry is kept, `0` disables the cache.
+            max_entries: The max number of entries, the least recently used ones are evicted.
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+
+    @staticmethod
+    def _snapshot(user: User) -> Dict[str, Any]:
+        return {
+            attr.key: getattr(user, attr.key)
+            for attr in sa_inspect(User).mapper.column_attrs
+        }
+
+    async def get(self, token: str, session: AsyncSession) -> Optional[User]:
+        """Return the cached user of `token` merged into `session`, or `None` if missed."""
+        if not self.enabled:
+            return None
+
+        cached = self._sessions.get(token)
+        if cached is None:
+            self.misses += 1
+            return None
+        if cached.expires_at <= time.monotonic():
+            del self._sessions[token]
+            self.misses += 1
+            return None
+
+        self._sessions.move_to_end(token)
+        self.hits += 1
+
+        user = User(**cached.user_values)
+        make_transient_to_detached(user)
+        return await session.merge(user, load=False)
+
+    def put(self, token: str, user: User, *, token_ttl: Optional[float] = None) -> None:
+        """
+        Args:
+            token: The token of the session.
+            user: The user of the session.
+            token_ttl: The remaining seconds before the token expires, `None` means never.
+        """
+        if not self.enabled:
+            return
+
+        ttl = self.ttl if token_ttl is None else min(self.ttl, token_ttl)
+        if ttl <= 0:
+            # the token is (about to be) expired
+            self._sessions.pop(token, None)
+            return
+        self._sessions[token] = _Session(
+            user_id=user.id,
+            user_values=self._snapshot(user),
+            expires_at=time.monotonic() + ttl,
+        )
+        self._sessions.move_to_end(token)
+        while len(self._sessions) > self.max_entries:
+            self._sessions.popitem(last=False)
+
+    def invalidate_token(self, token: str) -> None:
+        self._sessions.pop(token, None)
+
+    def invalidate_user(self, user_id: Any) -> None:
+        """Invalidate all sessions of the user, e.g. after the user is updated or deleted."""
+        for token in [
+            token
+            for token, session in self._sessions.items()
+            if session.user_id == user_id
+        ]:
+            del self._sessions[token]
+
+    def clear(self) -> None:
+        self._sessions.clear()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._sessions)}
+
+
+# NOTE: Don't unpack `GLOBAL_CONFIG` outside of a function
+session_cache = SessionCache(
+    ttl=GLOBAL_CONFIG.server.extra.session_cache.ttl_second,
+    max_entries=GLOBAL_CONFIG.server.extra.session_cache.max_entries,
+)
+"""The sessions read by the auth backend, shared by all requests."""
+metrics_registry.register("session_cache", session_cache.metrics)
@@ -0,0 +1,96 @@
+"""Delete the expired auth tokens from the database periodically.
+
+The lifetime of access tokens is only checked when they are read,
+so without this job, every login leaves a row in the database forever.
+"""
+
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from aria2_server import logger
+from aria2_server.app._core.utils.tasks import PeriodicTask
+from aria2_server.db import async_session_maker
+from aria2_server.db.access_token import delete_expired_access_tokens
+from aria2_server.db.revoked_token import RevokedTokenDatabase
+from aria2_server.db.revoked_token.models import RevokedToken
+
+__all__ = ("TokenGarbageCollector",)
+
+
+class TokenGarbageCollector(PeriodicTask):
+    """Delete the expired access tokens in batches, and the expired revoked tokens.
+
+    Examples:
+        ```py
+        gc = TokenGarbageCollector(interval=3600, lifetime_seconds=3600, batch_size=1000)
+        app.on_startup(gc.start)
+        app.on_shutdown(gc.aclose)
+        ```
+    """
+
+    def __init__(
+        self,
+        *,
+        interval: float,
+        lifetime_seconds: int,
+        batch_size: int,
+        session_maker: "async_sessionmaker[AsyncSession]" = async_session_maker,
+    ) -> None:
+        """
+        Args:
+            interval: The seconds between two runs.
+            lifetime_seconds: The lifetime of access tokens, i.e. `expiration_second`.
+            batch_size: The max number of access tokens deleted in one transaction.
+            session_maker: The db to clean, defaults to the db of `GLOBAL_CONFIG`.
+        """
+        super().__init__(self.collect, interval=interval, name="token gc")
+        self.lifetime_seconds = lifetime_seconds
+        self.batch_size = batch_size
+        self.session_maker = session_maker
+        self.runs = 0
+        self.total_removed = 0
+        self.last_removed = 0
+        self.last_duration_second = 0.0
+
+    async def collect(self) -> int:
+        """Run once, return the number of removed tokens."""
+        start = time.perf_counter()
+        now = datetime.now(timezone.utc)
+        max_age = now - timedelta(seconds=self.lifetime_seconds)
+
+        removed = 0
+        async with self.session_maker() as session:
+            while True:
+                deleted = await delete_expired_access_tokens(
+                    session, max_age, limit=self.batch_size
+                )
+                removed += deleted
+                if deleted < self.batch_size:
+                    break
+                # let other requests use the db between batches
+                await asyncio.sleep(0)
+            revoked_token_db = RevokedTokenDatabase(session, RevokedToken)
+            removed += await revoked_token_db.delete_expired(now)
+
+        duration = time.perf_counter() - start
+        self.runs += 1
+        self.total_removed += removed
+        self.last_removed = removed
+        self.last_duration_second = duration
+        if removed:
+            logger.info(
+                f"Token gc removed {removed} expired tokens in {duration * 1000:.1f} ms"
+            )
+        return removed
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "runs": self.runs,
+            "total_removed": self.total_removed,
+            "last_removed": self.last_removed,
+            "last_duration_second": self.last_duration_second,
+        }
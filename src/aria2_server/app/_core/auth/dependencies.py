@@ -2,24 +2,18 @@ from typing import (
     Any,
     Mapping,
     Optional,
-    Sequence,
     TypeVar,
     Union,
 )
 
 from fastapi import Depends, HTTPException, WebSocketException
 from fastapi.requests import HTTPConnection
-from fastapi_users.authentication import AuthenticationBackend, CookieTransport
-from fastapi_users.authentication.strategy.db import (
-    DatabaseStrategy,
-)
-from fastapi_users_db_sqlalchemy import UUID_ID
 from typing_extensions import Annotated
 
 from aria2_server.app._core.auth._api_key import ConnAPIKeyCookie
-from aria2_server.app._core.auth._core import UserManager, fastapi_users_helper
+from aria2_server.app._core.auth._core import AUTH_COOKIE_NAME, Auth
+from aria2_server.app._core.auth._core import auth as default_auth
 from aria2_server.app._core.utils.dependencies import get_root_path
-from aria2_server.db.access_token import AccessToken
 from aria2_server.db.user import User
 
 __all__ = ("UserRedirect",)
@@ -28,25 +22,6 @@ __all__ = ("UserRedirect",)
 _UserTypeVar = TypeVar("_UserTypeVar", bound=User)
 
 
-# HACK: this is fastapi-users typing issue
-_authenticator_backends: Sequence[
-    AuthenticationBackend[User, UUID_ID]
-] = fastapi_users_helper.authenticator.backends  # pyright: ignore[reportUnknownMemberType]
-
-# we only design it for cookie_database backend currently
-assert len(_authenticator_backends) == 1, "More than one cookie_database backend"
-assert isinstance(_authenticator_backends[0], AuthenticationBackend)
-assert (
-    _authenticator_backends[0].name == "cookie_database"
-), "Is not cookie_database backend"
-_cookie_database_backend = _authenticator_backends[0]
-
-# for typing hint
-assert isinstance(_cookie_database_backend.transport, CookieTransport)
-_cookie_database_backend_transport = _cookie_database_backend.transport
-_cookie_database_backend_get_strategy = _cookie_database_backend.get_strategy
-
-
 class UserRedirect:
     """This dependency can be used for both HTTP and WebSocket.
 
@@ -71,6 +46,8 @@ class UserRedirect:
         active: bool = False,
         verified: bool = False,
         superuser: bool = False,
+        # aria2-server
+        auth: Auth = default_auth,
     ):
         self.redirect_url = redirect_url
         self.use_root_path = use_root_path
@@ -83,6 +60,7 @@ class UserRedirect:
         self.active = active
         self.verified = verified
         self.superuser = superuser
+        self.auth = auth
 
     # TODO, FIXME, HACK: Can not use `fastapi_user.current_user()` directly,
     # See: https://github.com/fastapi-users/fastapi-users/issues/295
@@ -92,35 +70,22 @@ class UserRedirect:
         self,
         conn: HTTPConnection,
         root_path: Annotated[str, Depends(get_root_path)],
-        user_manager: Annotated[
-            UserManager, Depends(fastapi_users_helper.get_user_manager)
-        ],
         token: Annotated[
             Union[str, None],
-            Depends(
-                ConnAPIKeyCookie(
-                    name=_cookie_database_backend_transport.cookie_name,
-                    auto_error=False,
-                )
-            ),
-        ],
-        strategy: Annotated[
-            DatabaseStrategy[User, UUID_ID, AccessToken],
-            Depends(_cookie_database_backend_get_strategy),
+            Depends(ConnAPIKeyCookie(name=AUTH_COOKIE_NAME, auto_error=False)),
         ],
     ) -> Optional[User]:
         # Modified: https://github.com/fastapi-users/fastapi-users/blob/ae9f52474ba2c7baebeb923e4d03aea479765362/fastapi_users/authentication/authenticator.py#L148-L186
 
+        # NOTE: read the token by `self.auth` instead of dependencies,
+        # because the dependencies of a signature can not vary with the instance.
         if token is not None:
-            user = await strategy.read_token(token, user_manager)
+            user = await self.auth.read_token(token)
         else:
             user = None
 
         if not self.optional and (user is None or self.check_user(user) is None):
-            if self.use_root_path:
-                _redirect_url = root_path + self.redirect_url
-            else:
-                _redirect_url = self.redirect_url
+            _redirect_url = self.get_redirect_url(root_path)
 
             msg = f"Unauthorized, Please redirect to {_redirect_url} to login."
             scope_type = conn.scope.get("type")
@@ -146,6 +111,24 @@ class UserRedirect:
 
         return user
 
+    def get_redirect_url(self, root_path: str) -> str:
+        if self.use_root_path:
+            return root_path + self.redirect_url
+        return self.redirect_url
+
+    async def read_user(self, conn: HTTPConnection) -> Optional[User]:
+        """Read the valid user of `conn` without fastapi dependency injection.
+
+        This is for raw ASGI apps, which are not routed by fastapi.
+        Unlike `self.__call__`, it never raises; if can not get a valid user, return None.
+        """
+        token = conn.cookies.get(AUTH_COOKIE_NAME)
+        if not token:
+            return None
+
+        user = await self.auth.read_token(token)
+        return self.check_user(user) if user is not None else None
+
     def check_user(
         self,
         user: _UserTypeVar,
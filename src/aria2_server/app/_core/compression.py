@@ -0,0 +1,283 @@
+"""Negotiated gzip/brotli compression of HTTP responses.
+
+NiceGUI always installs starlette's `GZipMiddleware` with fixed settings,
+which also buffers streaming responses (e.g. Server-Sent Events) until its internal buffer is full.
+`CompressionMiddleware` takes over the responses of the given path prefixes:
+it negotiates brotli (if the optional `brotli` package is installed) or gzip,
+honours the configured threshold and level, and flushes every chunk of streaming responses.
+Other paths are left to NiceGUI.
+"""
+
+import gzip
+import zlib
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli  # pyright: ignore[reportMissingImports]
+except ImportError:
+    brotli = None
+
+__all__ = (
+    "CompressionMiddleware",
+    "compress",
+    "is_brotli_available",
+    "is_compressible",
+    "negotiate_encoding",
+)
+
+
+# the content types which are worth compressing,
+# e.g. images (except svg) and fonts are already compressed.
+_COMPRESSIBLE_CONTENT_TYPES = (
+    "text/",
+    "application/json",
+    "application/json-rpc",
+    "application/javascript",
+    "application/xml",
+    "application/manifest+json",
+    "image/svg+xml",
+)
+
+
+def is_brotli_available() -> bool:
+    return brotli is not None
+
+
+def _parse_accept_encoding(accept_encoding: str) -> Dict[str, float]:
+    # e.g. `gzip, deflate, br;q=0.9` -> {"gzip": 1.0, "deflate": 1.0, "br": 0.9}
+    qualities: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        param_name, _, param_value = params.strip().partition("=")
+        if param_name.strip().lower() == "q":
+            try:
+                quality = float(param_value)
+            except ValueError:
+                quality = 0.0
+        qualities[coding] = quality
+    return qualities
+
+
+def compress(data: bytes, encoding: str, *, level: int) -> bytes:
+    """Compress the whole `data` at once.
+
+    Args:
+        encoding: `"gzip"` or `"br"`, `"br"` requires the optional `brotli` package.
+        level: The gzip level (1-9) or brotli quality (0-11).
+    """
+    if encoding == "br":
+        assert brotli is not None, "brotli is not installed"
+        return brotli.compress(data, quality=level)  # pyright: ignore[reportUnknownMemberType, reportUnknownVariableType]
+    if encoding == "gzip":
+        # `mtime=0`: make the output reproducible
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+def is_compressible(content_type: str) -> bool:
+    return content_type.lower().startswith(_COMPRESSIBLE_CONTENT_TYPES)
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Return `"br"`, `"gzip"` or `None` (identity) for the `Accept-Encoding` header.
+
+    Brotli is preferred when the qualities are equal, if it is available.
+    """
+    qualities = _parse_accept_encoding(accept_encoding)
+    candidates: List[Tuple[float, str]] = []
+    if is_brotli_available():
+        candidates.append((qualities.get("br", 0), "br"))
+    candidates.append((qualities.get("gzip", qualities.get("*", 0)), "gzip"))
+    quality, encoding = max(candidates, key=lambda candidate: candidate[0])
+    return encoding if quality > 0 else None
+
+
+class _Compressor(ABC):
+    """A streaming compressor, every `compress` output can be decoded by the client immediately."""
+
+    @abstractmethod
+    def compress(self, data: bytes) -> bytes:
+        """Compress `data`, and flush it so that the output is a complete block."""
+
+    @abstractmethod
+    def finish(self) -> bytes:
+        """Return the rest of the compressed stream, the compressor can not be used after it."""
+
+
+class _GzipCompressor(_Compressor):
+    def __init__(self, level: int) -> None:
+        # `wbits=31`: gzip container
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(
+            zlib.Z_SYNC_FLUSH
+        )
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class _BrotliCompressor(_Compressor):
+    def __init__(self, quality: int) -> None:
+        assert brotli is not None
+        self._compressor: Any = brotli.Compressor(quality=quality)  # pyright: ignore[reportUnknownMemberType]
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class _CompressionResponder:
+    def __init__(
+        self,
+        app: ASGIApp,
+        *,
+        encoding: str,
+        minimum_size: int,
+        gzip_level: int,
+        brotli_quality: int,
+    ) -> None:
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.send: Optional[Send] = None
+        self.initial_message: Message = {}
+        self.started = False
+        self.passthrough = False
+        self.compressor: Optional[_Compressor] = None
+
+    def _new_compressor(self) -> _Compressor:
+        if self.encoding == "br":
+            return _BrotliCompressor(self.brotli_quality)
+        return _GzipCompressor(self.gzip_level)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message: Message) -> None:
+        send = self.send
+        assert send is not None
+
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            # Don't send the initial message until we know whether to compress the body.
+            self.initial_message = message
+            headers = Headers(raw=message["headers"])
+            self.passthrough = "content-encoding" in headers or not is_compressible(
+                headers.get("content-type", "")
+            )
+            return
+        if message_type != "http.response.body":
+            await send(message)
+            return
+
+        if self.passthrough:
+            if not self.started:
+                self.started = True
+                await send(self.initial_message)
+            await send(message)
+            return
+
+        body: bytes = message.get("body", b"")
+        more_body: bool = message.get("more_body", False)
+
+        if not self.started:
+            self.started = True
+            if not more_body and (not body or len(body) < self.minimum_size):
+                # Don't compress small (or empty, e.g. `304`) responses.
+                self.passthrough = True
+                await send(self.initial_message)
+                await send(message)
+                return
+
+            headers = MutableHeaders(raw=self.initial_message["headers"])
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            # validators of the identity representation are no longer valid,
+            # see https://www.rfc-editor.org/rfc/rfc9110#section-8.8.3.3
+            if "etag" in headers and not headers["etag"].startswith("W/"):
+                headers["ETag"] = "W/" + headers["etag"]
+
+            self.compressor = self._new_compressor()
+            if more_body:
+                del headers["Content-Length"]
+                message["body"] = self.compressor.compress(body)
+            else:
+                body = self.compressor.compress(body) + self.compressor.finish()
+                headers["Content-Length"] = str(len(body))
+                message["body"] = body
+            await send(self.initial_message)
+            await send(message)
+            return
+
+        assert self.compressor is not None
+        compressed = self.compressor.compress(body)
+        if not more_body:
+            compressed += self.compressor.finish()
+        message["body"] = compressed
+        await send(message)
+
+
+class CompressionMiddleware:
+    """Compress the responses of `path_prefixes` with negotiated brotli or gzip.
+
+    The `Accept-Encoding` header is removed before calling the inner app for these paths,
+    so that inner compression middlewares (i.e. NiceGUI's `GZipMiddleware`) will not compress twice.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        *,
+        path_prefixes: Sequence[str],
+        minimum_size: int,
+        gzip_level: int,
+        brotli_quality: int,
+    ) -> None:
+        self.app = app
+        self.path_prefixes = tuple(path_prefixes)
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefixes):
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        encoding = negotiate_encoding(headers.get("accept-encoding", ""))
+        inner_scope = {
+            **scope,
+            "headers": [
+                (key, value)
+                for key, value in scope["headers"]
+                if key.lower() != b"accept-encoding"
+            ],
+        }
+        if encoding is None:
+            await self.app(inner_scope, receive, send)
+            return
+
+        responder = _CompressionResponder(
+            self.app,
+            encoding=encoding,
+            minimum_size=self.minimum_size,
+            gzip_level=self.gzip_level,
+            brotli_quality=self.brotli_quality,
+        )
+        await responder(inner_scope, receive, send)
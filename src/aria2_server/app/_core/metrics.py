@@ -0,0 +1,32 @@
+"""In-process metrics of aria2-server, exposed by `GET /api/metrics`.
+
+Components register a collector under a unique name,
+the collector is called on every read, so it should be cheap and never block.
+"""
+
+from typing import Any, Callable, Dict
+
+__all__ = ("MetricsCollector", "MetricsRegistry", "metrics_registry")
+
+
+MetricsCollector = Callable[[], Dict[str, Any]]
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._collectors: Dict[str, MetricsCollector] = {}
+
+    def register(self, name: str, collector: MetricsCollector) -> None:
+        """Register `collector` under `name`, replacing the existing one if any."""
+        self._collectors[name] = collector
+
+    def unregister(self, name: str) -> None:
+        self._collectors.pop(name, None)
+
+    def collect(self) -> Dict[str, Dict[str, Any]]:
+        """Return `{name: metrics}` of all registered collectors."""
+        return {name: collector() for name, collector in self._collectors.items()}
+
+
+metrics_registry = MetricsRegistry()
+"""The registry shared by all components in aria2-server."""
@@ -1,14 +1,36 @@
-from typing import Any, TypeVar
+import asyncio
+import hashlib
+import mimetypes
+import os
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Optional, TypeVar
 
 from fastapi import FastAPI
+from starlette.datastructures import URL, Headers
+from starlette.exceptions import HTTPException
 from starlette.requests import Request
-from starlette.responses import Response
+from starlette.responses import RedirectResponse, Response
 from starlette.staticfiles import StaticFiles as StarletteStaticFiles
 
-__all__ = ("StaticFiles", "bind_static_files_to_app")
+from aria2_server.app._core.compression import (
+    compress,
+    is_brotli_available,
+    is_compressible,
+    negotiate_encoding,
+)
+
+__all__ = ("InMemoryStaticFiles", "StaticFiles", "bind_static_files_to_app")
 
 _AppType = TypeVar("_AppType", bound=FastAPI)
 
+# e.g. `aria-ng-f1dd57abb9.min.js`, `vendor-3a4b5c6d.css`
+_HASHED_FILENAME_PATTERN = re.compile(r"[.-][0-9a-f]{8,}[.-]")
+_IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# always revalidate with the ETag
+_REVALIDATE_CACHE_CONTROL = "no-cache"
+
 
 class StaticFiles(StarletteStaticFiles):
     assert not hasattr(StarletteStaticFiles, "get_response_for_request")
@@ -25,6 +47,155 @@ class StaticFiles(StarletteStaticFiles):
         return await self.get_response(self.get_path(scope), scope)
 
 
+@dataclass(frozen=True)
+class _InMemoryFile:
+    media_type: str
+    cache_control: str
+    etag: str
+    """The strong ETag of the identity content, e.g. `"<sha256>"`"""
+    content: bytes
+    encoded: Dict[str, bytes] = field(default_factory=dict)
+    """`{content-coding: content}`, only contains the variants smaller than the identity one."""
+
+    def etag_of(self, encoding: Optional[str]) -> str:
+        # different content-codings are different representations,
+        # so they must have different strong ETags.
+        if encoding is None:
+            return self.etag
+        return f'{self.etag[:-1]}-{encoding}"'
+
+
+def _load_file(path: Path, relative_path: str) -> _InMemoryFile:
+    content = path.read_bytes()
+    media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    if media_type.startswith("text/"):
+        media_type += "; charset=utf-8"
+
+    encoded: Dict[str, bytes] = {}
+    if is_compressible(media_type):
+        # precomputed only once, so use the best compression levels
+        variants = {"gzip": compress(content, "gzip", level=9)}
+        if is_brotli_available():
+            variants["br"] = compress(content, "br", level=11)
+        encoded = {
+            encoding: data
+            for encoding, data in variants.items()
+            if len(data) < len(content)
+        }
+
+    return _InMemoryFile(
+        media_type=media_type,
+        cache_control=(
+            _IMMUTABLE_CACHE_CONTROL
+            if _HASHED_FILENAME_PATTERN.search(relative_path.rsplit("/", 1)[-1])
+            else _REVALIDATE_CACHE_CONTROL
+        ),
+        etag=f'"{hashlib.sha256(content).hexdigest()[:32]}"',
+        content=content,
+        encoded=encoded,
+    )
+
+
+class InMemoryStaticFiles(StaticFiles):
+    """Serve a directory from memory, without touching disk after `load`.
+
+    - Precomputed gzip and brotli (if the optional `brotli` package is installed) variants.
+    - Strong ETags, and `304` for matched `If-None-Match`.
+    - `Cache-Control: immutable` for hashed files (e.g. `aria-ng-f1dd57abb9.min.js`),
+        other files must be revalidated.
+
+    Before `load` is finished, requests are served from disk as `StaticFiles` does.
+    The files in the directory are supposed to be unchanged after `load`.
+    """
+
+    def __init__(self, *, directory: "os.PathLike[str]", html: bool = False) -> None:
+        super().__init__(directory=directory, html=html)
+        self.root = Path(directory)
+        self._files: Optional[Dict[str, _InMemoryFile]] = None
+
+    def _load_files(self) -> Dict[str, _InMemoryFile]:
+        files: Dict[str, _InMemoryFile] = {}
+        for path in self.root.rglob("*"):
+            if path.is_file():
+                relative_path = path.relative_to(self.root).as_posix()
+                files[relative_path] = _load_file(path, relative_path)
+        return files
+
+    async def load(self) -> None:
+        """Load all files into memory in a thread, should be called on startup."""
+        if self._files is not None:
+            return
+        loop = asyncio.get_running_loop()
+        self._files = await loop.run_in_executor(None, self._load_files)
+
+    def _file_response(
+        self, file: _InMemoryFile, scope: Any, status_code: int = 200
+    ) -> Response:
+        request_headers = Headers(scope=scope)
+        encoding: Optional[str] = None
+        if file.encoded:
+            encoding = negotiate_encoding(request_headers.get("accept-encoding", ""))
+            if encoding not in file.encoded:
+                encoding = None
+        etag = file.etag_of(encoding)
+
+        headers = {"ETag": etag, "Cache-Control": file.cache_control}
+        if file.encoded:
+            headers["Vary"] = "Accept-Encoding"
+
+        if_none_match = request_headers.get("if-none-match")
+        if status_code == 200 and if_none_match is not None:
+            # weak comparison, see https://www.rfc-editor.org/rfc/rfc9110#section-13.1.2
+            tags = [tag.strip() for tag in if_none_match.split(",")]
+            tags = [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+            if etag in tags or "*" in tags:
+                return Response(status_code=304, headers=headers)
+
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+            content = file.encoded[encoding]
+        else:
+            content = file.content
+        return Response(
+            content,
+            status_code=status_code,
+            headers=headers,
+            media_type=file.media_type,
+        )
+
+    async def get_response_for_request(self, request: Request) -> Response:
+        files = self._files
+        if files is None:
+            return await super().get_response_for_request(request)
+
+        scope = request.scope
+        if scope["method"] not in ("GET", "HEAD"):
+            raise HTTPException(status_code=405)
+
+        path = Path(self.get_path(scope)).as_posix()
+        path = "" if path == "." else path
+
+        file = files.get(path)
+        if file is not None:
+            return self._file_response(file, scope)
+
+        if self.html:
+            index_path = f"{path}/index.html" if path else "index.html"
+            index = files.get(index_path)
+            if index is not None:
+                # keep consistent with `StaticFiles`
+                if not scope["path"].endswith("/"):
+                    url = URL(scope=scope)
+                    return RedirectResponse(url=url.replace(path=url.path + "/"))
+                return self._file_response(index, scope)
+
+            not_found = files.get("404.html")
+            if not_found is not None:
+                return self._file_response(not_found, scope, status_code=404)
+
+        raise HTTPException(status_code=404)
+
+
 def bind_static_files_to_app(
     static_files: StaticFiles, app: _AppType, *args: Any, **kwargs: Any
 ) -> _AppType:
@@ -0,0 +1,64 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Optional
+
+from aria2_server import logger
+
+__all__ = ("PeriodicTask",)
+
+
+class PeriodicTask:
+    """Run a coroutine function periodically in the running event loop.
+
+    Unexpected exceptions of the function will be logged, and will not stop the task.
+
+    Examples:
+        ```py
+        task = PeriodicTask(do_something, interval=1, name="do something")
+        app.on_startup(task.start)
+        app.on_shutdown(task.aclose)
+        ```
+    """
+
+    def __init__(
+        self,
+        func: Callable[[], Awaitable[Any]],
+        *,
+        interval: float,
+        name: str,
+    ) -> None:
+        """
+        Args:
+            func: The coroutine function to run.
+            interval: The seconds to wait after each run.
+            name: The name used in logs.
+        """
+        if interval <= 0:
+            raise ValueError("interval must be greater than 0")
+        self.func = func
+        self.interval = interval
+        self.name = name
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    async def _run_forever(self) -> None:
+        while True:
+            try:
+                await self.func()
+            except Exception:
+                logger.exception(f"Unexpected error in periodic task '{self.name}'")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        """Start the task in the running event loop."""
+        if self._task is not None and not self._task.done():
+            raise RuntimeError(f"Periodic task '{self.name}' is already running")
+        self._task = asyncio.get_running_loop().create_task(self._run_forever())
+
+    async def aclose(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
@@ -0,0 +1,267 @@
+"""Build an aria2-server API app from a config, see `create_app`.
+
+Unlike `aria2_server.app.main`, which serves the app configured by `GLOBAL_CONFIG`
+(and has to `config.reload()` the modules to launch with another config),
+`create_app` builds the db engine, the auth backend, the aria2c proxy client and the routers
+as the state of the returned app; so several apps with different configs can live in one process,
+e.g. in tests, or in a launcher serving multiple tenants.
+
+NOTE: The returned app only serves `/api`, i.e. without the NiceGUI pages and AriaNg,
+because NiceGUI's app and pages are process-wide singletons.
+It does not spawn aria2c either, it connects to the aria2c described by `config.aria2`.
+"""
+
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncGenerator, List, Optional, Sequence, Tuple
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from aria2_server.app._core import api
+from aria2_server.app._core.aria2 import (
+    Aria2DownloadQueue,
+    Aria2HistoryArchiver,
+    Aria2ShardRouter,
+    Aria2StatePoller,
+    Aria2StateStore,
+    create_upstream_client,
+)
+from aria2_server.app._core.auth import (
+    Auth,
+    JWTState,
+    PasswordHasher,
+    PasswordHasherBusyError,
+    SessionCache,
+    UserRedirect,
+)
+from aria2_server.app._core.compression import CompressionMiddleware
+from aria2_server.app._core.metrics import MetricsRegistry
+from aria2_server.config.schemas import Compression, Config, ServerExtra
+from aria2_server.db import Database, migrations
+
+__all__ = (
+    "AppState",
+    "Aria2Components",
+    "add_compression_middleware",
+    "build_aria2_components",
+    "create_app",
+)
+
+
+@dataclass(frozen=True)
+class AppState:
+    """The state of an app built by `create_app`, i.e. `app.state.aria2_server`."""
+
+    config: Config
+    database: Database
+    auth: Auth
+    user_redirect: UserRedirect
+    metrics_registry: MetricsRegistry
+
+
+@dataclass(frozen=True)
+class Aria2Components:
+    """The aria2c components shared by the aria2c proxy and the background tasks,
+    see `build_aria2_components`."""
+
+    shard_router: Optional[Aria2ShardRouter]
+    download_queue: Optional[Aria2DownloadQueue]
+    download_history: Optional[Aria2HistoryArchiver]
+    state_poller: Optional[Aria2StatePoller]
+    clients: Tuple[httpx.AsyncClient, ...]
+    """The clients owned by the components, closed by `aclose`."""
+
+    def start(self) -> None:
+        """Start the download queue, the archiver and the state poller,
+        should be called on startup."""
+        if self.download_queue is not None:
+            self.download_queue.start()
+        if self.download_history is not None:
+            self.download_history.start()
+        if self.state_poller is not None:
+            self.state_poller.start()
+
+    async def stop(self) -> None:
+        """Stop the download queue, the archiver and the state poller."""
+        if self.download_queue is not None:
+            await self.download_queue.aclose()
+        if self.download_history is not None:
+            await self.download_history.aclose()
+        if self.state_poller is not None:
+            await self.state_poller.aclose()
+
+    async def aclose(self) -> None:
+        """Close the shard router and the clients,
+        must be called after `stop` and after closing the other users of `shard_router`
+        (i.e. the aria2c proxy)."""
+        if self.shard_router is not None:
+            await self.shard_router.aclose()
+        for client in self.clients:
+            await client.aclose()
+
+
+def build_aria2_components(
+    config: Config,
+    *,
+    session_maker: "async_sessionmaker[AsyncSession]",
+    registry: MetricsRegistry,
+    state_store: Optional[Aria2StateStore] = None,
+) -> Aria2Components:
+    """Build the shard router, the download queue, the archiver and the state poller
+    enabled by `config`, and register their metrics in `registry`.
+
+    NOTE: one router for the aria2c proxy, the download queue, the archiver and the poller,
+    so that they share the GID -> instance table, the health check and the remote pools.
+
+    Args:
+        state_store: Where the state poller puts the polled snapshots,
+            the poller is only built with it.
+    """
+    extra = config.server.extra
+    clients: List[httpx.AsyncClient] = []
+
+    def create_client(name: str) -> httpx.AsyncClient:
+        client = create_upstream_client(
+            name, upstream_config=extra.aria2_upstream, registry=registry
+        )
+        clients.append(client)
+        return client
+
+    shard_router: Optional[Aria2ShardRouter] = None
+    if Aria2ShardRouter.is_enabled(config):
+        shard_router = Aria2ShardRouter.from_config(
+            create_client("shard_router"),
+            config,
+            name="shard_router.federation",
+            registry=registry,
+        )
+        registry.register("aria2_shards", shard_router.metrics)
+
+    download_queue: Optional[Aria2DownloadQueue] = None
+    if extra.download_queue.enabled:
+        download_queue = Aria2DownloadQueue.from_config(
+            create_client("download_queue"),
+            config,
+            session_maker=session_maker,
+            shard_router=shard_router,
+        )
+        registry.register("download_queue", download_queue.metrics)
+
+    download_history: Optional[Aria2HistoryArchiver] = None
+    if extra.download_history.interval_second > 0:
+        download_history = Aria2HistoryArchiver.from_config(
+            create_client("download_history"),
+            config,
+            session_maker=session_maker,
+            shard_router=shard_router,
+        )
+        registry.register("download_history", download_history.metrics)
+
+    state_poller: Optional[Aria2StatePoller] = None
+    if state_store is not None and extra.aria2_state_polling.interval_second > 0:
+        state_poller = Aria2StatePoller.from_config(
+            create_client("state_poller"),
+            config,
+            state_store,
+            shard_router=shard_router,
+        )
+
+    return Aria2Components(
+        shard_router=shard_router,
+        download_queue=download_queue,
+        download_history=download_history,
+        state_poller=state_poller,
+        clients=tuple(clients),
+    )
+
+
+def add_compression_middleware(
+    app: FastAPI, compression: Compression, *, path_prefixes: Sequence[str]
+) -> None:
+    """Compress the responses of `path_prefixes` of `app`, if `compression` is enabled."""
+    if compression.enabled:
+        app.add_middleware(
+            CompressionMiddleware,
+            path_prefixes=tuple(path_prefixes),
+            minimum_size=compression.minimum_size,
+            gzip_level=compression.gzip_level,
+            brotli_quality=compression.brotli_quality,
+        )
+
+
+def _build_auth(
+    extra: ServerExtra, database: Database, registry: MetricsRegistry
+) -> Auth:
+    session_cache = SessionCache(
+        ttl=extra.session_cache.ttl_second,
+        max_entries=extra.session_cache.max_entries,
+    )
+    registry.register("session_cache", session_cache.metrics)
+    password_hasher = PasswordHasher(
+        max_workers=extra.password_hashing.max_workers,
+        max_queue=extra.password_hashing.max_queue,
+    )
+    registry.register("password_hashing", password_hasher.metrics)
+    return Auth(
+        extra,
+        database,
+        session_cache=session_cache,
+        password_hasher=password_hasher,
+        jwt_state=JWTState(database.session_maker),
+    )
+
+
+def create_app(config: Config) -> FastAPI:
+    """Build a new API app configured by `config`, without touching `GLOBAL_CONFIG`.
+
+    The db is upgraded to the latest revision on startup,
+    and all resources (e.g. the connections to the db and aria2c) are closed on shutdown.
+    """
+    extra = config.server.extra
+
+    registry = MetricsRegistry()
+    database = Database.from_config(extra)
+    auth = _build_auth(extra, database, registry)
+    user_redirect = api.create_user_redirect(auth, optional=False)
+    aria2_components = build_aria2_components(
+        config, session_maker=database.session_maker, registry=registry
+    )
+
+    api_assembly = api.build_api(
+        config,
+        auth=auth,
+        user_redirect=user_redirect,
+        registry=registry,
+        download_queue=aria2_components.download_queue,
+        download_history=aria2_components.download_history,
+        shard_router=aria2_components.shard_router,
+    )
+
+    @asynccontextmanager
+    async def lifespan(_: FastAPI) -> AsyncGenerator[None, None]:
+        await migrations.run_async_upgrade_if_needed(database.engine)
+        await auth.load()
+        aria2_components.start()
+        try:
+            yield
+        finally:
+            await aria2_components.stop()
+            await api_assembly.on_shutdown()
+            await aria2_components.aclose()
+            auth.password_hasher.shutdown()
+            await database.dispose()
+
+    app = FastAPI(lifespan=lifespan)
+    app.state.aria2_server = AppState(
+        config=config,
+        database=database,
+        auth=auth,
+        user_redirect=user_redirect,
+        metrics_registry=registry,
+    )
+    app.add_exception_handler(PasswordHasherBusyError, api.password_hasher_busy_handler)  # pyright: ignore[reportArgumentType]
+    add_compression_middleware(app, extra.compression, path_prefixes=("/api/aria2",))
+    api_assembly.include_in(app)
+    return app
@@ -1,29 +1,49 @@
 import asyncio
+import importlib
+import time
 from contextlib import ExitStack, asynccontextmanager, contextmanager
+from dataclasses import dataclass
 from textwrap import dedent
 from typing import (
     Any,
+    Awaitable,
     Callable,
     ContextManager,
+    Dict,
     Generator,
     List,
+    TypeVar,
 )
 
 from fastapi_users.exceptions import UserNotExists
+from nicegui import app as nicegui_app
 from sqlalchemy import exists
 
 from aria2_server import logger
 from aria2_server.app._core.aria2 import Aria2WatchdogLifespan
-from aria2_server.app._core.auth import UserManager, get_user_manager
+from aria2_server.app._core.auth import (
+    TokenGarbageCollector,
+    UserManager,
+    get_user_manager,
+    load_jwt_state,
+    password_hasher,
+)
+from aria2_server.app._core.metrics import metrics_registry
+from aria2_server.app._core.server_config import ServerConfig, get_server_config_in_db
+from aria2_server.config import GLOBAL_CONFIG
 from aria2_server.db import get_async_session, migrations
 from aria2_server.db.user import get_user_db
 from aria2_server.db.user.schemas import UserCreate
 
-__all__ = ("context", "lifespans")
+__all__ = ("StartupResult", "context", "lifespans")
+
 
+_T = TypeVar("_T")
 
 _LifespanType = Callable[[], ContextManager[Any]]
 
+_STARTUP_PHASES = ("db", "aria2c", "ui", "total")
+
 _DEFAULT_SUPERUSER = UserCreate(
     email="aria2@server.com",
     password="admin",
@@ -33,10 +53,9 @@ _DEFAULT_SUPERUSER = UserCreate(
 )
 
 
-@contextmanager
-def _init_db(*_) -> Generator[None, None, None]:
-    asyncio.run(migrations.run_async_upgrade())
-    yield
+async def _init_db() -> None:
+    upgraded = await migrations.run_async_upgrade_if_needed()
+    logger.debug(f"db {'upgraded' if upgraded else 'is already at head'}")
 
 
 async def _check_if_user_existent(
@@ -57,73 +76,157 @@ async def _check_if_user_existent(
     except UserNotExists:
         return False
 
-    is_same_pwd, _ = user_manager.password_helper.verify_and_update(
+    is_same_pwd, _ = await password_hasher.verify_and_update(
         password, existent_user.hashed_password
     )
 
     return is_same_pwd
 
 
+async def _init_superuser_in_db() -> None:
+    get_async_session_context = asynccontextmanager(get_async_session)
+    get_user_db_context = asynccontextmanager(get_user_db)
+    get_user_manager_context = asynccontextmanager(get_user_manager)
+
+    async with get_async_session_context() as session, get_user_db_context(
+        session
+    ) as user_db, get_user_manager_context(user_db) as user_manager:
+        # If there are not any users in the database, create a default superuser.
+        _results = await session.execute(exists(user_db.user_table).select())
+
+        at_least_one_user_existent = _results.scalar_one()
+        assert isinstance(at_least_one_user_existent, bool)
+
+        if not at_least_one_user_existent:
+            await user_manager.create(_DEFAULT_SUPERUSER)
+
+        # Check if the default superuser exists, if so, issue a security warning.
+        email_to_check = _DEFAULT_SUPERUSER.email
+        password_to_check = _DEFAULT_SUPERUSER.password
+
+        if await _check_if_user_existent(
+            user_manager,
+            email=email_to_check,
+            password=password_to_check,
+        ):
+            msg = dedent(
+                f"""\
+                The default user exists in the system, which is a security risk.
+                please change the account as soon as possible.
+
+                default user:
+                ---
+                email: {email_to_check}
+                password: {password_to_check}
+                ---"""
+            )
+            logger.warning(msg)
+
+
 @contextmanager
-def _init_superuser_in_db(*_) -> Generator[None, None, None]:
-    async def main():
-        get_async_session_context = asynccontextmanager(get_async_session)
-        get_user_db_context = asynccontextmanager(get_user_db)
-        get_user_manager_context = asynccontextmanager(get_user_manager)
-
-        async with get_async_session_context() as session, get_user_db_context(
-            session
-        ) as user_db, get_user_manager_context(user_db) as user_manager:
-            # If there are not any users in the database, create a default superuser.
-            _results = await session.execute(exists(user_db.user_table).select())
-
-            at_least_one_user_existent = _results.scalar_one()
-            assert isinstance(at_least_one_user_existent, bool)
-
-            if not at_least_one_user_existent:
-                await user_manager.create(_DEFAULT_SUPERUSER)
-
-            # Check if the default superuser exists, if so, issue a security warning.
-            email_to_check = _DEFAULT_SUPERUSER.email
-            password_to_check = _DEFAULT_SUPERUSER.password
-
-            if await _check_if_user_existent(
-                user_manager,
-                email=email_to_check,
-                password=password_to_check,
-            ):
-                msg = dedent(
-                    f"""\
-                    The default user exists in the system, which is a security risk.
-                    please change the account as soon as possible.
-
-                    default user:
-                    ---
-                    email: {email_to_check}
-                    password: {password_to_check}
-                    ---"""
-                )
-                logger.warning(msg)
-
-    asyncio.run(main())
+def _run_token_gc(*_) -> Generator[None, None, None]:
+    token_gc_config = GLOBAL_CONFIG.server.extra.token_gc
+    if token_gc_config.interval_second > 0:
+        token_gc = TokenGarbageCollector(
+            interval=token_gc_config.interval_second,
+            lifetime_seconds=GLOBAL_CONFIG.server.extra.expiration_second,
+            batch_size=token_gc_config.batch_size,
+        )
+        metrics_registry.register("token_gc", token_gc.metrics)
+        # NOTE: run it in the event loop of the server, which owns the db connections.
+        nicegui_app.on_startup(token_gc.start)
+        nicegui_app.on_shutdown(token_gc.aclose)
     yield
 
 
-# NOTE: It is best to start aria2c within this lifespan,
-# so that users can use aria2c without starting the app.
 lifespans: List[_LifespanType] = [
-    _init_db,
-    _init_superuser_in_db,
-    Aria2WatchdogLifespan,
+    _run_token_gc,
 ]
 """We provide this list for you to append your own lifespan events,
-but you cannot modify the existing events."""
+but you cannot modify the existing events.
+
+They are entered in order after the startup pipeline (see `context`),
+i.e. the db is initialized and aria2c is running.
+"""
+
+
+@dataclass(frozen=True)
+class StartupResult:
+    server_config: ServerConfig
+    """The server config in the db, e.g. the secret of NiceGUI storage."""
+    phase_durations: Dict[str, float]
+    """The seconds of each phase of the startup pipeline, and `total`."""
+
+
+async def _timed(
+    name: str, phase: Awaitable[_T], phase_durations: Dict[str, float]
+) -> _T:
+    start = time.perf_counter()
+    try:
+        return await phase
+    finally:
+        phase_durations[name] = time.perf_counter() - start
+
+
+async def _run_in_thread(func: Callable[[], _T]) -> _T:
+    return await asyncio.get_running_loop().run_in_executor(None, func)
+
+
+async def _db_phase() -> ServerConfig:
+    # NOTE: these steps depend on the schema, so they run in order
+    await _init_db()
+    await _init_superuser_in_db()
+    if GLOBAL_CONFIG.server.extra.auth_strategy == "jwt":
+        await load_jwt_state()
+    return await get_server_config_in_db()
+
+
+async def _aria2c_phase(stack: ExitStack) -> None:
+    # NOTE: It is best to start aria2c within the lifespan,
+    # so that users can use aria2c without starting the app.
+    # It returns after aria2c answers `aria2.getVersion`, see `Aria2ReadinessGate`.
+    await _run_in_thread(lambda: stack.enter_context(Aria2WatchdogLifespan()))
+
+
+async def _ui_phase() -> None:
+    # NOTE: importing the server (NiceGUI pages, routers, ...) is slow,
+    # import it in a thread while waiting for the db and aria2c.
+    await _run_in_thread(lambda: importlib.import_module("aria2_server.app.server"))
+
+
+async def _startup(stack: ExitStack) -> StartupResult:
+    """Run the independent phases of startup concurrently in one event loop."""
+    durations: Dict[str, float] = {}
+    start = time.perf_counter()
+    server_config, _, _ = await asyncio.gather(
+        _timed("db", _db_phase(), durations),
+        _timed("aria2c", _aria2c_phase(stack), durations),
+        _timed("ui", _ui_phase(), durations),
+    )
+    durations["total"] = time.perf_counter() - start
+    # in a stable order, instead of the order of completion
+    phase_durations = {name: durations[name] for name in _STARTUP_PHASES}
+
+    logger.info(
+        "Startup phases: "
+        + ", ".join(
+            f"{name} {duration * 1000:.1f} ms"
+            for name, duration in phase_durations.items()
+        )
+    )
+    return StartupResult(server_config=server_config, phase_durations=phase_durations)
 
 
 @contextmanager
-def context() -> Generator[None, None, None]:
-    """Launch the all lifespans in the `lifespans` list."""
+def context() -> Generator[StartupResult, None, None]:
+    """Run the startup pipeline, then launch the all lifespans in the `lifespans` list.
+
+    The pipeline initializes the db, spawns aria2c and waits for it to be ready,
+    and imports `aria2_server.app.server`, concurrently;
+    aria2c is shutdown on exit.
+    """
     with ExitStack() as stack:
+        result = asyncio.run(_startup(stack))
         for lifespan in lifespans:
             stack.enter_context(lifespan())
-        yield
+        yield result
@@ -49,6 +49,7 @@ class _UvicornKwargs(TypedDict):
     ssl_certfile: Optional[Path]
     ssl_keyfile_password: Optional[str]
     root_path: str
+    ws_per_message_deflate: bool
 
 
 class RunWithKwargs(_BaseUiKwargs):
@@ -89,6 +90,7 @@ def _build_uvivorn_kwargs() -> _UvicornKwargs:
         ssl_certfile=ssl_certfile,
         ssl_keyfile_password=ssl_keyfile_password,
         root_path=root_path,
+        ws_per_message_deflate=GLOBAL_CONFIG.server.ws_per_message_deflate,
     )
 
     return uvicorn_kwargs
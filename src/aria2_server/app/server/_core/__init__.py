@@ -2,9 +2,9 @@
 # pyright: reportUntypedFunctionDecorator=false, reportUnknownMemberType=false
 
 from textwrap import dedent
-from typing import Optional, TypedDict
+from typing import Optional
 
-from fastapi import APIRouter, Depends, FastAPI, status
+from fastapi import Depends, FastAPI
 from nicegui import APIRouter as GuiRouter
 from nicegui import app as _app
 from nicegui import ui
@@ -18,13 +18,23 @@ from aria2_server._gui.components.q_form import (
     StyledLabel,
     SubmitButton,
 )
+from aria2_server.app._core import api as _api
+from aria2_server.app._core.aria2 import aria2_readiness_gate, aria2_state_store
 from aria2_server.app._core.auth import (
+    PasswordHasherBusyError,
     User,
-    UserRedirect,
+    auth,
+    password_hasher,
 )
+from aria2_server.app._core.metrics import metrics_registry
 from aria2_server.app._core.utils.dependencies import get_root_path
-from aria2_server.app.server._core import _api, _subapp
+from aria2_server.app.factory import (
+    add_compression_middleware,
+    build_aria2_components,
+)
+from aria2_server.app.server._core import _subapp
 from aria2_server.config import GLOBAL_CONFIG
+from aria2_server.db import async_session_maker
 
 
 class _SecureStyledForm(StyledForm):
@@ -36,34 +46,9 @@ _SecureStyledForm.req_secure_context_by_default = _api.auth.COOKIE_SECURE
 
 # auth dependency utils
 
-_REQUIRE_ACTIVE = True
-_REQUIRE_VERIFIED = True
-_REQUIRE_SUPERUSER = False
-
-
-class _UserRedirectKwarg(TypedDict):
-    redirect_url: str
-    use_root_path: bool
-    status_code: int
-    code: int
-    active: bool
-    verified: bool
-    superuser: bool
-
-
-_user_redirect_kwargs = _UserRedirectKwarg(
-    redirect_url="/account",
-    use_root_path=True,
-    status_code=status.HTTP_303_SEE_OTHER,
-    code=status.WS_1008_POLICY_VIOLATION,
-    active=_REQUIRE_ACTIVE,
-    verified=_REQUIRE_VERIFIED,
-    superuser=_REQUIRE_SUPERUSER,
-)
-
-_user_redirect = UserRedirect(optional=False, **_user_redirect_kwargs)
+_user_redirect = _api.create_user_redirect(auth, optional=False)
 """Will automatically raise an exception to redirect."""
-_opt_user_redirect = UserRedirect(optional=True, **_user_redirect_kwargs)
+_opt_user_redirect = _api.create_user_redirect(auth, optional=True)
 """Will not raise an exception to redirect, instead, return None."""
 
 
@@ -72,10 +57,37 @@ _opt_user_redirect = UserRedirect(optional=True, **_user_redirect_kwargs)
 _gui_router = GuiRouter()
 
 
+def _aria2_state_label() -> None:
+    """Show the global stat of aria2c, which is read from the shared state store."""
+    interval = GLOBAL_CONFIG.server.extra.aria2_state_polling.interval_second
+    if interval <= 0:
+        return
+
+    label = ui.label()
+
+    def refresh() -> None:
+        snapshot = aria2_state_store.latest
+        if snapshot is None:
+            label.set_text("aria2c state is not available yet")
+            return
+        stat = snapshot.global_stat
+        label.set_text(
+            f"Active: {stat.get('numActive')} | "
+            f"Waiting: {stat.get('numWaiting')} | "
+            f"Stopped: {stat.get('numStoppedTotal')} | "
+            f"Download: {stat.get('downloadSpeed')} B/s | "
+            f"Upload: {stat.get('uploadSpeed')} B/s"
+        )
+
+    refresh()
+    ui.timer(interval, refresh)
+
+
 @_gui_router.page("/", dependencies=[Depends(_user_redirect)])
 def index(root_path: Annotated[str, Depends(get_root_path)]):
     with ui.card().classes("absolute-center"):
         ui.markdown("## Welcome to Aria2 Server")
+        _aria2_state_label()
         ui.button("Enter AriaNg", on_click=lambda: ui.open(root_path + "/AriaNg"))
         ui.button("Account", on_click=lambda: ui.open(root_path + "/account"))
 
@@ -166,28 +178,58 @@ def account(
 
 ##### api router #####
 
-_api_router = APIRouter(prefix="/api", tags=["api"])
-
-
-# NOTE: aria2 proxy router must be protected by user auth,
-# because `AriaNgIframe` expose aria2c rpc-secret in `src` of <iframe>,
-# e.g <iframe src="...secret=...">
-_aria2_proxy_assembly = _api.aria2.build_aria2_proxy_on(
-    APIRouter(dependencies=[Depends(_user_redirect)])
+_aria2_components = build_aria2_components(
+    GLOBAL_CONFIG,
+    session_maker=async_session_maker,
+    registry=metrics_registry,
+    state_store=aria2_state_store,
 )
-_app.on_shutdown(_aria2_proxy_assembly.on_shutdown)
-_api_router.include_router(
-    _aria2_proxy_assembly.router, prefix="/aria2", tags=["aria2"]
+# NOTE: run them in the event loop of the server, which owns the db connections,
+# and where the readers of `aria2_state_store` wait for it.
+_app.on_startup(_aria2_components.start)
+_app.on_shutdown(_aria2_components.stop)
+
+_api_assembly = _api.build_api(
+    GLOBAL_CONFIG,
+    auth=auth,
+    user_redirect=_user_redirect,
+    registry=metrics_registry,
+    extra_aria2_router=_api.aria2_state.create_aria2_state_router(
+        aria2_state_store, GLOBAL_CONFIG.server.extra.aria2_state_polling
+    ),
+    # NOTE: aria2c is spawned and restarted by `Aria2WatchdogLifespan` of this server
+    readiness_gate=aria2_readiness_gate,
+    download_queue=_aria2_components.download_queue,
+    download_history=_aria2_components.download_history,
+    shard_router=_aria2_components.shard_router,
 )
-
-_api_router.include_router(_api.auth.auth_router, prefix="/auth", tags=["auth"])
-_api_router.include_router(_api.auth.users_router, prefix="/users", tags=["users"])
+_app.on_shutdown(_api_assembly.on_shutdown)
+# NOTE: closed after all users of the shard router above
+_app.on_shutdown(_aria2_components.aclose)
 
 
 ##### assembly #####
 
+
+_app.add_exception_handler(PasswordHasherBusyError, _api.password_hasher_busy_handler)  # pyright: ignore[reportArgumentType]
+
+# NOTE: must be added after NiceGUI's `GZipMiddleware`, so that it is the outer one.
+add_compression_middleware(
+    _app,
+    GLOBAL_CONFIG.server.extra.compression,
+    # NOTE: in-memory AriaNg has its own precompressed variants,
+    # which need the `Accept-Encoding` header.
+    path_prefixes=(
+        ("/api/aria2",)
+        if GLOBAL_CONFIG.server.extra.aria_ng_in_memory
+        else ("/api/aria2", "/static/AriaNg")
+    ),
+)
+
 _app.mount("/static/AriaNg", _subapp.aria_ng_app(FastAPI()), name="AriaNg-static")
-_app.include_router(_api_router)
+_app.on_startup(_subapp.load_aria_ng)
+_app.on_shutdown(password_hasher.shutdown)
+_api_assembly.include_in(_app)
 _app.include_router(_gui_router)
 
 
@@ -1,4 +0,0 @@
-from aria2_server.app.server._core._api import _aria2 as aria2
-from aria2_server.app.server._core._api import _auth as auth
-
-__all__ = ("aria2", "auth")
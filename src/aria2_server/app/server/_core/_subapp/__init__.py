@@ -1,3 +1,3 @@
-from aria2_server.app.server._core._subapp._aria_ng import aria_ng_app
+from aria2_server.app.server._core._subapp._aria_ng import aria_ng_app, load_aria_ng
 
-__all__ = ("aria_ng_app",)
+__all__ = ("aria_ng_app", "load_aria_ng")
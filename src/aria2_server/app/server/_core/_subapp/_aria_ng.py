@@ -3,18 +3,30 @@ from functools import partial
 from fastapi import FastAPI
 
 from aria2_server.app._core.static_files import (
+    InMemoryStaticFiles,
     StaticFiles,
     bind_static_files_to_app,
 )
+from aria2_server.config import GLOBAL_CONFIG
 from aria2_server.static import aria_ng_static_files
 
-__all__ = ("aria_ng_app",)
+__all__ = ("aria_ng_app", "load_aria_ng")
 
-_aria_ng_static_files_asgi = StaticFiles(directory=aria_ng_static_files, html=True)
+_aria_ng_static_files_asgi = (
+    InMemoryStaticFiles(directory=aria_ng_static_files, html=True)
+    if GLOBAL_CONFIG.server.extra.aria_ng_in_memory
+    else StaticFiles(directory=aria_ng_static_files, html=True)
+)
 
 aria_ng_app = partial(bind_static_files_to_app, _aria_ng_static_files_asgi)
 
 
+async def load_aria_ng() -> None:
+    """Load AriaNg into memory if `aria_ng_in_memory` is enabled, should be called on startup."""
+    if isinstance(_aria_ng_static_files_asgi, InMemoryStaticFiles):
+        await _aria_ng_static_files_asgi.load()
+
+
 if __name__ == "__main__":
     from nicegui import app, ui
 
@@ -2,14 +2,13 @@ import logging
 from pathlib import Path
 from typing import TYPE_CHECKING, Optional
 
-import tomli
 import typer
-from pydantic import ValidationError
 from typing_extensions import Annotated
 
 from aria2_server import logger
 
 # NOTE: had better NOT to import any `aria2_server` modules before calling `reload()` in `main()`
+# NOTE: import the heavy modules (e.g. `pydantic`) lazily, so that `--help` of the cli is fast.
 
 if TYPE_CHECKING:
     from aria2_server.config.schemas import Config
@@ -22,6 +21,9 @@ launch_cli = typer.Typer(invoke_without_command=True)
 
 
 def _load_config_from_file(file: str) -> "Config":
+    import tomli
+    from pydantic import ValidationError
+
     from aria2_server.config.schemas import Config
 
     try:
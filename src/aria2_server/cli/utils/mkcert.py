@@ -2,22 +2,24 @@ import datetime
 import ipaddress
 from pathlib import Path
 from textwrap import dedent
-from typing import List
+from typing import TYPE_CHECKING, List
 
 import typer
-from cryptography import x509
-from cryptography.hazmat.primitives import hashes, serialization
-from cryptography.hazmat.primitives.asymmetric import rsa
-from cryptography.x509.oid import NameOID
 from typing_extensions import Annotated
 
+# NOTE: import `cryptography` lazily, so that the cli is fast when not using `mkcert`.
+if TYPE_CHECKING:
+    from cryptography import x509
+
 __all__ = ("mkcert_cli",)
 
 
 mkcert_cli = typer.Typer(invoke_without_command=True)
 
 
-def _parse_san_type(san: str) -> x509.GeneralName:
+def _parse_san_type(san: str) -> "x509.GeneralName":
+    from cryptography import x509
+
     try:
         return x509.IPAddress(ipaddress.ip_address(san))
     except ValueError:
@@ -94,6 +96,11 @@ def mkcert(
     ] = "Aria2 Server",
 ):
     """Generate a self-signed certificate for https server."""
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.x509.oid import NameOID
+
     # Generate our key
     key = rsa.generate_private_key(
         public_exponent=65537,
@@ -22,6 +22,8 @@ def reload(
     Otherwise, it might fail to fully reload the new config.
 
     If you want to launch the app again, you should call this function.
+    If you only need the APIs (e.g. in tests), build them by
+    `aria2_server.app.factory.create_app(config)` instead, which needs no reloading.
 
     Args:
         config: The new config to be reloaded. If `None`, will reload the default config.
@@ -1,24 +1,55 @@
 import secrets
 from pathlib import Path
 from textwrap import dedent
-from typing import Optional
+from typing import List, Optional
 
 from nicegui.native import find_open_port
-from pydantic import AfterValidator, BaseModel, ConfigDict, Field, FilePath, SecretStr
+from pydantic import (
+    AfterValidator,
+    BaseModel,
+    ConfigDict,
+    Field,
+    FilePath,
+    SecretStr,
+    model_validator,
+)
 from typing_extensions import Annotated
 
 from aria2_server._types import (
+    AuthStrategyType,
     BoolStr,
     EndpointDocumentationType,
     IpvAnyHostType,
     LanguageType,
     SqliteDbPathType,
+    SqliteJournalModeType,
+    SqliteSynchronousType,
     TrueStr,
     UvicornLoggingLevelType,
 )
 from aria2_server.static import favicon
 
-__all__ = ("Aria2", "Config", "Server", "ServerExtra")
+__all__ = (
+    "Aria2",
+    "Aria2Federation",
+    "Aria2Proxy",
+    "Aria2Readiness",
+    "Aria2RemoteBackend",
+    "Aria2Shards",
+    "Aria2StatePolling",
+    "Aria2Supervisor",
+    "Aria2Upstream",
+    "Compression",
+    "Config",
+    "DownloadHistory",
+    "DownloadQueue",
+    "PasswordHashing",
+    "Server",
+    "ServerExtra",
+    "SessionCache",
+    "Sqlite",
+    "TokenGC",
+)
 
 
 _LOWEST_PORT = 1024
@@ -32,6 +63,45 @@ _DEFAULT_TITLE = "Aria2-Server"
 
 _DEFAULT_EXPIRATION_SECOND = 60 * 60 * 24 * 7  # 7 days
 _DEFAULT_DB_PATH: SqliteDbPathType = Path("aria2-server.db")
+_DEFAULT_RPC_CACHE_TTL_SECOND = 0
+_DEFAULT_BATCH_MAX_SIZE = 32
+_DEFAULT_POLLING_INTERVAL_SECOND = 0
+_DEFAULT_POLLING_MAX_DOWNLOADS = 1000
+_DEFAULT_SSE_INTERVAL_SECOND = 1
+# keep consistent with httpx defaults
+_DEFAULT_UPSTREAM_MAX_CONNECTIONS = 100
+_DEFAULT_UPSTREAM_MAX_KEEPALIVE_CONNECTIONS = 20
+_DEFAULT_UPSTREAM_KEEPALIVE_EXPIRY_SECOND = 5
+_DEFAULT_UPSTREAM_TIMEOUT_SECOND = 5
+_DEFAULT_COMPRESSION_MINIMUM_SIZE = 500
+_DEFAULT_GZIP_LEVEL = 6
+_DEFAULT_BROTLI_QUALITY = 4
+_DEFAULT_SESSION_CACHE_TTL_SECOND = 60
+_DEFAULT_SESSION_CACHE_MAX_ENTRIES = 1024
+_DEFAULT_PASSWORD_HASHING_MAX_WORKERS = 2
+_DEFAULT_PASSWORD_HASHING_MAX_QUEUE = 16
+_DEFAULT_TOKEN_GC_INTERVAL_SECOND = 60 * 60  # 1 hour
+_DEFAULT_TOKEN_GC_BATCH_SIZE = 1000
+# NOTE: the defaults are what aria2-server used before the profile was configurable,
+# i.e. sqlite's own defaults, and the default timeout of python's `sqlite3.connect`.
+_DEFAULT_SQLITE_BUSY_TIMEOUT_MS = 5000
+_DEFAULT_SQLITE_CACHE_SIZE_KIB = 2000
+_DEFAULT_SQLITE_MMAP_SIZE = 0
+_DEFAULT_SQLITE_POOL_SIZE = 5
+_DEFAULT_ARIA2_READY_TIMEOUT_SECOND = 10
+_DEFAULT_ARIA2_STARTUP_TIMEOUT_SECOND = 10
+_DEFAULT_ARIA2_READY_MAX_WAITING = 64
+_DEFAULT_ARIA2_RESTART_BACKOFF_INITIAL_SECOND = 0.5
+_DEFAULT_ARIA2_RESTART_BACKOFF_MAX_SECOND = 30
+_DEFAULT_ARIA2_MIN_UPTIME_SECOND = 10
+_DEFAULT_ARIA2_CRASH_LOOP_MAX_FAILURES = 5
+_DEFAULT_ARIA2_SHUTDOWN_TIMEOUT_SECOND = 5
+_DEFAULT_ARIA2_SHARDS_COUNT = 1
+_DEFAULT_ARIA2_SHARDS_MAX_GIDS = 100_000
+_DEFAULT_ARIA2_HEALTH_CHECK_INTERVAL_SECOND = 5
+_DEFAULT_DOWNLOAD_QUEUE_REFILL_INTERVAL_SECOND = 5
+_DEFAULT_DOWNLOAD_QUEUE_BATCH_SIZE = 100
+_DEFAULT_DOWNLOAD_HISTORY_BATCH_SIZE = 1000
 
 _UVICORN_HTTPS_DOCS_URL = "https://www.uvicorn.org/deployment/#running-with-https"
 _NICEGUI_RUN_DOCS_URL = "https://nicegui.io/documentation/run#ui_run"
@@ -124,6 +194,670 @@ class Aria2(_ConfigedBaseModel):
     ] = None
 
 
+class Aria2Proxy(_ConfigedBaseModel):
+    model_config = ConfigDict(
+        title="The config of aria2-server's reverse proxy for aria2c JSON-RPC",
+    )
+
+    ws_multiplex: Annotated[
+        bool,
+        Field(
+            description=dedent(
+                """\
+                If 'True', all WebSocket clients will share one upstream WebSocket connection to aria2c,
+                and aria2c notifications will be fanned out to all clients from this single connection.
+                Otherwise, each WebSocket client will open its own connection to aria2c."""
+            ),
+        ),
+    ] = False
+    rpc_cache_ttl_second: Annotated[
+        float,
+        Field(
+            ge=0,
+            description=dedent(
+                """\
+                The seconds for which an answered call of read-only aria2c methods (e.g. 'aria2.tellActive') will be reused.
+                e.g. '0.5', answers may be stale for up to this long.
+                Identical calls in flight are always merged into one. Write methods (e.g. 'aria2.addUri') invalidate the cache,
+                including those in a 'system.multicall' or a batch request.
+                If '0' (the default), disable the cache.
+                NOTE: WebSocket calls are only cached when 'ws_multiplex' is 'True'."""
+            ),
+        ),
+    ] = _DEFAULT_RPC_CACHE_TTL_SECOND
+    batch_window_second: Annotated[
+        float,
+        Field(
+            ge=0,
+            description=dedent(
+                """\
+                If greater than '0', HTTP calls of read-only aria2c methods arriving within this window
+                will be sent to aria2c as one 'system.multicall' request, e.g. '0.002'.
+                Calls of other methods are never batched, because they must not be reordered.
+                If '0', disable batching."""
+            ),
+        ),
+    ] = 0
+    batch_max_size: Annotated[
+        int,
+        Field(
+            ge=1,
+            description="The max number of calls in one batch, a full batch will be sent immediately.",
+        ),
+    ] = _DEFAULT_BATCH_MAX_SIZE
+    asgi_fast_path: Annotated[
+        bool,
+        Field(
+            description=dedent(
+                """\
+                If 'True', 'POST /api/aria2/jsonrpc' will be served by a raw ASGI app instead of fastapi routing.
+                The session is checked with a short-lived cache, and the body is streamed to aria2c directly."""
+            ),
+        ),
+    ] = False
+
+
+class Aria2StatePolling(_ConfigedBaseModel):
+    model_config = ConfigDict(
+        title="The config of aria2-server's shared aria2c state poller",
+    )
+
+    interval_second: Annotated[
+        float,
+        Field(
+            ge=0,
+            description=dedent(
+                """\
+                aria2-server will poll the state of aria2c (global stat, active, waiting and stopped downloads)
+                once per this interval (e.g. '1'), and share the result with all viewers.
+                NOTE: it polls even if nobody is viewing, and each poll fetches up to 'max_waiting' + 'max_stopped' downloads.
+                If '0' (the default), disable the poller, the stats on the index page,
+                and the APIs served from it ('/api/aria2/delta' and '/api/aria2/events')."""
+            ),
+        ),
+    ] = _DEFAULT_POLLING_INTERVAL_SECOND
+    max_waiting: Annotated[
+        int,
+        Field(
+            ge=0,
+            description=dedent(
+                """\
+                The max number of waiting downloads to poll.
+                If aria2c has more, the snapshot (e.g. '/api/aria2/delta') is marked as 'truncated'."""
+            ),
+        ),
+    ] = _DEFAULT_POLLING_MAX_DOWNLOADS
+    max_stopped: Annotated[
+        int,
+        Field(
+            ge=0,
+            description=dedent(
+                """\
+                The max number of stopped downloads to poll.
+                If aria2c has more, the snapshot (e.g. '/api/aria2/delta') is marked as 'truncated'."""
+            ),
+        ),
+    ] = _DEFAULT_POLLING_MAX_DOWNLOADS
+    sse_interval_second: Annotated[
+        float,
+        Field(
+            gt=0,
+            description=dedent(
+                """\
+                The min seconds between two events of the live stats Server-Sent Events stream.
+                Slow consumers will only receive the newest event."""
+            ),
+        ),
+    ] = _DEFAULT_SSE_INTERVAL_SECOND
+
+
+class Aria2Upstream(_ConfigedBaseModel):
+    model_config = ConfigDict(
+        title=dedent(
+            """\
+            The config of the connection pool from aria2-server to aria2c.
+            Each of the proxy and the state poller has its own pool."""
+        ),
+    )
+
+    max_connections: Annotated[
+        int,
+        Field(ge=1, description="The max number of concurrent connections to aria2c."),
+    ] = _DEFAULT_UPSTREAM_MAX_CONNECTIONS
+    max_keepalive_connections: Annotated[
+        int,
+        Field(
+            ge=0,
+            description="The max number of idle connections to aria2c kept alive for reuse.",
+        ),
+    ] = _DEFAULT_UPSTREAM_MAX_KEEPALIVE_CONNECTIONS
+    keepalive_expiry_second: Annotated[
+        float,
+        Field(
+            ge=0,
+            description="The seconds after which an idle connection will be closed.",
+        ),
+    ] = _DEFAULT_UPSTREAM_KEEPALIVE_EXPIRY_SECOND
+    connect_timeout_second: Annotated[
+        float,
+        Field(gt=0, description="The timeout of connecting to aria2c."),
+    ] = _DEFAULT_UPSTREAM_TIMEOUT_SECOND
+    read_timeout_second: Annotated[
+        float,
+        Field(
+            gt=0, description="The timeout of reading a chunk of response from aria2c."
+        ),
+    ] = _DEFAULT_UPSTREAM_TIMEOUT_SECOND
+    pool_timeout_second: Annotated[
+        float,
+        Field(
+            gt=0,
+            description=dedent(
+                """\
+                The timeout of waiting for a free connection in the pool.
+                If exceeded, the request is rejected, and counted in the 'rejected' pool metric."""
+            ),
+        ),
+    ] = _DEFAULT_UPSTREAM_TIMEOUT_SECOND
+
+
+class Aria2Readiness(_ConfigedBaseModel):
+    model_config = ConfigDict(
+        title=dedent(
+            """\
+            The config of waiting for aria2c to be ready, i.e. to answer 'aria2.getVersion'.
+            aria2c is probed after it is spawned on startup, and after each restart."""
+        ),
+    )
+
+    timeout_second: Annotated[
+        float,
+        Field(
+            gt=0,
+            description=dedent(
+                """\
+                The max seconds a proxy request is held while aria2c is not ready (e.g. restarting),
+                then it is responded with '503'."""
+            ),
+        ),
+    ] = _DEFAULT_ARIA2_READY_TIMEOUT_SECOND
+    startup_timeout_second: Annotated[
+        float,
+        Field(
+            gt=0,
+            description=dedent(
+                """\
+                The max seconds to wait for aria2c to be ready after it is spawned.
+                On startup, aria2-server fails if exceeded."""
+            ),
+        ),
+    ] = _DEFAULT_ARIA2_STARTUP_TIMEOUT_SECOND
+    max_waiting: Annotated[
+        int,
+        Field(
+            ge=0,
+            description=dedent(
+                """\
+                The max number of proxy requests held while aria2c is restarting.
+                If exceeded, the new requests are responded with '503' immediately."""
+            ),
+        ),
+    ] = _DEFAULT_ARIA2_READY_MAX_WAITING
+
+
+class Aria2Supervisor(_ConfigedBaseModel):
+    model_config = ConfigDict(
+        title=dedent(
+            """\
+            The config of restarting aria2c when it exits.
+            If aria2c exits sooner than 'min_uptime_second' after starting, it is a failed start;
+            aria2c is restarted immediately after a normal exit (e.g. 'aria2.shutdown' through the rpc interface),
+            and with exponential backoff after consecutive failed starts."""
+        ),
+    )
+
+    restart_backoff_initial_second: Annotated[
+        float,
+        Field(
+            gt=0,
+            description=dedent(
+                """\
+                The seconds to wait before restarting aria2c after the first failed start,
+                doubled after each consecutive failed start."""
+            ),
+        ),
+    ] = _DEFAULT_ARIA2_RESTART_BACKOFF_INITIAL_SECOND
+    restart_backoff_max_second: Annotated[
+        float,
+        Field(
+            gt=0,
+            description="The max seconds to wait before restarting aria2c.",
+        ),
+    ] = _DEFAULT_ARIA2_RESTART_BACKOFF_MAX_SECOND
+    min_uptime_second: Annotated[
+        float,
+        Field(
+            ge=0,
+            description=dedent(
+                """\
+                If aria2c exits sooner than it after starting, it is a failed start."""
+            ),
+        ),
+    ] = _DEFAULT_ARIA2_MIN_UPTIME_SECOND
+    crash_loop_max_failures: Annotated[
+        int,
+        Field(
+            ge=0,
+            description=dedent(
+                """\
+                Stop restarting aria2c after this many consecutive failed starts, i.e. a crash loop.
+                Set it to '0' to restart aria2c forever."""
+            ),
+        ),
+    ] = _DEFAULT_ARIA2_CRASH_LOOP_MAX_FAILURES
+    shutdown_timeout_second: Annotated[
+        float,
+        Field(
+            gt=0,
+            description=dedent(
+                """\
+                The max seconds to wait for aria2c to exit gracefully on shutdown,
+                then it will be killed."""
+            ),
+        ),
+    ] = _DEFAULT_ARIA2_SHUTDOWN_TIMEOUT_SECOND
+
+
+class Aria2Shards(_ConfigedBaseModel):
+    model_config = ConfigDict(
+        title=dedent(
+            """\
+            The config of running several aria2c instances behind one proxy.
+            The instance 'i' listens on 'aria2.rpc-listen-port + i', with the same 'aria2.rpc-secret' and 'aria2.conf-path',
+            so do not set per-instance options (e.g. 'save-session') in 'aria2.conf'.
+            The aria2 proxy presents all instances as one aria2c:
+            calls about a GID are routed to the instance which owns it,
+            new downloads are placed on the least loaded instance,
+            and the results of 'aria2.tellActive', 'aria2.tellWaiting', 'aria2.tellStopped' and 'aria2.getGlobalStat' are merged."""
+        ),
+    )
+
+    count: Annotated[
+        int,
+        Field(
+            ge=1,
+            description="The number of aria2c instances, '1' means no sharding.",
+        ),
+    ] = _DEFAULT_ARIA2_SHARDS_COUNT
+    download_dirs: Annotated[
+        List[Path],
+        Field(
+            description=dedent(
+                """\
+                The download dir ('--dir') of each instance, e.g. one dir per disk.
+                If not empty, it must have 'count' items; if empty, 'dir' of 'aria2.conf' is used by all instances."""
+            ),
+        ),
+    ] = []
+    max_gids: Annotated[
+        int,
+        Field(
+            gt=0,
+            description=dedent(
+                """\
+                The max number of GIDs remembered by the proxy to route calls to their instances.
+                The least recently used GIDs are forgotten, and looked up on all instances when used again."""
+            ),
+        ),
+    ] = _DEFAULT_ARIA2_SHARDS_MAX_GIDS
+
+    @model_validator(mode="after")
+    def _check_download_dirs(self) -> "Aria2Shards":
+        if self.download_dirs and len(self.download_dirs) != self.count:
+            raise ValueError("download_dirs must be empty or have 'count' items")
+        return self
+
+
+class Aria2RemoteBackend(_ConfigedBaseModel):
+    model_config = ConfigDict(
+        title="A remote aria2c JSON-RPC server, which is not launched by aria2-server",
+    )
+
+    host: Annotated[
+        str,
+        Field(
+            min_length=1,
+            description="The host of the aria2c JSON-RPC server, e.g. '192.168.1.2' or 'nas.local'.",
+        ),
+    ]
+    port: Annotated[
+        int,
+        Field(
+            ge=1,
+            le=_HIGHEST_PORT,
+            description="The port of the aria2c JSON-RPC server, i.e. its 'rpc-listen-port'.",
+        ),
+    ] = 6800
+    secret: Annotated[
+        Optional[SecretStr],
+        Field(description="The 'rpc-secret' of the aria2c JSON-RPC server."),
+    ] = None
+    secure: Annotated[
+        bool,
+        Field(
+            description="If 'True', connect to the aria2c JSON-RPC server by https and wss, i.e. its 'rpc-secure'.",
+        ),
+    ] = False
+    verify_tls: Annotated[
+        bool,
+        Field(
+            description=dedent(
+                """\
+                Whether to verify the TLS certificate of the aria2c JSON-RPC server.
+                Set it to 'False' for a self-signed certificate."""
+            ),
+        ),
+    ] = True
+
+
+class Aria2Federation(_ConfigedBaseModel):
+    model_config = ConfigDict(
+        title=dedent(
+            """\
+            The config of driving remote aria2c JSON-RPC servers (e.g. download nodes) through aria2-server.
+            The aria2 proxy presents them together with the aria2c launched by aria2-server as one aria2c,
+            see 'aria2_shards' for how the calls are routed.
+            Clients still use 'aria2.rpc-secret', which is replaced by the 'secret' of each backend."""
+        ),
+    )
+
+    backends: Annotated[
+        List[Aria2RemoteBackend],
+        Field(description="The remote aria2c JSON-RPC servers."),
+    ] = []
+    health_check_interval_second: Annotated[
+        float,
+        Field(
+            gt=0,
+            description=dedent(
+                """\
+                The interval of checking each backend by 'aria2.getVersion'.
+                An unhealthy backend (e.g. failed to connect) is skipped by placing new downloads and merging results,
+                until it passes the check again."""
+            ),
+        ),
+    ] = _DEFAULT_ARIA2_HEALTH_CHECK_INTERVAL_SECOND
+
+
+class DownloadQueue(_ConfigedBaseModel):
+    model_config = ConfigDict(
+        title=dedent(
+            """\
+            The config of aria2-server's download queue, which is persisted in the sqlite db.
+            Downloads enqueued by 'POST /api/aria2/queue' are added to aria2c in the order of priority,
+            only as many as aria2c can run, i.e. its 'max-concurrent-downloads',
+            so the waiting queue of aria2c stays small no matter how many downloads are enqueued."""
+        ),
+    )
+
+    enabled: Annotated[
+        bool,
+        Field(description="If 'True', enable the download queue and its APIs."),
+    ] = False
+    refill_interval_second: Annotated[
+        float,
+        Field(
+            gt=0,
+            description=dedent(
+                """\
+                aria2c is refilled when a download stops (i.e. on 'aria2.onDownloadComplete' and the like),
+                and at least once per this seconds, in case a notification is missed."""
+            ),
+        ),
+    ] = _DEFAULT_DOWNLOAD_QUEUE_REFILL_INTERVAL_SECOND
+    batch_size: Annotated[
+        int,
+        Field(
+            gt=0,
+            description="The max number of downloads added to aria2c in one refill.",
+        ),
+    ] = _DEFAULT_DOWNLOAD_QUEUE_BATCH_SIZE
+
+
+class DownloadHistory(_ConfigedBaseModel):
+    model_config = ConfigDict(
+        title=dedent(
+            """\
+            The config of the background job which archives the completed and errored downloads of aria2c
+            into the sqlite db, and then purges them from aria2c (i.e. 'aria2.removeDownloadResult'),
+            so the memory of aria2c stays flat. The archive is served by 'GET /api/aria2/history'."""
+        ),
+    )
+
+    interval_second: Annotated[
+        float,
+        Field(
+            ge=0,
+            description=dedent(
+                """\
+                The seconds between two runs of the job, e.g. '60'.
+                If '0', disable the job and the API.
+                NOTE: once enabled, the archived downloads are no longer listed by 'aria2.tellStopped', e.g. in AriaNg."""
+            ),
+        ),
+    ] = 0
+    batch_size: Annotated[
+        int,
+        Field(
+            gt=0,
+            description=dedent(
+                """\
+                The max number of downloads archived in one transaction,
+                so that the db is never locked for long."""
+            ),
+        ),
+    ] = _DEFAULT_DOWNLOAD_HISTORY_BATCH_SIZE
+
+
+class Compression(_ConfigedBaseModel):
+    model_config = ConfigDict(
+        title=dedent(
+            """\
+            The config of the response compression of the aria2 proxy APIs and AriaNg static files.
+            Brotli is preferred if the client accepts it and the optional 'brotli' package is installed,
+            otherwise gzip is used."""
+        ),
+    )
+
+    enabled: Annotated[
+        bool,
+        Field(
+            description=dedent(
+                """\
+                If 'False', these responses are compressed by NiceGUI's default gzip middleware,
+                which can not be configured and buffers streaming responses."""
+            )
+        ),
+    ] = True
+    minimum_size: Annotated[
+        int,
+        Field(
+            ge=0,
+            description="Responses smaller than this number of bytes will not be compressed.",
+        ),
+    ] = _DEFAULT_COMPRESSION_MINIMUM_SIZE
+    gzip_level: Annotated[
+        int,
+        Field(
+            ge=1, le=9, description="The gzip compression level, '9' is the smallest."
+        ),
+    ] = _DEFAULT_GZIP_LEVEL
+    brotli_quality: Annotated[
+        int,
+        Field(
+            ge=0,
+            le=11,
+            description="The brotli compression quality, '11' is the smallest.",
+        ),
+    ] = _DEFAULT_BROTLI_QUALITY
+
+
+class SessionCache(_ConfigedBaseModel):
+    model_config = ConfigDict(
+        title=dedent(
+            """\
+            The config of the in-memory cache of authenticated sessions (token -> user).
+            Entries are invalidated on logout, user update and token expiry."""
+        ),
+    )
+
+    ttl_second: Annotated[
+        float,
+        Field(
+            ge=0,
+            description=dedent(
+                """\
+                The max seconds a session is cached without checking the database.
+                If '0', disable the cache."""
+            ),
+        ),
+    ] = _DEFAULT_SESSION_CACHE_TTL_SECOND
+    max_entries: Annotated[
+        int,
+        Field(
+            ge=0,
+            description="The max number of cached sessions, the least recently used ones are evicted.",
+        ),
+    ] = _DEFAULT_SESSION_CACHE_MAX_ENTRIES
+
+
+class PasswordHashing(_ConfigedBaseModel):
+    model_config = ConfigDict(
+        title=dedent(
+            """\
+            The config of the worker pool which hashes and verifies passwords (e.g. on login),
+            so that they never block the event loop."""
+        ),
+    )
+
+    max_workers: Annotated[
+        int,
+        Field(
+            gt=0,
+            description="The max number of passwords hashed or verified concurrently.",
+        ),
+    ] = _DEFAULT_PASSWORD_HASHING_MAX_WORKERS
+    max_queue: Annotated[
+        int,
+        Field(
+            ge=0,
+            description=dedent(
+                """\
+                The max number of passwords waiting for a free worker.
+                Beyond it, the request is rejected with '503 Service Unavailable'."""
+            ),
+        ),
+    ] = _DEFAULT_PASSWORD_HASHING_MAX_QUEUE
+
+
+class TokenGC(_ConfigedBaseModel):
+    model_config = ConfigDict(
+        title=dedent(
+            """\
+            The config of the background job which deletes expired auth tokens from the sqlite db,
+            i.e. the access tokens older than 'expiration_second' and the expired revoked tokens."""
+        ),
+    )
+
+    interval_second: Annotated[
+        float,
+        Field(
+            ge=0,
+            description=dedent(
+                """\
+                The seconds between two runs of the job.
+                If '0', disable the job."""
+            ),
+        ),
+    ] = _DEFAULT_TOKEN_GC_INTERVAL_SECOND
+    batch_size: Annotated[
+        int,
+        Field(
+            gt=0,
+            description=dedent(
+                """\
+                The max number of tokens deleted in one transaction,
+                so that the db is never locked for long."""
+            ),
+        ),
+    ] = _DEFAULT_TOKEN_GC_BATCH_SIZE
+
+
+class Sqlite(_ConfigedBaseModel):
+    model_config = ConfigDict(
+        title=dedent(
+            """\
+            The performance profile of aria2-server's sqlite db, applied on every new connection.
+            See <https://www.sqlite.org/pragma.html> for the details of each pragma.
+            Ignored (except 'busy_timeout_ms' and 'cache_size_kib') for the in-memory db.
+            The defaults are sqlite's own (rollback journal, fsync on every commit).
+            For more concurrent logins, opt in to e.g. "journal_mode = 'wal'", "synchronous = 'normal'",
+            "cache_size_kib = 16384" and "mmap_size = 268435456";
+            NOTE: with "synchronous = 'normal'", a power loss or OS crash may roll back the last commits,
+            and 'mmap_size' maps up to that many bytes of the db file into the memory of the process."""
+        ),
+    )
+
+    journal_mode: Annotated[
+        SqliteJournalModeType,
+        Field(
+            description=dedent(
+                """\
+                'PRAGMA journal_mode'.
+                'wal' lets readers run concurrently with the writer."""
+            ),
+        ),
+    ] = "delete"
+    synchronous: Annotated[
+        SqliteSynchronousType,
+        Field(
+            description=dedent(
+                """\
+                'PRAGMA synchronous'.
+                'normal' is faster in 'wal' mode, but not durable: a power loss may roll back the last commits."""
+            ),
+        ),
+    ] = "full"
+    busy_timeout_ms: Annotated[
+        int,
+        Field(
+            ge=0,
+            description="'PRAGMA busy_timeout', the milliseconds to wait for a lock instead of failing with 'database is locked'.",
+        ),
+    ] = _DEFAULT_SQLITE_BUSY_TIMEOUT_MS
+    cache_size_kib: Annotated[
+        int,
+        Field(
+            gt=0,
+            description="'PRAGMA cache_size', the KiB of page cache of each connection.",
+        ),
+    ] = _DEFAULT_SQLITE_CACHE_SIZE_KIB
+    mmap_size: Annotated[
+        int,
+        Field(
+            ge=0,
+            description="'PRAGMA mmap_size', the max bytes of the db file to memory-map. If '0', disable it.",
+        ),
+    ] = _DEFAULT_SQLITE_MMAP_SIZE
+    pool_size: Annotated[
+        int,
+        Field(
+            gt=0,
+            description="The number of connections kept in the connection pool.",
+        ),
+    ] = _DEFAULT_SQLITE_POOL_SIZE
+
+
 class ServerExtra(_ConfigedBaseModel):
     model_config = ConfigDict(
         title="The extra server config for aria2-server",
@@ -135,6 +869,7 @@ class ServerExtra(_ConfigedBaseModel):
             description="The path of aria2-server's sqlite db file. If ':memory:', will create a in-memory db.",
         ),
     ] = _DEFAULT_DB_PATH
+    sqlite: Sqlite = Sqlite()
     expiration_second: Annotated[
         int,
         Field(
@@ -142,6 +877,43 @@ class ServerExtra(_ConfigedBaseModel):
             description="The expiration seconds of the token of aria2-server's user auth.",
         ),
     ] = _DEFAULT_EXPIRATION_SECOND
+    auth_strategy: Annotated[
+        AuthStrategyType,
+        Field(
+            description=dedent(
+                """\
+                How the session cookie of aria2-server's user auth is issued and verified.
+                'database': a random token stored in the sqlite db, verified by a db query.
+                'jwt': a signed JWT, verified in CPU; logout revokes the token by an in-memory deny-list persisted in the db.
+                NOTE: switching the strategy will log out all users."""
+            ),
+        ),
+    ] = "database"
+    session_cache: SessionCache = SessionCache()
+    password_hashing: PasswordHashing = PasswordHashing()
+    token_gc: TokenGC = TokenGC()
+    aria2_proxy: Aria2Proxy = Aria2Proxy()
+    aria2_state_polling: Aria2StatePolling = Aria2StatePolling()
+    aria2_upstream: Aria2Upstream = Aria2Upstream()
+    aria2_readiness: Aria2Readiness = Aria2Readiness()
+    aria2_supervisor: Aria2Supervisor = Aria2Supervisor()
+    aria2_shards: Aria2Shards = Aria2Shards()
+    aria2_federation: Aria2Federation = Aria2Federation()
+    download_queue: DownloadQueue = DownloadQueue()
+    download_history: DownloadHistory = DownloadHistory()
+    compression: Compression = Compression()
+    aria_ng_in_memory: Annotated[
+        bool,
+        Field(
+            description=dedent(
+                """\
+                If 'True', load the AriaNg static files into memory on startup,
+                with precomputed gzip/brotli variants and strong ETags,
+                and let browsers cache the hashed files (e.g. 'aria-ng-f1dd57abb9.min.js') as immutable.
+                Otherwise, serve them from disk on every request."""
+            )
+        ),
+    ] = False
 
 
 class Server(_ConfigedBaseModel):
@@ -255,6 +1027,17 @@ class Server(_ConfigedBaseModel):
         ),
         AfterValidator(_check_root_path),
     ] = ""
+    ws_per_message_deflate: Annotated[
+        bool,
+        Field(
+            description=dedent(
+                """\
+                Whether to negotiate the permessage-deflate extension with WebSocket clients,
+                e.g. the AriaNg WebSocket connection through the aria2 proxy.
+                See <https://www.uvicorn.org/settings/#implementation>"""
+            )
+        ),
+    ] = True
 
     # extra config for aria2-server
     extra: ServerExtra = ServerExtra()
@@ -1,13 +1,17 @@
 from aria2_server.db._core import (
     DATABASE_URL,
+    Database,
     async_session_maker,
+    database,
     engine,
     get_async_session,
 )
 
 __all__ = (
     "DATABASE_URL",
+    "Database",
     "async_session_maker",
+    "database",
     "engine",
     "get_async_session",
 )
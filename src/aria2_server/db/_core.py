@@ -1,37 +1,114 @@
 from pathlib import Path
-from typing import AsyncGenerator
+from typing import Any, AsyncGenerator, Dict
 
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 from typing_extensions import assert_never
 
+from aria2_server._types import SqliteDbPathType
 from aria2_server.config import GLOBAL_CONFIG
+from aria2_server.config.schemas import ServerExtra, Sqlite
 
 __all__ = (
     "DATABASE_URL",
     "AsyncSession",
+    "Database",
     "async_session_maker",
+    "create_sqlite_engine",
+    "database",
     "engine",
     "get_async_session",
+    "get_database_url",
 )
 
 
 _sqlite_url_prefix = "sqlite+aiosqlite:///"
 
 
-# TODO: Don't unpack `GLOBAL_CONFIG` outside of a function
-_sqlite_db_path = GLOBAL_CONFIG.server.extra.sqlite_db
+def get_database_url(sqlite_db: SqliteDbPathType) -> str:
+    """Return the url of `sqlite_db`, and create its parent directory if needed."""
+    if isinstance(sqlite_db, Path):
+        sqlite_db.parent.mkdir(parents=True, exist_ok=True)
+        return _sqlite_url_prefix + sqlite_db.as_posix()
+    elif sqlite_db == ":memory:":
+        return _sqlite_url_prefix + sqlite_db
+    else:
+        assert_never(sqlite_db)
+
+
+def create_sqlite_engine(
+    database_url: str, sqlite: Sqlite, *, in_memory: bool
+) -> AsyncEngine:
+    """Create an engine whose connections are configured by the `sqlite` profile."""
+    engine_kwargs: Dict[str, Any] = {}
+    pragmas = [
+        f"PRAGMA busy_timeout = {sqlite.busy_timeout_ms}",
+        # negative means KiB, instead of pages
+        f"PRAGMA cache_size = -{sqlite.cache_size_kib}",
+    ]
+    # NOTE: the in-memory db is a single shared connection (`StaticPool`),
+    # it has no journal file to tune, and does not accept `pool_size`.
+    if not in_memory:
+        engine_kwargs["pool_size"] = sqlite.pool_size
+        pragmas += [
+            f"PRAGMA journal_mode = {sqlite.journal_mode}",
+            f"PRAGMA synchronous = {sqlite.synchronous}",
+            f"PRAGMA mmap_size = {sqlite.mmap_size}",
+        ]
+
+    engine = create_async_engine(
+        database_url, connect_args={"check_same_thread": False}, **engine_kwargs
+    )
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _apply_pragmas(dbapi_connection: Any, _connection_record: Any) -> None:  # pyright: ignore[reportUnusedFunction]
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+    return engine
 
-if isinstance(_sqlite_db_path, Path):
-    _sqlite_db_path.parent.mkdir(parents=True, exist_ok=True)
-    DATABASE_URL = _sqlite_url_prefix + _sqlite_db_path.as_posix()
-elif _sqlite_db_path == ":memory:":
-    DATABASE_URL = _sqlite_url_prefix + _sqlite_db_path  # pyright: ignore[reportConstantRedefinition]
-else:
-    assert_never(_sqlite_db_path)
 
+class Database:
+    """An engine to the sqlite db, and the session maker bound to it."""
 
-engine = create_async_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    def __init__(self, url: str, engine: AsyncEngine) -> None:
+        self.url = url
+        self.engine = engine
+        self.session_maker = async_sessionmaker(engine, expire_on_commit=False)
+
+    @classmethod
+    def from_config(cls, extra: ServerExtra) -> "Database":
+        url = get_database_url(extra.sqlite_db)
+        return cls(
+            url,
+            create_sqlite_engine(
+                url, extra.sqlite, in_memory=extra.sqlite_db == ":memory:"
+            ),
+        )
+
+    async def get_session(self) -> AsyncGenerator[AsyncSession, None]:
+        async with self.session_maker() as session:
+            yield session
+
+    async def dispose(self) -> None:
+        await self.engine.dispose()
+
+
+# TODO: Don't unpack `GLOBAL_CONFIG` outside of a function
+database = Database.from_config(GLOBAL_CONFIG.server.extra)
+"""The db of the app launched by `aria2_server.app.main`."""
+DATABASE_URL = database.url
+engine = database.engine
+async_session_maker = database.session_maker
 
 
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
@@ -1,18 +1,49 @@
+from datetime import datetime
 from typing import AsyncGenerator
 
 from fastapi import Depends
 from fastapi_users_db_sqlalchemy.access_token import (
     SQLAlchemyAccessTokenDatabase,
 )
+from sqlalchemy import delete, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from aria2_server.db._core import get_async_session
 from aria2_server.db.access_token.models import AccessToken
 
-__all__ = ("SQLAlchemyAccessTokenDatabase", "get_access_token_db")
+__all__ = (
+    "SQLAlchemyAccessTokenDatabase",
+    "delete_expired_access_tokens",
+    "get_access_token_db",
+)
 
 
 async def get_access_token_db(
     session: AsyncSession = Depends(get_async_session),
 ) -> AsyncGenerator[SQLAlchemyAccessTokenDatabase[AccessToken], None]:
     yield SQLAlchemyAccessTokenDatabase(session, AccessToken)
+
+
+async def delete_expired_access_tokens(
+    session: AsyncSession, max_age: datetime, *, limit: int
+) -> int:
+    """Delete at most `limit` access tokens created before `max_age` in one transaction.
+
+    Returns:
+        The number of deleted tokens, if it's less than `limit`, there are no more expired tokens.
+    """
+    # NOTE: sqlite doesn't support `DELETE ... LIMIT` by default,
+    # so select the primary keys of a batch first, which uses the index of `created_at`.
+    expired_tokens = (
+        select(AccessToken.token)
+        .where(AccessToken.created_at < max_age)
+        .limit(limit)
+        .scalar_subquery()
+    )
+    result = await session.execute(
+        delete(AccessToken)
+        .where(AccessToken.token.in_(expired_tokens))
+        .execution_options(synchronize_session=False)
+    )
+    await session.commit()
+    return result.rowcount  # pyright: ignore[reportAttributeAccessIssue]
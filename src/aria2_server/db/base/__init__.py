@@ -7,6 +7,9 @@ import fastapi_users.db
 
 # Just import all the models here to initialize them
 import aria2_server.db.access_token.models
+import aria2_server.db.download_history.models
+import aria2_server.db.download_queue.models
+import aria2_server.db.revoked_token.models
 import aria2_server.db.server_config.models
 import aria2_server.db.user.models
 from aria2_server.db.base._models import Base
@@ -0,0 +1,74 @@
+from datetime import datetime
+from typing import Any, AsyncGenerator, Dict, Optional, Sequence, Type
+
+from fastapi import Depends
+from sqlalchemy import insert, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from aria2_server.db._core import get_async_session
+from aria2_server.db.download_history.models import ArchivedDownload
+
+__all__ = ("DownloadHistoryDatabase", "get_download_history_db")
+
+
+class DownloadHistoryDatabase:
+    def __init__(
+        self, session: AsyncSession, archived_download_table: Type[ArchivedDownload]
+    ) -> None:
+        self.session = session
+        self.archived_download_table = archived_download_table
+
+    async def add_many(self, rows: Sequence[Dict[str, Any]]) -> None:
+        """Insert the downloads in one transaction, the archived GIDs are skipped."""
+        if not rows:
+            return
+        await self.session.execute(
+            insert(self.archived_download_table).prefix_with("OR IGNORE"), rows
+        )
+        await self.session.commit()
+
+    async def get_page(
+        self,
+        *,
+        limit: int,
+        cursor: Optional[int] = None,
+        status: Optional[str] = None,
+        directory: Optional[str] = None,
+        completed_after: Optional[datetime] = None,
+        completed_before: Optional[datetime] = None,
+    ) -> Sequence[ArchivedDownload]:
+        """Return the newest downloads matching the filters.
+
+        Args:
+            cursor: The `id` of the last download of the previous page.
+            directory: Only return the downloads saved in this `dir`.
+        """
+        table = self.archived_download_table
+        statement = select(table)
+        if status is not None:
+            statement = statement.where(table.status == status)
+        if directory is not None:
+            statement = statement.where(table.dir == directory)
+        if completed_after is not None:
+            statement = statement.where(table.completed_at >= completed_after)
+        if completed_before is not None:
+            statement = statement.where(table.completed_at < completed_before)
+        if cursor is not None:
+            # NOTE: keyset pagination, so that a deep page is as fast as the first one,
+            # unlike `OFFSET`, which scans all the skipped rows.
+            last_completed_at = (
+                select(table.completed_at).where(table.id == cursor).scalar_subquery()
+            )
+            statement = statement.where(
+                tuple_(table.completed_at, table.id) < tuple_(last_completed_at, cursor)
+            )
+        results = await self.session.execute(
+            statement.order_by(table.completed_at.desc(), table.id.desc()).limit(limit)
+        )
+        return results.scalars().all()
+
+
+async def get_download_history_db(
+    session: AsyncSession = Depends(get_async_session),
+) -> AsyncGenerator[DownloadHistoryDatabase, None]:
+    yield DownloadHistoryDatabase(session, ArchivedDownload)
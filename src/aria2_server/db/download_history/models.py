@@ -0,0 +1,53 @@
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from fastapi_users_db_sqlalchemy.generics import TIMESTAMPAware
+from sqlalchemy import JSON, BigInteger, Index, Integer, String, Text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from aria2_server.db.base._models import Base
+
+__all__ = ("ArchivedDownload",)
+
+
+class ArchivedDownload(Base):
+    """The stopped downloads archived from aria2c, i.e. the download history."""
+
+    __tablename__ = "archiveddownload"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    gid: Mapped[str] = mapped_column(String(length=16), unique=True, nullable=False)
+    """The GID in aria2c, unique so that a download is never archived twice."""
+    status: Mapped[str] = mapped_column(String(length=8), nullable=False)
+    """`complete` or `error`"""
+    dir: Mapped[str] = mapped_column(Text, nullable=False)
+    name: Mapped[str] = mapped_column(Text, nullable=False)
+    """The name of the torrent, or the file name of the first file."""
+    total_length: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    completed_length: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    error_code: Mapped[Optional[str]] = mapped_column(String(length=8), nullable=True)
+    error_message: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    completed_at: Mapped[datetime] = mapped_column(
+        TIMESTAMPAware(timezone=True), index=True, nullable=False
+    )
+    """When it was archived, not when it stopped, which aria2c does not report.
+
+    It's usually within one archive interval of the real completion time.
+    """
+    info: Mapped[Dict[str, Any]] = mapped_column(JSON, nullable=False)
+    """The result of `aria2.tellStatus`, e.g. with `files` and `bittorrent`."""
+
+
+# NOTE: the history is read by `ORDER BY completed_at DESC, id DESC`,
+# optionally filtered by `status` or `dir`, so the filters are followed by `completed_at`.
+# (`id` is the rowid, which is always the last column of an index in sqlite)
+Index(
+    "ix_archiveddownload_status_completed_at",
+    ArchivedDownload.status,
+    ArchivedDownload.completed_at,
+)
+Index(
+    "ix_archiveddownload_dir_completed_at",
+    ArchivedDownload.dir,
+    ArchivedDownload.completed_at,
+)
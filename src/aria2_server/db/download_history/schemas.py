@@ -0,0 +1,29 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, ConfigDict
+
+__all__ = ("ArchivedDownloadPage", "ArchivedDownloadRead")
+
+
+class ArchivedDownloadRead(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    gid: str
+    status: str
+    dir: str
+    name: str
+    total_length: int
+    completed_length: int
+    error_code: Optional[str]
+    error_message: Optional[str]
+    completed_at: datetime
+    """When it was archived, not when it stopped, which aria2c does not report."""
+    info: Dict[str, Any]
+
+
+class ArchivedDownloadPage(BaseModel):
+    items: List[ArchivedDownloadRead]
+    next_cursor: Optional[int]
+    """Pass it as `cursor` to get the next page, `None` if there are no more."""
@@ -0,0 +1,67 @@
+from typing import Any, AsyncGenerator, List, Optional, Sequence, Type
+
+from fastapi import Depends
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from aria2_server.db._core import get_async_session
+from aria2_server.db.download_queue.models import QueuedDownload
+
+__all__ = ("DownloadQueueDatabase", "get_download_queue_db")
+
+
+class DownloadQueueDatabase:
+    def __init__(
+        self, session: AsyncSession, queued_download_table: Type[QueuedDownload]
+    ) -> None:
+        self.session = session
+        self.queued_download_table = queued_download_table
+
+    async def add(
+        self, method: str, params: List[Any], *, priority: int = 0
+    ) -> QueuedDownload:
+        queued_download = self.queued_download_table(
+            method=method, params=params, priority=priority
+        )
+        self.session.add(queued_download)
+        await self.session.commit()
+        await self.session.refresh(queued_download)
+        return queued_download
+
+    async def get(self, item_id: int) -> Optional[QueuedDownload]:
+        return await self.session.get(self.queued_download_table, item_id)
+
+    async def head(self, limit: int, offset: int = 0) -> Sequence[QueuedDownload]:
+        """Return the downloads in the order of being added to aria2c."""
+        table = self.queued_download_table
+        results = await self.session.execute(
+            select(table)
+            .order_by(table.priority.desc(), table.id)
+            .offset(offset)
+            .limit(limit)
+        )
+        return results.scalars().all()
+
+    async def count(self) -> int:
+        results = await self.session.execute(
+            select(func.count()).select_from(self.queued_download_table)
+        )
+        return results.scalar_one()
+
+    async def delete(self, ids: Sequence[int]) -> int:
+        """Return the number of deleted downloads."""
+        if not ids:
+            return 0
+        result = await self.session.execute(
+            delete(self.queued_download_table).where(
+                self.queued_download_table.id.in_(ids)
+            )
+        )
+        await self.session.commit()
+        return result.rowcount  # pyright: ignore[reportAttributeAccessIssue]
+
+
+async def get_download_queue_db(
+    session: AsyncSession = Depends(get_async_session),
+) -> AsyncGenerator[DownloadQueueDatabase, None]:
+    yield DownloadQueueDatabase(session, QueuedDownload)
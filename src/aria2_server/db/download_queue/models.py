@@ -0,0 +1,37 @@
+from datetime import datetime
+from typing import Any, List
+
+from fastapi_users_db_sqlalchemy.generics import TIMESTAMPAware, now_utc
+from sqlalchemy import JSON, Index, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from aria2_server.db.base._models import Base
+
+__all__ = ("QueuedDownload",)
+
+
+class QueuedDownload(Base):
+    """The downloads waiting in the queue of aria2-server, i.e. not added to aria2c yet."""
+
+    __tablename__ = "queueddownload"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    """Increasing, so the downloads with the same priority are in FIFO order."""
+    priority: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    """The higher, the earlier it's added to aria2c."""
+    method: Mapped[str] = mapped_column(String(length=32), nullable=False)
+    """e.g. `aria2.addUri`"""
+    params: Mapped[List[Any]] = mapped_column(JSON, nullable=False)
+    """The params of `method`, without the rpc-secret."""
+    created_at: Mapped[datetime] = mapped_column(
+        TIMESTAMPAware(timezone=True), nullable=False, default=now_utc
+    )
+
+
+# NOTE: the queue is popped by `ORDER BY priority DESC, id`,
+# the directions of the index must match it, so that sqlite never sorts the whole table.
+Index(
+    "ix_queueddownload_priority_id",
+    QueuedDownload.priority.desc(),
+    QueuedDownload.id,
+)
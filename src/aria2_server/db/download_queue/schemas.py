@@ -0,0 +1,32 @@
+from datetime import datetime
+from typing import Any, List, Literal
+
+from pydantic import BaseModel, ConfigDict, Field
+
+__all__ = ("QueuedDownloadCreate", "QueuedDownloadPage", "QueuedDownloadRead")
+
+
+class QueuedDownloadCreate(BaseModel):
+    method: Literal["aria2.addUri", "aria2.addTorrent", "aria2.addMetalink"]
+    params: List[Any] = Field(
+        description="The params of `method` without the rpc-secret, e.g. `[['http://example.com']]`."
+    )
+    priority: int = Field(
+        default=0, description="The higher, the earlier it's added to aria2c."
+    )
+
+
+class QueuedDownloadRead(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    method: str
+    params: List[Any]
+    priority: int
+    created_at: datetime
+
+
+class QueuedDownloadPage(BaseModel):
+    total: int
+    """The number of all queued downloads."""
+    items: List[QueuedDownloadRead]
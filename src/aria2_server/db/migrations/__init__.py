@@ -1,21 +1,31 @@
-from functools import partial
 from pathlib import Path
+from typing import TYPE_CHECKING, Optional
 
-from alembic import command, config
-from sqlalchemy import Connection
+from sqlalchemy import Connection, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncEngine
 
 from aria2_server.db._core import DATABASE_URL, engine
 from aria2_server.db.base import Base
 
+if TYPE_CHECKING:
+    from alembic import config
+
 __all__ = (
+    "HEAD_REVISION",
     "alembic_ini",
+    "get_current_revision",
     "get_default_cfg",
     "revision",
     "run_async_upgrade",
+    "run_async_upgrade_if_needed",
     "script_location",
     "upgrade",
 )
 
+# NOTE: alembic is imported lazily, because it takes hundreds of milliseconds,
+# and the db is already at head on almost every startup.
+
 _here = Path(__file__).parent
 
 alembic_ini = _here / "alembic.ini"
@@ -24,8 +34,18 @@ assert alembic_ini.exists()
 script_location = _here / "_alembic"
 assert script_location.exists()
 
+HEAD_REVISION = "88be41589968"
+"""The head revision in `script_location`.
+
+It's precomputed, so that checking whether the db is at head doesn't need alembic.
+
+NOTE: update it when adding a new revision, `tests/test_migrations.py` will check it.
+"""
+
+
+def get_default_cfg() -> "config.Config":
+    from alembic import config
 
-def get_default_cfg() -> config.Config:
     cfg = config.Config(alembic_ini)
     cfg.set_main_option("script_location", str(script_location))
     cfg.set_main_option("sqlalchemy.url", str(DATABASE_URL))
@@ -33,26 +53,65 @@ def get_default_cfg() -> config.Config:
     return cfg
 
 
-upgrade = partial(command.upgrade, config=get_default_cfg(), revision="head")
-"""Note: this function is designed to be used in cli."""
+def upgrade(revision: str = "head") -> None:
+    """Note: this function is designed to be used in cli."""
+    from alembic import command
+
+    command.upgrade(get_default_cfg(), revision)
+
 
-revision = partial(command.revision, config=get_default_cfg(), autogenerate=True)
-"""Note: this function is designed to be used in cli."""
+def revision(message: Optional[str] = None) -> None:
+    """Note: this function is designed to be used in cli."""
+    from alembic import command
 
+    command.revision(get_default_cfg(), message=message, autogenerate=True)
 
-async def run_async_upgrade() -> None:
+
+async def run_async_upgrade(bind: AsyncEngine = engine) -> None:
     """This function is designed to be used as a library api.
 
     The difference is that this function will not configure logging settings.
+
+    Args:
+        bind: The db to upgrade, defaults to the db of `GLOBAL_CONFIG`.
     """
+    from alembic import command
 
     # Refer: https://alembic.sqlalchemy.org/en/latest/cookbook.html#programmatic-api-use-connection-sharing-with-asyncio
-    def run_upgrade(connection: Connection, cfg: config.Config) -> None:
+    def run_upgrade(connection: Connection, cfg: "config.Config") -> None:
         cfg.attributes["connection"] = connection
         # NOTE: `no_logging_config` is a custom option used by `aria2-server`,
         # see `env.py` for more details.
         cfg.set_main_option("no_logging_config", "true")
         command.upgrade(cfg, "head")
 
-    async with engine.begin() as conn:
+    async with bind.begin() as conn:
         await conn.run_sync(run_upgrade, get_default_cfg())
+
+
+async def get_current_revision(bind: AsyncEngine = engine) -> Optional[str]:
+    """Return the revision of the db, or `None` if it's not stamped by alembic yet.
+
+    Unlike alembic, it runs one query without loading the config and the scripts.
+    """
+    async with bind.connect() as conn:
+        try:
+            result = await conn.execute(text("SELECT version_num FROM alembic_version"))
+        except OperationalError:
+            # no such table, i.e. a new db
+            return None
+        versions = result.scalars().all()
+    # NOTE: more than one row means multiple heads, let alembic handle it.
+    return versions[0] if len(versions) == 1 else None
+
+
+async def run_async_upgrade_if_needed(bind: AsyncEngine = engine) -> bool:
+    """Same as `run_async_upgrade`, but skip it if the db is already at `HEAD_REVISION`.
+
+    Returns:
+        Whether the upgrade was run.
+    """
+    if await get_current_revision(bind) == HEAD_REVISION:
+        return False
+    await run_async_upgrade(bind)
+    return True
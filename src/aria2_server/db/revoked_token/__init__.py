@@ -0,0 +1,41 @@
+from datetime import datetime
+from typing import Sequence, Type
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from aria2_server.db.revoked_token.models import RevokedToken
+
+__all__ = ("RevokedTokenDatabase",)
+
+
+class RevokedTokenDatabase:
+    def __init__(
+        self, session: AsyncSession, revoked_token_table: Type[RevokedToken]
+    ) -> None:
+        self.session = session
+        self.revoked_token_table = revoked_token_table
+
+    async def get_unexpired(self, now: datetime) -> Sequence[RevokedToken]:
+        results = await self.session.execute(
+            select(self.revoked_token_table).where(
+                self.revoked_token_table.expires_at > now
+            )
+        )
+        return results.scalars().all()
+
+    async def add(self, token_hash: str, expires_at: datetime) -> None:
+        await self.session.merge(
+            self.revoked_token_table(token_hash=token_hash, expires_at=expires_at)
+        )
+        await self.session.commit()
+
+    async def delete_expired(self, now: datetime) -> int:
+        """Return the number of deleted tokens."""
+        result = await self.session.execute(
+            delete(self.revoked_token_table).where(
+                self.revoked_token_table.expires_at <= now
+            )
+        )
+        await self.session.commit()
+        return result.rowcount  # pyright: ignore[reportAttributeAccessIssue]
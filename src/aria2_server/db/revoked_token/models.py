@@ -0,0 +1,22 @@
+from datetime import datetime
+
+from fastapi_users_db_sqlalchemy.generics import TIMESTAMPAware
+from sqlalchemy import String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from aria2_server.db.base._models import Base
+
+__all__ = ("RevokedToken",)
+
+
+class RevokedToken(Base):
+    """The signed session tokens which are revoked (i.e. logged out) before they expire."""
+
+    __tablename__ = "revokedtoken"
+
+    token_hash: Mapped[str] = mapped_column(String(length=64), primary_key=True)
+    """The hex digest of the token, not the token itself."""
+    expires_at: Mapped[datetime] = mapped_column(
+        TIMESTAMPAware(timezone=True), index=True, nullable=False
+    )
+    """After which the token is invalid anyway, so the row can be deleted."""
@@ -0,0 +1,167 @@
+"""A configurable stand-in of aria2c, served by `httpx.MockTransport`."""
+
+import itertools
+import json
+from typing import Any, Callable, Dict, List
+
+import httpx
+
+__all__ = ("FakeAria2c", "uris_of")
+
+
+_gids = itertools.count()
+
+
+def uris_of(downloads: List[Dict[str, Any]]) -> List[str]:
+    """The first URI of each download, e.g. to check which ones are added."""
+    return [download["files"][0]["uris"][0]["uri"] for download in downloads]
+
+
+class FakeAria2c:
+    """A stand-in of aria2c, which keeps its downloads in `active`, `waiting` and `stopped`.
+
+    - `aria2.addUri` starts a download if there are free slots
+        (i.e. `max_concurrent_downloads`), otherwise it waits; the URI `bad` is rejected.
+    - `aria2.tell*`, `aria2.getGlobalStat`, `aria2.getGlobalOption`, `aria2.getVersion`,
+        `aria2.pauseAll`, `aria2.removeDownloadResult`, `aria2.shutdown` (which only sets
+        `is_shut_down`) and `system.multicall` are supported.
+    - Every call except `system.*` must carry `token:{secret}`.
+
+    Examples:
+        ```py
+        fake = FakeAria2c("a", max_concurrent_downloads=2)
+        client = httpx.AsyncClient(transport=httpx.MockTransport(fake.handle))
+        ```
+    """
+
+    def __init__(
+        self,
+        name: str = "aria2c",
+        *,
+        secret: str = "secret",
+        max_concurrent_downloads: int = 5,
+    ) -> None:
+        self.name = name
+        self.secret = secret
+        self.max_concurrent_downloads = max_concurrent_downloads
+        self.active: List[Dict[str, Any]] = []
+        self.waiting: List[Dict[str, Any]] = []
+        self.stopped: List[Dict[str, Any]] = []
+        self.is_shut_down = False
+
+    def _find(self, gid: str) -> Dict[str, Any]:
+        for download in (*self.active, *self.waiting, *self.stopped):
+            if download["gid"] == gid:
+                return download
+        raise LookupError(f"GID {gid} is not found")
+
+    def complete(self, gid: str) -> None:
+        """Complete an active download, and start the first waiting one."""
+        download = self._find(gid)
+        self.active.remove(download)
+        self.stopped.append({**download, "status": "complete"})
+        if self.waiting:
+            self.active.append({**self.waiting.pop(0), "status": "active"})
+
+    def _add_uri(self, uris: List[str]) -> str:
+        if uris[0] == "bad":
+            raise LookupError("invalid URI")
+        gid = f"{self.name}-{next(_gids)}"
+        download = {"gid": gid, "files": [{"uris": [{"uri": uris[0]}]}]}
+        if len(self.active) < self.max_concurrent_downloads:
+            self.active.append({**download, "status": "active"})
+        else:
+            self.waiting.append({**download, "status": "waiting"})
+        return gid
+
+    def _tell_status(self, params: List[Any]) -> Dict[str, Any]:
+        return self._find(params[0])
+
+    def _tell_active(self, _params: List[Any]) -> List[Dict[str, Any]]:
+        return self.active
+
+    @staticmethod
+    def _slice(
+        downloads: List[Dict[str, Any]], params: List[Any]
+    ) -> List[Dict[str, Any]]:
+        offset, num = params[:2]
+        if offset < 0:
+            # counted from the last one, in reverse order
+            downloads, offset = downloads[::-1], -offset - 1
+        return downloads[offset : offset + num]
+
+    def _tell_waiting(self, params: List[Any]) -> List[Dict[str, Any]]:
+        return self._slice(self.waiting, params)
+
+    def _tell_stopped(self, params: List[Any]) -> List[Dict[str, Any]]:
+        return self._slice(self.stopped, params)
+
+    def _remove_download_result(self, params: List[Any]) -> str:
+        download = self._find(params[0])
+        if download not in self.stopped:
+            raise LookupError(f"Could not remove download result of GID#{params[0]}")
+        self.stopped.remove(download)
+        return "OK"
+
+    def _get_global_stat(self, _params: List[Any]) -> Dict[str, str]:
+        return {
+            "numActive": str(len(self.active)),
+            "numWaiting": str(len(self.waiting)),
+        }
+
+    def _get_global_option(self, _params: List[Any]) -> Dict[str, str]:
+        return {"max-concurrent-downloads": str(self.max_concurrent_downloads)}
+
+    def _get_version(self, _params: List[Any]) -> Dict[str, str]:
+        return {"version": self.name}
+
+    def _pause_all(self, _params: List[Any]) -> str:
+        return "OK"
+
+    def _shutdown(self, _params: List[Any]) -> str:
+        self.is_shut_down = True
+        return "OK"
+
+    def _multicall(self, calls: List[Dict[str, Any]]) -> List[Any]:
+        results: List[Any] = []
+        for call in calls:
+            try:
+                results.append([self._answer(call["methodName"], call["params"])])
+            except LookupError as e:
+                results.append({"code": 1, "message": str(e)})
+        return results
+
+    def _answer(self, method: str, params: List[Any]) -> Any:
+        if method == "system.multicall":
+            return self._multicall(params[0])
+        if not params or params[0] != f"token:{self.secret}":
+            raise LookupError("Unauthorized")
+
+        methods: Dict[str, Callable[[List[Any]], Any]] = {
+            "aria2.addUri": lambda params: self._add_uri(params[0]),
+            "aria2.tellStatus": self._tell_status,
+            "aria2.tellActive": self._tell_active,
+            "aria2.tellWaiting": self._tell_waiting,
+            "aria2.tellStopped": self._tell_stopped,
+            "aria2.removeDownloadResult": self._remove_download_result,
+            "aria2.getGlobalStat": self._get_global_stat,
+            "aria2.getGlobalOption": self._get_global_option,
+            "aria2.getVersion": self._get_version,
+            "aria2.pauseAll": self._pause_all,
+            "aria2.shutdown": self._shutdown,
+            "aria2.forceShutdown": self._shutdown,
+        }
+        if method not in methods:
+            raise LookupError(f"{method} is not supported")
+        return methods[method](params[1:])
+
+    def respond(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Answer a JSON-RPC request object, e.g. received from a WebSocket."""
+        try:
+            payload = {"result": self._answer(request["method"], request["params"])}
+        except LookupError as e:
+            payload = {"error": {"code": 1, "message": str(e)}}
+        return {"jsonrpc": "2.0", "id": request.get("id"), **payload}
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json=self.respond(json.loads(request.content)))
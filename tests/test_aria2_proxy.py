@@ -0,0 +1,163 @@
+import asyncio
+import json
+import uuid
+from typing import Any, Dict, List, Tuple
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from aria2_server.app._core.api import _aria2
+from aria2_server.app._core.auth import AUTH_COOKIE_NAME
+from aria2_server.app.factory import AppState, create_app
+from aria2_server.config import schemas
+from aria2_server.db.user import User
+from tests._fake_aria2c import FakeAria2c
+
+
+async def _login(app_state: AppState) -> str:
+    user = User(
+        id=uuid.uuid4(),
+        email="user@example.com",
+        hashed_password="",
+        is_active=True,
+        is_verified=True,
+    )
+    async with app_state.database.session_maker() as session:
+        session.add(user)
+        await session.commit()
+        return await app_state.auth.build_strategy(session).write_token(user)
+
+
+def _create_app(*, asgi_fast_path: bool, rpc_cache_ttl_second: float) -> FastAPI:
+    return create_app(
+        schemas.Config(
+            server=schemas.Server(
+                extra=schemas.ServerExtra(
+                    sqlite_db=":memory:",
+                    auth_strategy="jwt",
+                    aria2_proxy=schemas.Aria2Proxy(
+                        asgi_fast_path=asgi_fast_path,
+                        rpc_cache_ttl_second=rpc_cache_ttl_second,
+                    ),
+                ),
+            ),
+        )
+    )
+
+
+def _uses_fast_path(app: FastAPI) -> bool:
+    return any(
+        isinstance(getattr(route, "endpoint", None), _aria2._Aria2JsonRpcApp)  # pyright: ignore[reportPrivateUsage]
+        for route in app.routes
+    )
+
+
+def _rpc(id_: Any, method: str, *params: Any) -> Dict[str, Any]:
+    return {"jsonrpc": "2.0", "id": id_, "method": method, "params": list(params)}
+
+
+async def _exchange(app: FastAPI) -> List[Tuple[int, Any]]:
+    """Send the same calls to `app`, and return the `(status, body)` of each one."""
+    results: List[Tuple[int, Any]] = []
+    async with app.router.lifespan_context(app), httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app),  # pyright: ignore[reportArgumentType]
+        base_url="http://testserver",
+    ) as client:
+        # not logged in
+        response = await client.post(
+            "/api/aria2/jsonrpc", json=_rpc(1, "aria2.getVersion", "token:secret")
+        )
+        results.append((response.status_code, response.headers.get("Location")))
+
+        client.cookies.set(AUTH_COOKIE_NAME, await _login(app.state.aria2_server))
+        for request in (
+            _rpc(2, "aria2.getVersion", "token:secret"),
+            # answered by the cache, if it is enabled
+            _rpc(3, "aria2.getVersion", "token:secret"),
+            # a write call, which invalidates the cache
+            _rpc(4, "aria2.pauseAll", "token:secret"),
+            _rpc(5, "aria2.getVersion", "token:secret"),
+            # an error of aria2c is passed through
+            _rpc(6, "aria2.tellStatus", "token:secret", "missing"),
+        ):
+            response = await client.post("/api/aria2/jsonrpc", json=request)
+            results.append((response.status_code, response.json()))
+        # the body is proxied as it is, whatever its content type
+        response = await client.post(
+            "/api/aria2/jsonrpc",
+            content=json.dumps(_rpc(7, "aria2.tellActive", "token:secret")),
+            headers={"Content-Type": "text/plain"},
+        )
+        results.append((response.status_code, response.json()))
+    return results
+
+
+@pytest.mark.parametrize("rpc_cache_ttl_second", [0, 60])
+def test_asgi_fast_path(
+    monkeypatch: pytest.MonkeyPatch, rpc_cache_ttl_second: float
+) -> None:
+    upstream_methods: List[str] = []
+
+    def create_upstream_client(*_: Any, **__: Any) -> httpx.AsyncClient:
+        fake = FakeAria2c()
+
+        # NOTE: not `httpx.MockTransport`, which reads the response before returning it,
+        # so it can not be streamed by the proxy.
+        async def jsonrpc(request: Request) -> JSONResponse:
+            rpc_request = await request.json()
+            upstream_methods.append(rpc_request["method"])
+            return JSONResponse(fake.respond(rpc_request))
+
+        upstream = Starlette(routes=[Route("/jsonrpc", jsonrpc, methods=["POST"])])
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=upstream))  # pyright: ignore[reportArgumentType]
+
+    monkeypatch.setattr(_aria2, "create_upstream_client", create_upstream_client)
+
+    async def main() -> None:
+        fast_app = _create_app(
+            asgi_fast_path=True, rpc_cache_ttl_second=rpc_cache_ttl_second
+        )
+        assert _uses_fast_path(fast_app)
+        fast_results = await _exchange(fast_app)
+        fast_upstream_methods = upstream_methods.copy()
+
+        upstream_methods.clear()
+        app = _create_app(
+            asgi_fast_path=False, rpc_cache_ttl_second=rpc_cache_ttl_second
+        )
+        assert not _uses_fast_path(app)
+        results = await _exchange(app)
+
+        # the fast path answers exactly like the fastapi endpoint
+        assert fast_results == results
+        assert fast_upstream_methods == upstream_methods
+
+        # the unauthenticated call is redirected to login, without reaching aria2c
+        assert results[0] == (303, "/account")
+        assert results[1] == (
+            200,
+            {"jsonrpc": "2.0", "id": 2, "result": {"version": "aria2c"}},
+        )
+        assert results[3][1]["result"] == "OK"
+        assert results[5][1]["id"] == 6
+        assert "error" in results[5][1]
+        assert results[6][1]["result"] == []
+        expected_methods = [
+            "aria2.getVersion",
+            "aria2.getVersion",
+            "aria2.pauseAll",
+            "aria2.getVersion",
+            "aria2.tellStatus",
+            "aria2.tellActive",
+        ]
+        if rpc_cache_ttl_second > 0:
+            # the second call is answered by the cache
+            del expected_methods[1]
+        assert upstream_methods == expected_methods
+
+    asyncio.run(main())
@@ -0,0 +1,39 @@
+import asyncio
+import threading
+
+import pytest
+
+from aria2_server.app._core.aria2 import Aria2NotReadyError, Aria2ReadinessGate
+
+
+def test_readiness_gate() -> None:
+    async def main() -> None:
+        gate = Aria2ReadinessGate(timeout=5, max_waiting=2)
+        assert not gate.is_ready
+
+        waiters = [asyncio.ensure_future(gate.wait()) for _ in range(2)]
+        await asyncio.sleep(0)
+        # the queue is full
+        with pytest.raises(Aria2NotReadyError):
+            await gate.wait()
+        assert gate.metrics()["waiting"] == 2
+
+        # released by the watchdog thread
+        threading.Timer(0.05, gate.set_ready).start()
+        await asyncio.wait_for(asyncio.gather(*waiters), timeout=1)
+        assert gate.metrics() == {
+            "ready": True,
+            "waiting": 0,
+            "rejected": 1,
+            "timed_out": 0,
+        }
+        await gate.wait()
+
+        gate.set_not_ready()
+        gate.timeout = 0.05
+        with pytest.raises(Aria2NotReadyError):
+            await gate.wait()
+        assert gate.metrics()["timed_out"] == 1
+        assert gate.metrics()["waiting"] == 0
+
+    asyncio.run(main())
@@ -0,0 +1,281 @@
+import asyncio
+from typing import Any, Callable, Dict, List
+
+import httpx
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from aria2_server.app._core.aria2 import (
+    Aria2Backend,
+    Aria2RpcClient,
+    Aria2ShardRouter,
+    Aria2StateStore,
+)
+from aria2_server.app._core.aria2._ws_multiplexer import (
+    _Aria2ShardedUpstream,  # pyright: ignore[reportPrivateUsage]
+)
+from aria2_server.app._core.metrics import MetricsRegistry
+from aria2_server.app.factory import AppState, build_aria2_components, create_app
+from aria2_server.config import schemas
+from tests._fake_aria2c import FakeAria2c
+
+
+def _request(method: str, *params: Any) -> Dict[str, Any]:
+    return {
+        "jsonrpc": "2.0",
+        "id": 1,
+        "method": method,
+        "params": ["token:secret", *params],
+    }
+
+
+def test_shard_router() -> None:
+    async def main() -> None:
+        fakes = [FakeAria2c(name, max_concurrent_downloads=0) for name in "ab"]
+        clients = [
+            httpx.AsyncClient(transport=httpx.MockTransport(fake.handle))
+            for fake in fakes
+        ]
+        router = Aria2ShardRouter(
+            [
+                Aria2Backend(
+                    fake.name,
+                    Aria2RpcClient(client, "http://aria2c/jsonrpc"),
+                    "ws://aria2c/jsonrpc",
+                )
+                for fake, client in zip(fakes, clients)
+            ],
+            max_gids=100,
+        )
+
+        # placed on the least loaded instance
+        for _ in range(4):
+            response = await router.request(_request("aria2.addUri", ["http://x"]))
+            assert response["id"] == 1
+        assert [len(fake.waiting) for fake in fakes] == [2, 2]
+        assert [b["placements"] for b in router.metrics()["backends"]] == [2, 2]
+
+        # routed by the GID table
+        gid = fakes[1].waiting[0]["gid"]
+        response = await router.request(_request("aria2.tellStatus", gid))
+        assert response["result"]["gid"] == gid
+        assert router.metrics()["gid_lookups"] == 0
+
+        # looked up on all instances if the GID is unknown
+        router._gids.clear()  # pyright: ignore[reportPrivateUsage]
+        response = await router.request(_request("aria2.tellStatus", gid))
+        assert response["result"]["gid"] == gid
+        assert router.metrics()["gid_lookups"] == 1
+        assert router.shard_of(gid) == 1
+
+        # merged
+        response = await router.request(_request("aria2.tellWaiting", 1, 2))
+        assert [item["gid"] for item in response["result"]] == [
+            fakes[0].waiting[1]["gid"],
+            fakes[1].waiting[0]["gid"],
+        ]
+        # the reverse of the concatenation, e.g. the recent ones for AriaNg
+        response = await router.request(_request("aria2.tellWaiting", -1, 3))
+        assert [item["gid"] for item in response["result"]] == [
+            fakes[1].waiting[1]["gid"],
+            fakes[1].waiting[0]["gid"],
+            fakes[0].waiting[1]["gid"],
+        ]
+        response = await router.request(_request("aria2.getGlobalStat"))
+        assert response["result"] == {"numActive": "0", "numWaiting": "4"}
+
+        # split
+        response = await router.request(
+            {
+                "jsonrpc": "2.0",
+                "id": 2,
+                "method": "system.multicall",
+                "params": [
+                    [
+                        {"methodName": "aria2.pauseAll", "params": ["token:secret"]},
+                        {
+                            "methodName": "aria2.tellStatus",
+                            "params": ["token:secret", "x"],
+                        },
+                    ]
+                ],
+            }
+        )
+        assert response["id"] == 2
+        assert response["result"][0] == ["OK"]
+        assert response["result"][1]["code"] == 1
+
+        for client in clients:
+            await client.aclose()
+
+    asyncio.run(main())
+
+
+def test_federation() -> None:
+    async def main() -> None:
+        fakes = [
+            FakeAria2c("local", max_concurrent_downloads=0),
+            FakeAria2c("remote", secret="remote", max_concurrent_downloads=0),
+            FakeAria2c("down", secret="down", max_concurrent_downloads=0),
+        ]
+        reachable = [True, True, False]
+
+        def handler(index: int) -> Callable[[httpx.Request], httpx.Response]:
+            def handle(request: httpx.Request) -> httpx.Response:
+                if not reachable[index]:
+                    raise httpx.ConnectError("unreachable", request=request)
+                return fakes[index].handle(request)
+
+            return handle
+
+        clients = [
+            httpx.AsyncClient(transport=httpx.MockTransport(handler(index)))
+            for index in range(len(fakes))
+        ]
+        router = Aria2ShardRouter(
+            [
+                Aria2Backend(
+                    fake.name,
+                    Aria2RpcClient(client, "http://aria2c/jsonrpc", secret=fake.secret),
+                    "ws://aria2c/jsonrpc",
+                    is_remote=fake.name != "local",
+                )
+                for fake, client in zip(fakes, clients)
+            ],
+            max_gids=100,
+            secret="secret",
+            health_check_interval=60,
+        )
+
+        def healthy() -> List[bool]:
+            return [backend["healthy"] for backend in router.metrics()["backends"]]
+
+        # the rpc-secret of clients is replaced by the one of each backend,
+        # and the unreachable backend is skipped
+        for _ in range(2):
+            response = await router.request(_request("aria2.addUri", ["http://x"]))
+            assert "result" in response
+        assert [len(fake.waiting) for fake in fakes] == [1, 1, 0]
+        response = await router.request(_request("aria2.getGlobalStat"))
+        assert response["result"] == {"numActive": "0", "numWaiting": "2"}
+        assert healthy() == [True, True, False]
+
+        # healthy again after the health check
+        reachable[2] = True
+        await router.check_health()
+        assert healthy() == [True, True, True]
+        response = await router.request(_request("aria2.addUri", ["http://x"]))
+        assert response["result"].startswith("down-")
+
+        # only the local instance is shut down, the others are broadcast to the remotes too
+        response = await router.request(_request("aria2.forceShutdown"))
+        assert response["result"] == "OK"
+        assert [fake.is_shut_down for fake in fakes] == [True, False, False]
+        response = await router.request(_request("aria2.pauseAll"))
+        assert response["result"] == "OK"
+
+        await router.aclose()
+        for client in clients:
+            await client.aclose()
+
+    asyncio.run(main())
+
+
+def test_sharded_websocket_listeners() -> None:
+    async def main() -> None:
+        fakes = [FakeAria2c("a"), FakeAria2c("hanging"), FakeAria2c("down")]
+        dials: List[str] = []
+
+        def handler(fake: FakeAria2c) -> Callable[[httpx.Request], Any]:
+            async def handle(request: httpx.Request) -> httpx.Response:
+                if request.method == "GET":
+                    # the WebSocket handshake, which hangs like an unreachable host
+                    dials.append(fake.name)
+                    await asyncio.sleep(60)
+                return fake.handle(request)
+
+            return handle
+
+        clients = [
+            httpx.AsyncClient(transport=httpx.MockTransport(handler(fake)))
+            for fake in fakes
+        ]
+        router = Aria2ShardRouter(
+            [
+                Aria2Backend(
+                    fake.name,
+                    Aria2RpcClient(client, "http://aria2c/jsonrpc"),
+                    "ws://aria2c/jsonrpc",
+                )
+                for fake, client in zip(fakes, clients)
+            ],
+            max_gids=100,
+        )
+        router.healthy[2] = False
+        upstream = _Aria2ShardedUpstream(router, on_notification=lambda _: None)
+
+        # the calls never wait for the WebSocket of any instance
+        response = await asyncio.wait_for(
+            upstream.call(_request("aria2.getVersion")), timeout=1
+        )
+        assert response["result"] == {"version": "a"}
+        await asyncio.sleep(0.1)
+        # the unhealthy instance is not dialed
+        assert sorted(dials) == ["a", "hanging"]
+
+        await upstream.aclose()
+        for client in clients:
+            await client.aclose()
+
+    asyncio.run(main())
+
+
+def test_shared_shard_router() -> None:
+    app = create_app(
+        schemas.Config(
+            server=schemas.Server(
+                extra=schemas.ServerExtra(
+                    sqlite_db=":memory:",
+                    download_queue=schemas.DownloadQueue(enabled=True),
+                    download_history=schemas.DownloadHistory(interval_second=60),
+                    aria2_federation=schemas.Aria2Federation(
+                        backends=[schemas.Aria2RemoteBackend(host="remote")]
+                    ),
+                ),
+            ),
+        )
+    )
+    app_state: AppState = app.state.aria2_server
+    metrics = app_state.metrics_registry.collect()
+    assert "aria2_shards" in metrics
+    # the proxy, the download queue and the archiver share one router,
+    # i.e. one pool to the remote aria2c
+    assert [name for name in metrics if "remote" in name] == [
+        "aria2_upstream_pool.shard_router.federation.remote:6800"
+    ]
+
+
+def test_shared_shard_router_of_state_poller() -> None:
+    async def main() -> None:
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        components = build_aria2_components(
+            schemas.Config(
+                server=schemas.Server(
+                    extra=schemas.ServerExtra(
+                        aria2_state_polling=schemas.Aria2StatePolling(
+                            interval_second=1
+                        ),
+                        aria2_shards=schemas.Aria2Shards(count=2),
+                    ),
+                ),
+            ),
+            session_maker=async_sessionmaker(engine),
+            registry=MetricsRegistry(),
+            state_store=Aria2StateStore(),
+        )
+        # the poller routes by the shared router, instead of building its own
+        assert components.state_poller is not None
+        assert components.state_poller.rpc_client.router is components.shard_router  # pyright: ignore[reportAttributeAccessIssue]
+        await components.aclose()
+        await engine.dispose()
+
+    asyncio.run(main())
@@ -0,0 +1,145 @@
+import asyncio
+import json
+
+from fastapi.routing import APIRoute
+from starlette.responses import StreamingResponse
+
+from aria2_server.app._core.api import aria2_state
+from aria2_server.app._core.aria2 import Aria2StateDeltaEncoder, Aria2StateStore
+from aria2_server.config import schemas
+
+
+def test_delta() -> None:
+    store = Aria2StateStore()
+    encoder = Aria2StateDeltaEncoder(store)
+
+    assert json.loads(encoder.encode(0))["version"] == 0
+
+    store.update(
+        global_stat={"numActive": "1"},
+        active=[{"gid": "a", "status": "active", "completedLength": "0"}],
+        waiting=[{"gid": "b", "status": "waiting", "completedLength": "0"}],
+        stopped=[],
+    )
+    first = json.loads(encoder.encode(0))
+    assert first["version"] == 1
+    assert first["full"] is True
+    assert [download["gid"] for download in first["added"]] == ["a", "b"]
+
+    # nothing changed, the version should not be increased
+    store.update(
+        global_stat={"numActive": "1"},
+        active=[{"gid": "a", "status": "active", "completedLength": "0"}],
+        waiting=[{"gid": "b", "status": "waiting", "completedLength": "0"}],
+        stopped=[],
+    )
+    assert store.version == 1
+
+    store.update(
+        global_stat={"numActive": "1"},
+        active=[{"gid": "a", "status": "active", "completedLength": "100"}],
+        waiting=[],
+        stopped=[{"gid": "c", "status": "complete", "completedLength": "1"}],
+    )
+    delta = json.loads(encoder.encode(1))
+    assert delta["version"] == 2
+    assert delta["full"] is False
+    assert [download["gid"] for download in delta["added"]] == ["c"]
+    assert delta["removed"] == ["b"]
+    assert delta["changed"] == {"a": {"completedLength": "100"}}
+
+    # the fields dropped from a download are reported as `None`
+    store.update(
+        global_stat={"numActive": "1"},
+        active=[{"gid": "a", "status": "active"}],
+        waiting=[],
+        stopped=[{"gid": "c", "status": "complete", "completedLength": "1"}],
+    )
+    assert json.loads(encoder.encode(2))["changed"] == {"a": {"completedLength": None}}
+
+    # unknown version falls back to the full state
+    assert json.loads(encoder.encode(42))["full"] is True
+
+
+def test_delta_truncated() -> None:
+    store = Aria2StateStore()
+    encoder = Aria2StateDeltaEncoder(store)
+
+    store.update(
+        global_stat={"numActive": "0", "numWaiting": "2", "numStopped": "0"},
+        active=[],
+        waiting=[{"gid": "a", "status": "waiting"}, {"gid": "b", "status": "waiting"}],
+        stopped=[],
+    )
+    assert json.loads(encoder.encode(0))["truncated"] is False
+
+    # 3 waiting downloads, but only 2 are polled: `b` moved beyond the window,
+    # so it's removed from the client, which holds the polled window only
+    store.update(
+        global_stat={"numActive": "0", "numWaiting": "3", "numStopped": "0"},
+        active=[],
+        waiting=[{"gid": "c", "status": "waiting"}, {"gid": "a", "status": "waiting"}],
+        stopped=[],
+    )
+    delta = json.loads(encoder.encode(1))
+    assert delta["truncated"] is True
+    assert [download["gid"] for download in delta["added"]] == ["c"]
+    assert delta["removed"] == ["b"]
+
+
+def test_stats_stream() -> None:
+    async def main() -> None:
+        store = Aria2StateStore()
+        router = aria2_state.create_aria2_state_router(
+            store,
+            schemas.Aria2StatePolling(interval_second=1, sse_interval_second=0.01),
+        )
+        get_events = next(
+            route.endpoint
+            for route in router.routes
+            if isinstance(route, APIRoute) and route.path == "/events"
+        )
+        response: StreamingResponse = await get_events()
+        frames = response.body_iterator
+
+        def update(completed_length: str) -> None:
+            store.update(
+                global_stat={"numActive": "1"},
+                active=[
+                    {
+                        "gid": "a",
+                        "status": "active",
+                        "dir": "/",
+                        "completedLength": completed_length,
+                    }
+                ],
+                waiting=[],
+                stopped=[],
+            )
+
+        # the stream waits for the first snapshot
+        next_frame = asyncio.ensure_future(frames.__anext__())
+        await asyncio.sleep(0)
+        assert not next_frame.done()
+        update("0")
+        frame = await asyncio.wait_for(next_frame, timeout=5)
+        assert isinstance(frame, bytes)
+        event, id_, data = frame.decode().rstrip("\n").split("\n")
+        assert event == "event: stats"
+        assert id_ == "id: 1"
+        stats = json.loads(data[len("data: ") :])
+        assert stats["global_stat"] == {"numActive": "1"}
+        # only the progress fields of each active download
+        assert stats["downloads"][0]["completedLength"] == "0"
+        assert "dir" not in stats["downloads"][0]
+
+        # only the newest snapshot is pushed
+        update("1")
+        update("2")
+        frame = await asyncio.wait_for(frames.__anext__(), timeout=5)
+        assert isinstance(frame, bytes)
+        assert frame.startswith(b"event: stats\nid: 3\n")
+
+        await frames.aclose()  # pyright: ignore[reportAttributeAccessIssue]
+
+    asyncio.run(main())
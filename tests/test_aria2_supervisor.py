@@ -0,0 +1,139 @@
+import asyncio
+import socket
+import sys
+import time
+from pathlib import Path
+from textwrap import dedent
+from typing import Callable, List
+
+from aria2_server.app._core.aria2 import Aria2ReadinessGate, Aria2Supervisor
+
+# a stand-in of aria2c, which answers any JSON-RPC request
+_FAKE_ARIA2C = dedent(
+    """\
+    import json, sys
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            content = json.dumps({"jsonrpc": "2.0", "id": body["id"], "result": {}})
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content.encode())
+
+    HTTPServer(("127.0.0.1", int(sys.argv[1])), Handler).serve_forever()
+    """
+)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _create_supervisor(cmd_args: List[str], port: int) -> Aria2Supervisor:
+    return Aria2Supervisor(
+        cmd_args,
+        f"http://127.0.0.1:{port}/jsonrpc",
+        secret=None,
+        readiness_gate=Aria2ReadinessGate(timeout=5, max_waiting=1),
+        startup_timeout=5,
+        restart_backoff_initial=0.01,
+        restart_backoff_max=0.05,
+        min_uptime=1,
+        crash_loop_max_failures=3,
+        shutdown_timeout=5,
+    )
+
+
+async def _wait_for(predicate: Callable[[], bool]) -> None:
+    deadline = time.monotonic() + 10
+    while not predicate():
+        assert time.monotonic() < deadline, "timeout"
+        await asyncio.sleep(0.01)
+
+
+def test_restart() -> None:
+    async def main() -> None:
+        port = _free_port()
+        supervisor = _create_supervisor(
+            [sys.executable, "-c", _FAKE_ARIA2C, str(port)], port
+        )
+        supervisor.min_uptime = 0
+        assert await supervisor.start()
+        assert supervisor.readiness_gate.is_ready
+        process = supervisor.process
+        assert process is not None
+
+        process.kill()
+        await _wait_for(
+            lambda: supervisor.restarts == 1 and supervisor.state == "ready"
+        )
+        assert supervisor.process is not process
+        assert supervisor.readiness_gate.is_ready
+        metrics = supervisor.metrics()
+        assert metrics["consecutive_failures"] == 0
+        assert metrics["last_restart_latency_second"] is not None
+
+        await supervisor.aclose()
+        assert supervisor.state == "stopped"
+        assert supervisor.process is not None
+        assert supervisor.process.returncode is not None
+        assert not supervisor.readiness_gate.is_ready
+
+    asyncio.run(main())
+
+
+def test_crash_loop() -> None:
+    async def main() -> None:
+        supervisor = _create_supervisor(
+            [sys.executable, "-c", "import sys; sys.exit(3)"], _free_port()
+        )
+        assert not await supervisor.start()
+        await _wait_for(lambda: supervisor.state == "crash_loop")
+        metrics = supervisor.metrics()
+        assert metrics["restarts"] == 2
+        assert metrics["consecutive_failures"] == 3
+        assert metrics["last_exit_code"] == 3
+        assert not supervisor.readiness_gate.is_ready
+        await supervisor.aclose()
+
+    asyncio.run(main())
+
+
+def test_slow_restart(tmp_path: Path) -> None:
+    async def main() -> None:
+        port = _free_port()
+        # the restarted one starts listening after `startup_timeout`,
+        # e.g. it's loading a large session file
+        started = tmp_path / "started"
+        slow_start = (
+            "import os, sys, time\n"
+            f"if os.path.exists({str(started)!r}): time.sleep(1)\n"
+            f"open({str(started)!r}, 'w').close()\n"
+        )
+        supervisor = _create_supervisor(
+            [sys.executable, "-c", slow_start + _FAKE_ARIA2C, str(port)], port
+        )
+        supervisor.min_uptime = 0
+        supervisor.startup_timeout = 0.3
+        assert await supervisor.start()
+        process = supervisor.process
+        assert process is not None
+
+        process.kill()
+        await _wait_for(lambda: supervisor.restarts == 1)
+        await asyncio.sleep(0.5)
+        assert not supervisor.readiness_gate.is_ready
+        # the gate opens as soon as it answers, without another restart
+        await _wait_for(lambda: supervisor.readiness_gate.is_ready)
+        assert supervisor.state == "ready"
+        assert supervisor.restarts == 1
+        assert supervisor.metrics()["last_restart_latency_second"] > 1
+
+        await supervisor.aclose()
+
+    asyncio.run(main())
@@ -0,0 +1,72 @@
+import asyncio
+from typing import Any, Dict
+
+import httpx
+import pytest
+
+from aria2_server.app._core.aria2 import create_upstream_client
+from aria2_server.app._core.metrics import MetricsRegistry
+from aria2_server.config import schemas
+
+
+def test_upstream_pool_metrics() -> None:
+    async def main() -> None:
+        release = asyncio.Event()
+
+        async def serve(
+            reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+        ) -> None:
+            await reader.readuntil(b"\r\n\r\n")
+            # hold the connection by not sending the body until released
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\n")
+            await writer.drain()
+            await release.wait()
+            writer.write(b"ok")
+            await writer.drain()
+            writer.close()
+
+        server = await asyncio.start_server(serve, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        url = f"http://127.0.0.1:{port}/"
+
+        registry = MetricsRegistry()
+        client = create_upstream_client(
+            "test",
+            upstream_config=schemas.Aria2Upstream(
+                max_connections=1, pool_timeout_second=0.5
+            ),
+            registry=registry,
+        )
+
+        def metrics() -> Dict[str, Any]:
+            return registry.collect()["aria2_upstream_pool.test"]
+
+        assert metrics()["connections"] == 0
+
+        async with client, server, client.stream("GET", url) as response:
+            assert metrics()["in_use"] == 1
+
+            # queued for the only connection, until the pool timeout
+            waiting = asyncio.create_task(client.get(url))
+            await asyncio.sleep(0.1)
+            assert metrics()["waiting"] == 1
+            with pytest.raises(httpx.PoolTimeout):
+                await waiting
+            assert metrics()["rejected"] == 1
+            assert metrics()["waiting"] == 0
+
+            release.set()
+            assert await response.aread() == b"ok"
+
+        # not broken by the internals of httpx or httpcore missing
+        client._transport._pool = object()  # pyright: ignore[reportAttributeAccessIssue]
+        assert metrics() == {
+            "max_connections": 1,
+            "connections": 0,
+            "in_use": 0,
+            "idle": 0,
+            "waiting": 0,
+            "rejected": 1,
+        }
+
+    asyncio.run(main())
@@ -0,0 +1,139 @@
+import asyncio
+import json
+from typing import Any, Dict, List
+
+import httpx
+from httpx_ws import AsyncWebSocketSession, WebSocketNetworkError, aconnect_ws
+from httpx_ws.transport import ASGIWebSocketTransport
+from starlette.applications import Starlette
+from starlette.routing import WebSocketRoute
+from starlette.websockets import WebSocket, WebSocketDisconnect
+
+from aria2_server.app._core.aria2 import Aria2WebSocketMultiplexer
+from tests._fake_aria2c import FakeAria2c
+
+
+class _FakeAria2cWebSocket:
+    """Serve a `FakeAria2c` on `ws://aria2c/jsonrpc`.
+
+    `aria2.forceShutdown` closes the connection without answering, like aria2c exiting.
+    """
+
+    def __init__(self, fake: FakeAria2c) -> None:
+        self.fake = fake
+        self.sessions: List[WebSocket] = []
+        self.ids: List[Any] = []
+        self.app = Starlette(routes=[WebSocketRoute("/jsonrpc", self._serve)])
+
+    async def _serve(self, websocket: WebSocket) -> None:
+        await websocket.accept()
+        self.sessions.append(websocket)
+        try:
+            while True:
+                request: Dict[str, Any] = json.loads(await websocket.receive_text())
+                self.ids.append(request.get("id"))
+                if request["method"] == "aria2.forceShutdown":
+                    await websocket.close()
+                    return
+                await websocket.send_text(json.dumps(self.fake.respond(request)))
+        except WebSocketDisconnect:
+            pass
+
+    async def notify(self, method: str) -> None:
+        notification = {"jsonrpc": "2.0", "method": method, "params": [{"gid": "1"}]}
+        await self.sessions[-1].send_text(json.dumps(notification))
+
+
+async def _call(
+    session: AsyncWebSocketSession, id_: Any, method: str, *params: Any
+) -> Dict[str, Any]:
+    request = {"jsonrpc": "2.0", "id": id_, "method": method, "params": list(params)}
+    await session.send_text(json.dumps(request))
+    return json.loads(await asyncio.wait_for(session.receive_text(), timeout=5))
+
+
+def test_ws_multiplexer() -> None:
+    async def main() -> None:
+        upstream = _FakeAria2cWebSocket(FakeAria2c("a"))
+
+        multiplexer: Aria2WebSocketMultiplexer
+
+        async def serve(websocket: WebSocket) -> None:
+            await multiplexer.serve(websocket)
+
+        app = Starlette(routes=[WebSocketRoute("/jsonrpc", serve)])
+
+        async with httpx.AsyncClient(
+            transport=ASGIWebSocketTransport(upstream.app)
+        ) as upstream_client, httpx.AsyncClient(
+            transport=ASGIWebSocketTransport(app)
+        ) as client:
+            multiplexer = Aria2WebSocketMultiplexer(
+                upstream_client, "ws://aria2c/jsonrpc"
+            )
+            async with aconnect_ws("ws://server/jsonrpc", client) as first, aconnect_ws(
+                "ws://server/jsonrpc", client
+            ) as second:
+                # the same id from two clients, remapped to unique upstream ids
+                responses = await asyncio.gather(
+                    _call(first, 1, "aria2.getVersion", "token:secret"),
+                    _call(second, 1, "aria2.tellActive", "token:secret"),
+                )
+                assert responses[0] == {
+                    "jsonrpc": "2.0",
+                    "id": 1,
+                    "result": {"version": "a"},
+                }
+                assert responses[1] == {"jsonrpc": "2.0", "id": 1, "result": []}
+                assert len(upstream.sessions) == 1
+                assert len(set(upstream.ids)) == 2
+
+                # notifications are received once, and fanned out to all clients
+                await upstream.notify("aria2.onDownloadStart")
+                for session in (first, second):
+                    notification = json.loads(
+                        await asyncio.wait_for(session.receive_text(), timeout=5)
+                    )
+                    assert notification["method"] == "aria2.onDownloadStart"
+
+                # a pending call is answered with an error if aria2c disconnects,
+                # and the next call reconnects
+                response = await _call(
+                    first, "x", "aria2.forceShutdown", "token:secret"
+                )
+                assert response["id"] == "x"
+                assert "error" in response
+                response = await _call(second, 2, "aria2.getVersion", "token:secret")
+                assert response["result"] == {"version": "a"}
+                assert len(upstream.sessions) == 2
+
+            await multiplexer.aclose()
+
+    asyncio.run(main())
+
+
+def test_ws_multiplexer_send_error() -> None:
+    class _ClosedSession:
+        async def send_text(self, _text: str) -> None:
+            raise WebSocketNetworkError()
+
+    async def get_session() -> Any:
+        return _ClosedSession()
+
+    async def main() -> None:
+        async with httpx.AsyncClient() as client:
+            multiplexer = Aria2WebSocketMultiplexer(client, "ws://aria2c/jsonrpc")
+            # e.g. aria2c closed the session, but it's not noticed yet
+            multiplexer._upstream._get_session = get_session  # pyright: ignore[reportPrivateUsage, reportAttributeAccessIssue]
+            response = await asyncio.wait_for(
+                multiplexer._handle_request(  # pyright: ignore[reportPrivateUsage]
+                    {"jsonrpc": "2.0", "id": 1, "method": "aria2.getVersion"}
+                ),
+                timeout=5,
+            )
+            assert response is not None
+            assert response["id"] == 1
+            assert "error" in response
+            await multiplexer.aclose()
+
+    asyncio.run(main())
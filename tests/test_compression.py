@@ -0,0 +1,182 @@
+import asyncio
+import gzip
+import zlib
+from typing import AsyncIterator, List, Optional
+
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.datastructures import Headers
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+from starlette.types import Message
+
+from aria2_server.app._core import compression
+from aria2_server.app._core.compression import (
+    CompressionMiddleware,
+    negotiate_encoding,
+)
+
+_MINIMUM_SIZE = 100
+_LARGE_TEXT = "aria2" * 100
+
+
+@pytest.mark.parametrize(
+    ("accept_encoding", "with_brotli", "expected"),
+    [
+        ("", False, None),
+        ("identity", False, None),
+        ("gzip", False, "gzip"),
+        ("GZIP;q=0.5", False, "gzip"),
+        ("gzip;q=0", False, None),
+        ("*", False, "gzip"),
+        ("*, gzip;q=0", False, None),
+        ("br", False, None),
+        ("gzip, br", False, "gzip"),
+        # brotli is preferred when the qualities are equal
+        ("gzip, br", True, "br"),
+        ("gzip, br;q=0.5", True, "gzip"),
+        ("br;q=invalid", True, None),
+    ],
+)
+def test_negotiate_encoding(
+    monkeypatch: pytest.MonkeyPatch,
+    accept_encoding: str,
+    with_brotli: bool,
+    expected: Optional[str],
+) -> None:
+    monkeypatch.setattr(compression, "brotli", object() if with_brotli else None)
+    assert negotiate_encoding(accept_encoding) == expected
+
+
+def _create_app(seen_accept_encodings: List[str]) -> CompressionMiddleware:
+    async def large(request: Request) -> Response:
+        seen_accept_encodings.append(request.headers.get("accept-encoding", ""))
+        return PlainTextResponse(_LARGE_TEXT, headers={"ETag": '"tag"'})
+
+    async def small(_request: Request) -> Response:
+        return PlainTextResponse("small")
+
+    async def image(_request: Request) -> Response:
+        return Response(_LARGE_TEXT.encode(), media_type="image/png")
+
+    async def events(_request: Request) -> Response:
+        async def stream() -> AsyncIterator[str]:
+            for i in range(3):
+                yield f"data: {i}\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    app = Starlette(
+        routes=[
+            Route("/api/large", large),
+            Route("/api/small", small),
+            Route("/api/image", image),
+            Route("/api/events", events),
+            Route("/other/large", large),
+        ]
+    )
+    return CompressionMiddleware(
+        app,
+        path_prefixes=["/api/"],
+        minimum_size=_MINIMUM_SIZE,
+        gzip_level=6,
+        brotli_quality=4,
+    )
+
+
+def test_compression_middleware() -> None:
+    async def main() -> None:
+        seen_accept_encodings: List[str] = []
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=_create_app(seen_accept_encodings)),  # pyright: ignore[reportArgumentType]
+            base_url="http://testserver",
+        ) as client:
+            gzip_headers = {"Accept-Encoding": "gzip"}
+
+            async with client.stream(
+                "GET", "/api/large", headers=gzip_headers
+            ) as response:
+                assert response.headers["Content-Encoding"] == "gzip"
+                assert response.headers["Vary"] == "Accept-Encoding"
+                # the strong validator of the identity representation is weakened
+                assert response.headers["ETag"] == 'W/"tag"'
+                raw = b"".join([chunk async for chunk in response.aiter_raw()])
+                assert int(response.headers["Content-Length"]) == len(raw)
+                assert gzip.decompress(raw).decode() == _LARGE_TEXT
+            # the inner app can not compress it again
+            assert seen_accept_encodings == [""]
+
+            # identity
+            response = await client.get(
+                "/api/large", headers={"Accept-Encoding": "identity"}
+            )
+            assert "Content-Encoding" not in response.headers
+            assert response.headers["ETag"] == '"tag"'
+            assert response.text == _LARGE_TEXT
+
+            # smaller than the minimum size, or not compressible
+            for path in ("/api/small", "/api/image"):
+                response = await client.get(path, headers=gzip_headers)
+                assert "Content-Encoding" not in response.headers
+
+            # left to the inner app
+            response = await client.get("/other/large", headers=gzip_headers)
+            assert seen_accept_encodings[-1] == "gzip"
+
+    asyncio.run(main())
+
+
+def test_compression_middleware_streaming() -> None:
+    async def main() -> None:
+        app = _create_app([])
+        messages: List[Message] = []
+
+        async def receive() -> Message:
+            return {"type": "http.disconnect"}
+
+        async def send(message: Message) -> None:
+            messages.append(message)
+
+        scope = {
+            "type": "http",
+            "method": "GET",
+            "path": "/api/events",
+            "root_path": "",
+            "query_string": b"",
+            "headers": [(b"accept-encoding", b"gzip")],
+        }
+        await app(scope, receive, send)
+
+        headers = Headers(raw=messages[0]["headers"])
+        assert headers["Content-Encoding"] == "gzip"
+        assert "Content-Length" not in headers
+        # every chunk of a stream can be decoded as soon as it is sent
+        decompressor = zlib.decompressobj(31)
+        events = [
+            decompressor.decompress(message["body"]).decode()
+            for message in messages[1:]
+        ]
+        assert events[:3] == ["data: 0\n\n", "data: 1\n\n", "data: 2\n\n"]
+        assert "".join(events) == "data: 0\n\ndata: 1\n\ndata: 2\n\n"
+        assert decompressor.eof
+
+    asyncio.run(main())
+
+
+def test_compression_middleware_brotli() -> None:
+    brotli = pytest.importorskip("brotli")
+
+    async def main() -> None:
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=_create_app([])),  # pyright: ignore[reportArgumentType]
+            base_url="http://testserver",
+        ) as client:
+            response = await client.get(
+                "/api/large", headers={"Accept-Encoding": "gzip, br"}
+            )
+            assert response.headers["Content-Encoding"] == "br"
+            assert brotli.decompress(response.content).decode() == _LARGE_TEXT
+
+    asyncio.run(main())
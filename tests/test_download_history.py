@@ -0,0 +1,98 @@
+import asyncio
+from typing import Any, Dict, List
+
+import httpx
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from aria2_server.app._core.aria2 import Aria2HistoryArchiver, Aria2RpcClient
+from aria2_server.db.base._models import Base
+from tests._fake_aria2c import FakeAria2c
+
+
+def _download(gid: str, status: str, directory: str = "/downloads") -> Dict[str, Any]:
+    return {
+        "gid": gid,
+        "status": status,
+        "dir": directory,
+        "totalLength": "100",
+        "completedLength": "100" if status == "complete" else "10",
+        "errorCode": "0" if status == "complete" else "3",
+        "errorMessage": "" if status == "complete" else "Resource not found",
+        "files": [{"path": f"{directory}/{gid}.bin", "uris": []}],
+    }
+
+
+def test_download_history() -> None:
+    async def main() -> None:
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_maker = async_sessionmaker(engine, expire_on_commit=False)
+
+        fake = FakeAria2c()
+        fake.stopped = [
+            _download("0000000000000001", "complete"),
+            _download("0000000000000002", "removed"),
+            _download("0000000000000003", "error"),
+            _download("0000000000000004", "complete", directory="/other"),
+            _download("0000000000000005", "complete"),
+        ]
+        purged_by_users: List[str] = []
+        purge_requests: List[httpx.Request] = []
+
+        def handle(request: httpx.Request) -> httpx.Response:
+            # users remove the results before they are purged by the archiver
+            if b"aria2.removeDownloadResult" in request.content:
+                purge_requests.append(request)
+                fake.stopped = [
+                    d for d in fake.stopped if d["gid"] not in purged_by_users
+                ]
+            return fake.handle(request)
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handle))
+        rpc_client = Aria2RpcClient(client, "http://aria2c/jsonrpc", secret="secret")
+        # a small batch, so that the offset is tracked across batches
+        archiver = Aria2HistoryArchiver(
+            rpc_client, session_maker=session_maker, interval=60, batch_size=2
+        )
+
+        # `removed` downloads are left in aria2c
+        assert await archiver.archive() == 4
+        assert [d["gid"] for d in fake.stopped] == ["0000000000000002"]
+        assert await archiver.archive() == 0
+
+        # archived twice, e.g. failed to purge it last time, but stored once
+        fake.stopped.append(_download("0000000000000001", "complete"))
+        await archiver.archive()
+        items = await archiver.get_page(limit=10)
+        assert len(items) == 4
+        assert items[0].name == "0000000000000005.bin"
+
+        errors = await archiver.get_page(limit=10, status="error")
+        assert [item.gid for item in errors] == ["0000000000000003"]
+        assert errors[0].error_message == "Resource not found"
+        others = await archiver.get_page(limit=10, directory="/other")
+        assert [item.gid for item in others] == ["0000000000000004"]
+
+        # keyset pagination, newest first
+        first = await archiver.get_page(limit=3)
+        second = await archiver.get_page(limit=3, cursor=first[-1].id)
+        assert [item.id for item in [*first, *second]] == [item.id for item in items]
+
+        # the results removed by users are not counted as left in aria2c,
+        # so that the later ones are not skipped
+        fake.stopped = [
+            _download(f"00000000000001{i:02}", "complete") for i in range(5)
+        ]
+        purged_by_users.append(fake.stopped[0]["gid"])
+        purge_requests.clear()
+        assert await archiver.archive() == 5
+        # one `system.multicall` per batch
+        assert len(purge_requests) == 3
+        assert fake.stopped == []
+        assert archiver.metrics()["purge_failures"] == 0
+
+        await client.aclose()
+        await engine.dispose()
+
+    asyncio.run(main())
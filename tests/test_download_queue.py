@@ -0,0 +1,175 @@
+import asyncio
+import uuid
+
+import httpx
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from aria2_server.app._core.aria2 import (
+    Aria2Backend,
+    Aria2DownloadQueue,
+    Aria2RpcClient,
+    Aria2ShardRouter,
+)
+from aria2_server.app._core.auth import AUTH_COOKIE_NAME
+from aria2_server.app.factory import AppState, create_app
+from aria2_server.config import schemas
+from aria2_server.db.base._models import Base
+from aria2_server.db.user import User
+from tests._fake_aria2c import FakeAria2c, uris_of
+
+
+def test_download_queue() -> None:
+    async def main() -> None:
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_maker = async_sessionmaker(engine, expire_on_commit=False)
+
+        fake = FakeAria2c(max_concurrent_downloads=2)
+        client = httpx.AsyncClient(transport=httpx.MockTransport(fake.handle))
+        rpc_client = Aria2RpcClient(client, "http://aria2c/jsonrpc", secret="secret")
+        queue = Aria2DownloadQueue(
+            rpc_client,
+            [Aria2Backend("aria2c", rpc_client, "ws://aria2c/jsonrpc")],
+            session_maker=session_maker,
+            refill_interval=60,
+            batch_size=100,
+        )
+
+        for uri, priority in [("a", 0), ("b", 0), ("bad", 2), ("c", 1), ("d", 0)]:
+            await queue.enqueue(
+                "aria2.addUri", ["token:secret", [uri]], priority=priority
+            )
+        total, items = await queue.get_page(offset=0, limit=10)
+        assert total == 5
+        # by priority, then in FIFO order; the rpc-secret is not stored
+        assert [item.params[0][0] for item in items] == ["bad", "c", "a", "b", "d"]
+
+        # only as many as aria2c can run, the rejected one is dropped
+        assert await queue.refill() == 2
+        assert uris_of(fake.active) == ["c", "a"]
+        assert queue.metrics()["rejected"] == 1
+        assert await queue.refill() == 0
+
+        # refilled after a download stops
+        fake.complete(fake.active[0]["gid"])
+        assert await queue.refill() == 1
+        assert uris_of(fake.active) == ["a", "b"]
+
+        total, items = await queue.get_page(offset=0, limit=10)
+        assert total == 1
+        assert await queue.remove(items[0].id)
+        assert not await queue.remove(items[0].id)
+
+        await client.aclose()
+        await engine.dispose()
+
+    asyncio.run(main())
+
+
+def test_download_queue_live_backends() -> None:
+    async def main() -> None:
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_maker = async_sessionmaker(engine, expire_on_commit=False)
+
+        fakes = [FakeAria2c(max_concurrent_downloads=2) for _ in range(2)]
+        clients = [
+            httpx.AsyncClient(transport=httpx.MockTransport(fake.handle))
+            for fake in fakes
+        ]
+        router = Aria2ShardRouter(
+            [
+                Aria2Backend(
+                    f"shard-{i}",
+                    Aria2RpcClient(client, "http://aria2c/jsonrpc", secret="secret"),
+                    "ws://aria2c/jsonrpc",
+                )
+                for i, client in enumerate(clients)
+            ],
+            max_gids=100,
+            secret="secret",
+        )
+        router.healthy[1] = False
+        queue = Aria2DownloadQueue(
+            router.rpc_client(secret="secret"),
+            router.backends,
+            session_maker=session_maker,
+            refill_interval=60,
+            batch_size=100,
+            router=router,
+        )
+
+        for uri in "abcd":
+            await queue.enqueue("aria2.addUri", [[uri]])
+        # the stat is merged from the live instance only, so are the free slots
+        assert await queue.refill() == 2
+        assert uris_of(fakes[0].active) == ["a", "b"]
+        assert fakes[1].active == []
+
+        for client in clients:
+            await client.aclose()
+        await engine.dispose()
+
+    asyncio.run(main())
+
+
+async def _login(app_state: AppState) -> str:
+    user = User(
+        id=uuid.uuid4(),
+        email="user@example.com",
+        hashed_password="",
+        is_active=True,
+        is_verified=True,
+    )
+    async with app_state.database.session_maker() as session:
+        session.add(user)
+        await session.commit()
+        return await app_state.auth.build_strategy(session).write_token(user)
+
+
+def test_download_queue_api() -> None:
+    async def main() -> None:
+        app = create_app(
+            schemas.Config(
+                server=schemas.Server(
+                    extra=schemas.ServerExtra(
+                        sqlite_db=":memory:",
+                        auth_strategy="jwt",
+                        download_queue=schemas.DownloadQueue(enabled=True),
+                    ),
+                ),
+            )
+        )
+        async with app.router.lifespan_context(app), httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app),  # pyright: ignore[reportArgumentType]
+            base_url="http://testserver",
+        ) as client:
+            token = await _login(app.state.aria2_server)
+            client.cookies.set(AUTH_COOKIE_NAME, token)
+
+            response = await client.post(
+                "/api/aria2/queue",
+                json={"method": "aria2.addUri", "params": [["http://x"]]},
+            )
+            assert response.status_code == 201
+            queued_id = response.json()["id"]
+
+            response = await client.post(
+                "/api/aria2/queue",
+                json={"method": "aria2.remove", "params": ["gid"]},
+            )
+            assert response.status_code == 422
+
+            response = await client.get("/api/aria2/queue")
+            assert response.status_code == 200
+            assert response.json()["total"] == 1
+            assert response.json()["items"][0]["params"] == [["http://x"]]
+
+            response = await client.delete(f"/api/aria2/queue/{queued_id}")
+            assert response.status_code == 204
+            response = await client.delete(f"/api/aria2/queue/{queued_id}")
+            assert response.status_code == 404
+
+    asyncio.run(main())
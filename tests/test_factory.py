@@ -0,0 +1,74 @@
+import asyncio
+import uuid
+
+import httpx
+
+from aria2_server.app._core.auth import AUTH_COOKIE_NAME
+from aria2_server.app.factory import AppState, create_app
+from aria2_server.config import schemas
+from aria2_server.db.user import User
+
+
+def _create_config() -> schemas.Config:
+    return schemas.Config(
+        server=schemas.Server(
+            extra=schemas.ServerExtra(sqlite_db=":memory:", auth_strategy="jwt"),
+        ),
+    )
+
+
+async def _login(app_state: AppState) -> str:
+    """Create a user in the db of the app, and return a session token of it."""
+    user = User(
+        id=uuid.uuid4(),
+        email="user@example.com",
+        hashed_password="",
+        is_active=True,
+        is_verified=True,
+    )
+    async with app_state.database.session_maker() as session:
+        session.add(user)
+        await session.commit()
+        return await app_state.auth.build_strategy(session).write_token(user)
+
+
+def test_create_app() -> None:
+    async def main() -> None:
+        app, another_app = create_app(_create_config()), create_app(_create_config())
+        app_state = app.state.aria2_server
+        another_app_state = another_app.state.aria2_server
+        assert isinstance(app_state, AppState)
+        assert isinstance(another_app_state, AppState)
+        assert app_state.database is not another_app_state.database
+
+        async with app.router.lifespan_context(
+            app
+        ), another_app.router.lifespan_context(another_app):
+            client = httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=app),  # pyright: ignore[reportArgumentType]
+                base_url="http://testserver",
+            )
+            another_client = httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=another_app),  # pyright: ignore[reportArgumentType]
+                base_url="http://testserver",
+            )
+            async with client, another_client:
+                token = await _login(app_state)
+                cookie = {"Cookie": f"{AUTH_COOKIE_NAME}={token}"}
+
+                response = await client.get("/api/users/me", headers=cookie)
+                assert response.status_code == 200
+                assert response.json()["email"] == "user@example.com"
+
+                # the session of one app is not accepted by another app,
+                # which has its own db and jwt secret
+                response = await another_client.get("/api/users/me", headers=cookie)
+                assert response.status_code == 401
+
+                response = await client.get("/api/metrics", headers=cookie)
+                assert response.status_code == 200
+                assert response.json()["session_cache"]["size"] == 1
+                metrics = another_app_state.metrics_registry.collect()
+                assert metrics["session_cache"]["size"] == 0
+
+    asyncio.run(main())
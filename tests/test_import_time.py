@@ -0,0 +1,47 @@
+import subprocess
+import sys
+from typing import List
+
+# the heavy modules which `aria2-server --help` or `aria2-server utils --help` never need
+_HEAVY_MODULES = (
+    "alembic",
+    "cryptography",
+    "fastapi",
+    "fastapi_users",
+    "nicegui",
+    "pydantic",
+    "sqlalchemy",
+)
+
+# a generous budget of the cumulative import time of `aria2_server.cli`,
+# it's about 50 ms on a laptop, and about 150 ms before lazy importing.
+_CLI_IMPORT_BUDGET_MS = 500
+
+
+def _import_times(stmt: str) -> List[List[str]]:
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", stmt],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stderr
+    # e.g. `import time:       151 |      38612 |   typer`
+    return [
+        [column.strip() for column in line.split("|")]
+        for line in stderr.splitlines()
+        if line.startswith("import time:")
+    ][1:]  # skip the header
+
+
+def test_cli_import_time() -> None:
+    import_times = _import_times("import aria2_server.cli")
+
+    imported = {name.split(".")[0] for _, _, name in import_times}
+    assert imported.isdisjoint(_HEAVY_MODULES), imported.intersection(_HEAVY_MODULES)
+
+    cli_cumulative_us = next(
+        int(cumulative)
+        for _, cumulative, name in import_times
+        if name == "aria2_server.cli"
+    )
+    assert cli_cumulative_us / 1000 < _CLI_IMPORT_BUDGET_MS
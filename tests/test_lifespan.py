@@ -0,0 +1,71 @@
+import asyncio
+from contextlib import ExitStack, contextmanager
+from typing import Generator, List
+
+import pytest
+
+from aria2_server.app import lifespan
+
+
+def test_startup_phases_run_concurrently(monkeypatch: pytest.MonkeyPatch) -> None:
+    events: List[str] = []
+
+    async def wait_for_others(name: str) -> None:
+        # every phase waits for all phases to start,
+        # so it times out if they run one by one
+        events.append(f"{name} started")
+
+        async def all_started() -> None:
+            while len(events) < 3:
+                await asyncio.sleep(0.01)
+
+        await asyncio.wait_for(all_started(), timeout=5)
+
+    server_config = object()
+
+    async def db_phase() -> object:
+        await wait_for_others("db")
+        return server_config
+
+    @contextmanager
+    def aria2c() -> Generator[None, None, None]:
+        yield
+        events.append("aria2c exited")
+
+    async def aria2c_phase(stack: ExitStack) -> None:
+        await wait_for_others("aria2c")
+        stack.enter_context(aria2c())
+
+    async def ui_phase() -> None:
+        await wait_for_others("ui")
+
+    monkeypatch.setattr(lifespan, "_db_phase", db_phase)
+    monkeypatch.setattr(lifespan, "_aria2c_phase", aria2c_phase)
+    monkeypatch.setattr(lifespan, "_ui_phase", ui_phase)
+
+    with ExitStack() as stack:
+        result = asyncio.run(lifespan._startup(stack))  # pyright: ignore[reportPrivateUsage]
+        assert sorted(events) == ["aria2c started", "db started", "ui started"]
+    # aria2c is left running until the stack is closed
+    assert events[-1] == "aria2c exited"
+
+    assert result.server_config is server_config
+    assert list(result.phase_durations) == ["db", "aria2c", "ui", "total"]
+    assert result.phase_durations["total"] >= max(
+        result.phase_durations[name] for name in ("db", "aria2c", "ui")
+    )
+
+
+def test_startup_phase_error(monkeypatch: pytest.MonkeyPatch) -> None:
+    async def db_phase() -> None:
+        raise RuntimeError("db is broken")
+
+    async def noop(*_: object) -> None:
+        pass
+
+    monkeypatch.setattr(lifespan, "_db_phase", db_phase)
+    monkeypatch.setattr(lifespan, "_aria2c_phase", noop)
+    monkeypatch.setattr(lifespan, "_ui_phase", noop)
+
+    with ExitStack() as stack, pytest.raises(RuntimeError, match="db is broken"):
+        asyncio.run(lifespan._startup(stack))  # pyright: ignore[reportPrivateUsage]
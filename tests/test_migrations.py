@@ -0,0 +1,8 @@
+from alembic.script import ScriptDirectory
+
+from aria2_server.db import migrations
+
+
+def test_head_revision() -> None:
+    script = ScriptDirectory.from_config(migrations.get_default_cfg())
+    assert script.get_current_head() == migrations.HEAD_REVISION
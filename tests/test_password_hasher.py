@@ -0,0 +1,48 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi_users.password import PasswordHelper
+from passlib.context import CryptContext
+
+from aria2_server.app._core.auth._password import (
+    PasswordHasher,
+    PasswordHasherBusyError,
+)
+
+
+class _BlockingPasswordHelper(PasswordHelper):
+    def __init__(self) -> None:
+        super().__init__(CryptContext(schemes=["pbkdf2_sha256"]))
+        self.release = threading.Event()
+
+    def hash(self, password: str) -> str:
+        self.release.wait()
+        return super().hash(password)
+
+
+def test_password_hasher() -> None:
+    async def main() -> None:
+        password_helper = _BlockingPasswordHelper()
+        hasher = PasswordHasher(
+            max_workers=1, max_queue=1, password_helper=password_helper
+        )
+
+        # one is running, one is queued, the event loop is not blocked
+        tasks = [asyncio.create_task(hasher.hash("password")) for _ in range(2)]
+        await asyncio.sleep(0.1)
+        assert hasher.metrics()["pending"] == 2
+
+        with pytest.raises(PasswordHasherBusyError):
+            await hasher.hash("password")
+        assert hasher.rejected == 1
+
+        password_helper.release.set()
+        hashed_password, _ = await asyncio.gather(*tasks)
+        verified, _ = await hasher.verify_and_update("password", hashed_password)
+        assert verified
+        assert hasher.metrics()["pending"] == 0
+
+        hasher.shutdown()
+
+    asyncio.run(main())
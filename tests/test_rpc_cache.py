@@ -0,0 +1,100 @@
+import asyncio
+from typing import List
+
+from aria2_server.app._core.aria2 import Aria2RpcBatcher, Aria2RpcCache
+from aria2_server.app._core.aria2._jsonrpc import JsonRpcRequest, JsonRpcResponse
+
+
+def test_rpc_cache() -> None:
+    async def main() -> None:
+        calls: List[str] = []
+
+        async def fetch(request: JsonRpcRequest) -> JsonRpcResponse:
+            calls.append(request["method"])
+            await asyncio.sleep(0.01)
+            return {"jsonrpc": "2.0", "id": "upstream", "result": len(calls)}
+
+        def request(id_: int, method: str) -> JsonRpcRequest:
+            return {"jsonrpc": "2.0", "id": id_, "method": method, "params": []}
+
+        cache = Aria2RpcCache(ttl=60)
+
+        # identical in-flight calls are merged into one
+        responses = await asyncio.gather(
+            *(cache.call(request(i, "aria2.tellActive"), fetch) for i in range(5))
+        )
+        assert calls == ["aria2.tellActive"]
+        assert [response["id"] for response in responses] == list(range(5))
+        assert {response["result"] for response in responses} == {1}
+
+        # answered calls are reused within ttl
+        response = await cache.call(request(5, "aria2.tellActive"), fetch)
+        assert response == {"jsonrpc": "2.0", "id": 5, "result": 1}
+        assert len(calls) == 1
+
+        # write calls are passed through and invalidate the cache
+        response = await cache.call(request(6, "aria2.pause"), fetch)
+        assert response["id"] == 6
+        await cache.call(request(7, "aria2.tellActive"), fetch)
+        assert calls == ["aria2.tellActive", "aria2.pause", "aria2.tellActive"]
+
+        # read-only multicalls and batches do not invalidate the cache
+        def multicall(*methods: str) -> JsonRpcRequest:
+            return {
+                "jsonrpc": "2.0",
+                "id": 8,
+                "method": "system.multicall",
+                "params": [[{"methodName": m, "params": []} for m in methods]],
+            }
+
+        await cache.call(multicall("aria2.getGlobalStat", "aria2.tellActive"), fetch)
+        assert not cache.is_write([request(9, "aria2.tellWaiting")])
+        await cache.call(request(10, "aria2.tellActive"), fetch)
+        assert calls[-1] == "system.multicall"
+        # but a write call inside them does
+        assert cache.is_write(multicall("aria2.tellActive", "aria2.remove"))
+        assert cache.is_write(
+            [request(11, "aria2.tellActive"), request(12, "aria2.pause")]
+        )
+
+    asyncio.run(main())
+
+
+def test_rpc_batcher() -> None:
+    async def main() -> None:
+        requests: List[JsonRpcRequest] = []
+
+        async def fetch(request: JsonRpcRequest) -> JsonRpcResponse:
+            requests.append(request)
+            (calls,) = request["params"]
+            results = [
+                [call["params"][0]] if call["params"] else {"code": 1, "message": ""}
+                for call in calls
+            ]
+            return {"jsonrpc": "2.0", "id": request["id"], "result": results}
+
+        batcher = Aria2RpcBatcher(fetch, window=0.01, max_size=8)
+        responses = await asyncio.gather(
+            *(
+                batcher.call(
+                    {
+                        "jsonrpc": "2.0",
+                        "id": i,
+                        "method": "aria2.tellStatus",
+                        "params": [f"gid{i}"] if i else [],
+                    }
+                )
+                for i in range(3)
+            )
+        )
+        assert [request["method"] for request in requests] == ["system.multicall"]
+        assert responses[0] == {
+            "jsonrpc": "2.0",
+            "id": 0,
+            "error": {"code": 1, "message": ""},
+        }
+        assert responses[1] == {"jsonrpc": "2.0", "id": 1, "result": "gid1"}
+        assert responses[2]["result"] == "gid2"
+        await batcher.aclose()
+
+    asyncio.run(main())
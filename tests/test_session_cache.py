@@ -0,0 +1,64 @@
+import asyncio
+import uuid
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from aria2_server.app._core.auth._session_cache import SessionCache
+from aria2_server.db.base._models import Base
+from aria2_server.db.user import User
+
+
+def test_session_cache() -> None:
+    async def main() -> None:
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_maker = async_sessionmaker(engine, expire_on_commit=False)
+
+        user = User(
+            id=uuid.uuid4(),
+            email="user@example.com",
+            hashed_password="hashed",
+            is_active=True,
+            is_superuser=False,
+            is_verified=True,
+        )
+        async with session_maker() as session:
+            session.add(user)
+            await session.commit()
+
+        cache = SessionCache(ttl=60, max_entries=1)
+        cache.put("token", user)
+
+        # every hit returns a new instance bound to the caller's session
+        async with session_maker() as session1, session_maker() as session2:
+            user1 = await cache.get("token", session1)
+            user2 = await cache.get("token", session2)
+            assert user1 is not None
+            assert user2 is not None
+            assert user1 is not user2
+            assert user1.id == user2.id == user.id
+            assert user1.email == user.email
+        assert (cache.hits, cache.misses) == (2, 0)
+
+        # token expiry
+        cache.put("token", user, token_ttl=0)
+        async with session_maker() as session:
+            assert await cache.get("token", session) is None
+
+        # invalidation
+        cache.put("token", user)
+        cache.invalidate_user(user.id)
+        async with session_maker() as session:
+            assert await cache.get("token", session) is None
+
+        # LRU eviction
+        cache.put("token", user)
+        cache.put("another-token", user)
+        async with session_maker() as session:
+            assert await cache.get("token", session) is None
+            assert await cache.get("another-token", session) is not None
+
+        await engine.dispose()
+
+    asyncio.run(main())
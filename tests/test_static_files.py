@@ -0,0 +1,116 @@
+import asyncio
+from pathlib import Path
+
+import httpx
+from fastapi import FastAPI
+
+from aria2_server.app._core.static_files import (
+    InMemoryStaticFiles,
+    bind_static_files_to_app,
+)
+
+_STYLE = "body { color: black; }\n" * 100
+
+
+def test_in_memory_static_files(tmp_path: Path) -> None:
+    (tmp_path / "index.html").write_text("<html>index</html>")
+    (tmp_path / "404.html").write_text("<html>not found</html>")
+    (tmp_path / "logo.png").write_bytes(b"\x89PNG" * 100)
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "index.html").write_text("<html>sub</html>")
+
+    async def main() -> None:
+        static_files = InMemoryStaticFiles(directory=tmp_path, html=True)
+        app = bind_static_files_to_app(static_files, FastAPI())
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app),  # pyright: ignore[reportArgumentType]
+            base_url="http://testserver",
+        ) as client:
+            # served from disk before loaded
+            response = await client.get("/index.html")
+            assert response.status_code == 200
+            assert response.text == "<html>index</html>"
+            assert "Vary" not in response.headers
+
+            await static_files.load()
+            # the files are not read from disk anymore
+            (tmp_path / "index.html").write_text("<html>changed</html>")
+
+            response = await client.get("/")
+            assert response.status_code == 200
+            assert response.text == "<html>index</html>"
+            assert response.headers["Content-Type"] == "text/html; charset=utf-8"
+            assert response.headers["Cache-Control"] == "no-cache"
+
+            # not compressible
+            response = await client.get(
+                "/logo.png", headers={"Accept-Encoding": "gzip"}
+            )
+            assert response.headers["Content-Type"] == "image/png"
+            assert "Content-Encoding" not in response.headers
+            assert "Vary" not in response.headers
+
+            # directories
+            response = await client.get("/sub")
+            assert response.status_code == 307
+            assert response.headers["Location"] == "http://testserver/sub/"
+            response = await client.get("/sub/")
+            assert response.text == "<html>sub</html>"
+
+            response = await client.get("/missing.js")
+            assert response.status_code == 404
+            assert response.text == "<html>not found</html>"
+
+    asyncio.run(main())
+
+
+def test_in_memory_static_files_precompressed(tmp_path: Path) -> None:
+    (tmp_path / "aria-ng-f1dd57abb9.min.css").write_text(_STYLE)
+
+    async def main() -> None:
+        static_files = InMemoryStaticFiles(directory=tmp_path)
+        await static_files.load()
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(
+                app=bind_static_files_to_app(static_files, FastAPI())  # pyright: ignore[reportArgumentType]
+            ),
+            base_url="http://testserver",
+        ) as client:
+            # precompressed, and the hashed file is immutable
+            response = await client.get(
+                "/aria-ng-f1dd57abb9.min.css", headers={"Accept-Encoding": "gzip"}
+            )
+            assert response.status_code == 200
+            assert response.headers["Content-Type"] == "text/css; charset=utf-8"
+            assert response.headers["Content-Encoding"] == "gzip"
+            assert response.headers["Vary"] == "Accept-Encoding"
+            assert "immutable" in response.headers["Cache-Control"]
+            assert response.text == _STYLE
+            gzip_etag = response.headers["ETag"]
+
+            response = await client.get(
+                "/aria-ng-f1dd57abb9.min.css", headers={"Accept-Encoding": "identity"}
+            )
+            assert "Content-Encoding" not in response.headers
+            assert response.text == _STYLE
+            identity_etag = response.headers["ETag"]
+            # different representations have different strong ETags
+            assert gzip_etag != identity_etag
+            assert gzip_etag == f'{identity_etag[:-1]}-gzip"'
+
+            # revalidated with the ETag of the negotiated representation
+            for if_none_match in (gzip_etag, f"W/{gzip_etag}", '"other", *'):
+                response = await client.get(
+                    "/aria-ng-f1dd57abb9.min.css",
+                    headers={"Accept-Encoding": "gzip", "If-None-Match": if_none_match},
+                )
+                assert response.status_code == 304
+                assert response.content == b""
+                assert response.headers["ETag"] == gzip_etag
+            response = await client.get(
+                "/aria-ng-f1dd57abb9.min.css",
+                headers={"Accept-Encoding": "gzip", "If-None-Match": identity_etag},
+            )
+            assert response.status_code == 200
+
+    asyncio.run(main())
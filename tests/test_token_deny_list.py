@@ -0,0 +1,67 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from aria2_server.app._core.auth._jwt import JWTState, TokenDenyList
+from aria2_server.db.base._models import Base
+from aria2_server.db.revoked_token import RevokedTokenDatabase
+from aria2_server.db.revoked_token.models import RevokedToken
+from aria2_server.db.server_config import ServerConfigDatabase
+from aria2_server.db.server_config.models import ServerConfig
+
+
+def test_token_deny_list() -> None:
+    async def main() -> None:
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_maker = async_sessionmaker(engine, expire_on_commit=False)
+
+        now = datetime.now(timezone.utc)
+        deny_list = TokenDenyList()
+        assert not deny_list.is_revoked("token")
+
+        async with session_maker() as session:
+            revoked_token_db = RevokedTokenDatabase(session, RevokedToken)
+            await deny_list.revoke("token", now + timedelta(hours=1), revoked_token_db)
+            await deny_list.revoke(
+                "expired-token", now - timedelta(hours=1), revoked_token_db
+            )
+        assert deny_list.is_revoked("token")
+        assert not deny_list.is_revoked("another-token")
+
+        # the deny-list survives a restart, and the expired tokens are dropped
+        restarted_deny_list = TokenDenyList()
+        async with session_maker() as session:
+            await restarted_deny_list.load(RevokedTokenDatabase(session, RevokedToken))
+        assert restarted_deny_list.is_revoked("token")
+        assert len(restarted_deny_list) == 1
+
+        await engine.dispose()
+
+    asyncio.run(main())
+
+
+def test_jwt_secret_is_not_the_storage_secret() -> None:
+    async def main() -> None:
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_maker = async_sessionmaker(engine, expire_on_commit=False)
+
+        state = JWTState(session_maker)
+        await state.load()
+        async with session_maker() as session:
+            server_config = await ServerConfigDatabase(session, ServerConfig).get()
+        # `secret_token` is also the `storage_secret` of NiceGUI
+        assert state.secret != server_config.secret_token
+
+        # stable across restarts, so that issued tokens stay valid
+        restarted_state = JWTState(session_maker)
+        await restarted_state.load()
+        assert restarted_state.secret == state.secret
+
+        await engine.dispose()
+
+    asyncio.run(main())
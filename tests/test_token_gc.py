@@ -0,0 +1,52 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from aria2_server.db.access_token import delete_expired_access_tokens
+from aria2_server.db.access_token.models import AccessToken
+from aria2_server.db.base._models import Base
+from aria2_server.db.user import User
+
+
+def test_delete_expired_access_tokens() -> None:
+    async def main() -> None:
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_maker = async_sessionmaker(engine, expire_on_commit=False)
+
+        now = datetime.now(timezone.utc)
+        user = User(id=uuid.uuid4(), email="user@example.com", hashed_password="")
+        async with session_maker() as session:
+            session.add(user)
+            session.add_all(
+                AccessToken(
+                    token=f"expired-{i}",
+                    user_id=user.id,
+                    created_at=now - timedelta(days=1),
+                )
+                for i in range(5)
+            )
+            session.add(AccessToken(token="fresh", user_id=user.id, created_at=now))
+            await session.commit()
+
+        max_age = now - timedelta(hours=1)
+        async with session_maker() as session:
+            batches = [
+                await delete_expired_access_tokens(session, max_age, limit=2)
+                for _ in range(4)
+            ]
+            assert batches == [2, 2, 1, 0]
+
+            tokens = (await session.execute(select(AccessToken.token))).scalars()
+            assert list(tokens) == ["fresh"]
+            assert (
+                await session.execute(select(func.count()).select_from(User))
+            ).scalar_one() == 1
+
+        await engine.dispose()
+
+    asyncio.run(main())